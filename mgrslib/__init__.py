@@ -1 +1,5 @@
 from .mgrslib import *
+from .batch import encode, decode, to_int, from_int, distance_matrix, bearing_matrix
+from .rtree import RTree
+from .gridarray import GridArray
+from .bitmap import BitmapRegion
@@ -0,0 +1,1694 @@
+#
+#  mgrslib
+#  Geodetic operations in MGRS space for Data Scientists
+#
+#  Batch (array at a time) conversion between lat/lon and MGRS space
+#
+#  The projection math below is a line for line NumPy port of the geotrans
+#  routines (mgrs.c, utm.c, tranmerc.c, ups.c, polarst.c) wrapped by the
+#  python MGRS package. Operations are kept in the same order as the C code
+#  so that encode() produces the same strings as MGRS().toMGRS()
+#
+#  MIT License - see LICENSE
+#
+
+import math
+
+import numpy as np
+from nvector import FrameE
+
+
+    #########################
+    #                       #
+    #   WGS84 / GEOTRANS    #
+    #   CONSTANTS           #
+    #                       #
+    #########################
+
+_PI = math.pi
+_TWO_PI = 2 * _PI
+_PI_OVER_2 = _PI / 2.0
+_PI_OVER_4 = _PI / 4.0
+_DEG_TO_RAD = 0.017453292519943295
+_RAD_TO_DEG = 57.29577951308232087
+
+_ONEHT = 100000.0
+_TWOMIL = 2000000.0
+
+_MIN_UTM_LAT = (-80 * _PI) / 180.0
+_MAX_UTM_LAT = (84 * _PI) / 180.0
+
+_a = 6378137.0
+_f = 1 / 298.257223563
+
+#transverse mercator
+_es = 2 * _f - _f * _f
+_ebs = (1 / (1 - _es)) - 1
+_b = _a * (1 - _f)
+_tn = (_a - _b) / (_a + _b)
+_tn2 = _tn * _tn
+_tn3 = _tn2 * _tn
+_tn4 = _tn3 * _tn
+_tn5 = _tn4 * _tn
+_ap = _a * (1.e0 - _tn + 5.e0 * (_tn2 - _tn3) / 4.e0 + 81.e0 * (_tn4 - _tn5) / 64.e0)
+_bp = 3.e0 * _a * (_tn - _tn2 + 7.e0 * (_tn3 - _tn4) / 8.e0 + 55.e0 * _tn5 / 64.e0) / 2.e0
+_cp = 15.e0 * _a * (_tn2 - _tn3 + 3.e0 * (_tn4 - _tn5) / 4.e0) / 16.0
+_dp = 35.e0 * _a * (_tn3 - _tn4 + 11.e0 * _tn5 / 16.e0) / 48.e0
+_ep = 315.e0 * _a * (_tn4 - _tn5) / 512.e0
+
+_utmScale = 0.9996
+_utmFalseEasting = 500000.0
+
+#polar stereographic (UPS)
+_upsFalseEasting = 2000000.0
+_upsFalseNorthing = 2000000.0
+_polarOriginLat = (81.114528 * _PI) / 180.0
+_polar_e = math.sqrt(_es)
+_polar_e_over_2 = _polar_e / 2.0
+_polarSlat = math.sin(_polarOriginLat)
+_polarEssin = _polar_e * _polarSlat
+_polarPowEs = math.pow((1.0 - _polarEssin) / (1.0 + _polarEssin), _polar_e_over_2)
+_polar_a_mc = _a * (math.cos(_polarOriginLat) / math.sqrt(1.0 - _polarEssin * _polarEssin))
+_polar_tc = math.tan(_PI_OVER_4 - _polarOriginLat / 2.0) / _polarPowEs
+
+#letters are handled as their index in the alphabet, A=0 ... Z=25
+_A, _B, _C, _H, _I, _J, _L, _N, _O, _P, _R, _S, _U, _V, _X, _Y, _Z = [ord(i) - 65 for i in 'ABCHIJLNOPRSUVXYZ']
+
+#latitude band letters C...X with their minimum northing and northing offset
+_BANDS = np.array([ord(i) - 65 for i in 'CDEFGHJKLMNPQRSTUVWX'])
+_BAND_MIN_NORTHING = np.array([
+    1100000.0, 2000000.0, 2800000.0, 3700000.0, 4600000.0, 5500000.0, 6400000.0, 7300000.0, 8200000.0, 9100000.0,
+    0.0, 800000.0, 1700000.0, 2600000.0, 3500000.0, 4400000.0, 5300000.0, 6200000.0, 7000000.0, 7900000.0
+])
+_BAND_NORTHING_OFFSET = np.array([
+    0.0, 2000000.0, 2000000.0, 2000000.0, 4000000.0, 4000000.0, 6000000.0, 6000000.0, 8000000.0, 8000000.0,
+    0.0, 0.0, 0.0, 2000000.0, 2000000.0, 4000000.0, 4000000.0, 6000000.0, 6000000.0, 6000000.0
+])
+#maps a band letter index (0-25) to its row in the band tables, -1 for letters that are not UTM bands
+_BAND_ROW = np.full(26, -1)
+_BAND_ROW[_BANDS] = np.arange(len(_BANDS))
+
+#UPS letter (A, B, Y, Z) -> 2nd letter low/high value, 3rd letter high value, false easting, false northing
+_UPS_TABLE = {
+    _A: (_J, _Z, _Z, 800000.0, 800000.0),
+    _B: (_A, _R, _Z, 2000000.0, 800000.0),
+    _Y: (_J, _Z, _P, 800000.0, 1300000.0),
+    _Z: (_A, _J, _P, 2000000.0, 1300000.0),
+}
+
+
+    ##############################
+    #                            #
+    #   TRANSVERSE MERCATOR /    #
+    #   POLAR STEREOGRAPHIC      #
+    #                            #
+    ##############################
+
+def _sphtmd(lat):
+    #true meridional distance
+    return (_ap * lat - _bp * np.sin(2.e0 * lat) + _cp * np.sin(4.e0 * lat)
+        - _dp * np.sin(6.e0 * lat) + _ep * np.sin(8.e0 * lat))
+
+def _sphsn(lat):
+    return _a / np.sqrt(1.e0 - _es * np.power(np.sin(lat), 2))
+
+def _sphsr(lat):
+    return _a * (1.e0 - _es) / np.power(np.sqrt(1.e0 - _es * np.power(np.sin(lat), 2)), 3)
+
+def _centralMeridian(zone):
+    cm = np.where(zone >= 31, (6 * zone - 183) * _PI / 180.0, (6 * zone + 177) * _PI / 180.0)
+    return np.where(cm > _PI, cm - _TWO_PI, cm)
+
+def _toTransverseMercator(lat, lon, cm, falseNorthing):
+    lon = np.where(lon > _PI, lon - _TWO_PI, lon)
+
+    dlam = lon - cm
+    dlam = np.where(dlam > _PI, dlam - _TWO_PI, dlam)
+    dlam = np.where(dlam < -_PI, dlam + _TWO_PI, dlam)
+    dlam = np.where(np.fabs(dlam) < 2.e-10, 0.0, dlam)
+
+    s = np.sin(lat)
+    c = np.cos(lat)
+    c2 = c * c
+    c3 = c2 * c
+    c5 = c3 * c2
+    c7 = c5 * c2
+    t = np.tan(lat)
+    tan2 = t * t
+    tan3 = tan2 * t
+    tan4 = tan3 * t
+    tan5 = tan4 * t
+    tan6 = tan5 * t
+    eta = _ebs * c2
+    eta2 = eta * eta
+    eta3 = eta2 * eta
+    eta4 = eta3 * eta
+
+    sn = _sphsn(lat)
+    tmd = _sphtmd(lat)
+    tmdo = 0.0
+    k = _utmScale
+
+    t1 = (tmd - tmdo) * k
+    t2 = sn * s * c * k / 2.e0
+    t3 = sn * s * c3 * k * (5.e0 - tan2 + 9.e0 * eta + 4.e0 * eta2) / 24.e0
+    t4 = sn * s * c5 * k * (61.e0 - 58.e0 * tan2
+        + tan4 + 270.e0 * eta - 330.e0 * tan2 * eta + 445.e0 * eta2
+        + 324.e0 * eta3 - 680.e0 * tan2 * eta2 + 88.e0 * eta4
+        - 600.e0 * tan2 * eta3 - 192.e0 * tan2 * eta4) / 720.e0
+    t5 = sn * s * c7 * k * (1385.e0 - 3111.e0 * tan2 + 543.e0 * tan4 - tan6) / 40320.e0
+
+    northing = (falseNorthing + t1 + np.power(dlam, 2.e0) * t2
+        + np.power(dlam, 4.e0) * t3 + np.power(dlam, 6.e0) * t4
+        + np.power(dlam, 8.e0) * t5)
+
+    t6 = sn * c * k
+    t7 = sn * c3 * k * (1.e0 - tan2 + eta) / 6.e0
+    t8 = sn * c5 * k * (5.e0 - 18.e0 * tan2 + tan4
+        + 14.e0 * eta - 58.e0 * tan2 * eta + 13.e0 * eta2 + 4.e0 * eta3
+        - 64.e0 * tan2 * eta2 - 24.e0 * tan2 * eta3) / 120.e0
+    t9 = sn * c7 * k * (61.e0 - 479.e0 * tan2 + 179.e0 * tan4 - tan6) / 5040.e0
+
+    easting = (_utmFalseEasting + dlam * t6 + np.power(dlam, 3.e0) * t7
+        + np.power(dlam, 5.e0) * t8 + np.power(dlam, 7.e0) * t9)
+
+    return easting, northing
+
+def _fromTransverseMercator(easting, northing, cm, falseNorthing):
+    k = _utmScale
+
+    tmdo = 0.0
+    tmd = tmdo + (northing - falseNorthing) / k
+
+    sr = _sphsr(0.e0)
+    ftphi = tmd / sr
+    for i in range(5):
+        t10 = _sphtmd(ftphi)
+        sr = _sphsr(ftphi)
+        ftphi = ftphi + (tmd - t10) / sr
+
+    sr = _sphsr(ftphi)
+    sn = _sphsn(ftphi)
+
+    s = np.sin(ftphi)
+    c = np.cos(ftphi)
+    t = np.tan(ftphi)
+    tan2 = t * t
+    tan4 = tan2 * tan2
+    eta = _ebs * np.power(c, 2)
+    eta2 = eta * eta
+    eta3 = eta2 * eta
+    eta4 = eta3 * eta
+
+    de = easting - _utmFalseEasting
+    de = np.where(np.fabs(de) < 0.0001, 0.0, de)
+
+    t10 = t / (2.e0 * sr * sn * math.pow(k, 2))
+    t11 = t * (5.e0 + 3.e0 * tan2 + eta - 4.e0 * np.power(eta, 2)
+        - 9.e0 * tan2 * eta) / (24.e0 * sr * np.power(sn, 3) * math.pow(k, 4))
+    t12 = t * (61.e0 + 90.e0 * tan2 + 46.e0 * eta + 45.E0 * tan4
+        - 252.e0 * tan2 * eta - 3.e0 * eta2 + 100.e0
+        * eta3 - 66.e0 * tan2 * eta2 - 90.e0 * tan4
+        * eta + 88.e0 * eta4 + 225.e0 * tan4 * eta2
+        + 84.e0 * tan2 * eta3 - 192.e0 * tan2 * eta4) / (720.e0 * sr * np.power(sn, 5) * math.pow(k, 6))
+    t13 = t * (1385.e0 + 3633.e0 * tan2 + 4095.e0 * tan4 + 1575.e0
+        * np.power(t, 6)) / (40320.e0 * sr * np.power(sn, 7) * math.pow(k, 8))
+
+    lat = (ftphi - np.power(de, 2) * t10 + np.power(de, 4) * t11 - np.power(de, 6) * t12
+        + np.power(de, 8) * t13)
+
+    t14 = 1.e0 / (sn * c * k)
+    t15 = (1.e0 + 2.e0 * tan2 + eta) / (6.e0 * np.power(sn, 3) * c * math.pow(k, 3))
+    t16 = (5.e0 + 6.e0 * eta + 28.e0 * tan2 - 3.e0 * eta2
+        + 8.e0 * tan2 * eta + 24.e0 * tan4 - 4.e0
+        * eta3 + 4.e0 * tan2 * eta2 + 24.e0
+        * tan2 * eta3) / (120.e0 * np.power(sn, 5) * c * math.pow(k, 5))
+    t17 = (61.e0 + 662.e0 * tan2 + 1320.e0 * tan4 + 720.e0
+        * np.power(t, 6)) / (5040.e0 * np.power(sn, 7) * c * math.pow(k, 7))
+
+    dlam = de * t14 - np.power(de, 3) * t15 + np.power(de, 5) * t16 - np.power(de, 7) * t17
+
+    lon = cm + dlam
+    lon = np.where(lon > _PI, lon - _TWO_PI, np.where(lon < -_PI, lon + _TWO_PI, lon))
+
+    return lat, lon
+
+def _toPolarStereographic(lat, lon, southern=None):
+    #the hemisphere follows lat unless southern is given
+    if southern is None:
+        southern = lat < 0
+
+    #the southern projection is the northern one mirrored through the equator
+    lat = np.where(southern, -lat, lat)
+    lon = np.where(southern, -lon, lon)
+
+    dlam = np.where(lon > _PI, lon - _TWO_PI, lon)
+    dlam = np.where(dlam < -_PI, dlam + _TWO_PI, dlam)
+
+    essin = _polar_e * np.sin(lat)
+    powEs = np.power((1.0 - essin) / (1.0 + essin), _polar_e_over_2)
+    t = np.tan(_PI_OVER_4 - lat / 2.0) / powEs
+    rho = _polar_a_mc * t / _polar_tc
+
+    easting = np.where(southern, -(rho * np.sin(dlam) - _upsFalseEasting), rho * np.sin(dlam) + _upsFalseEasting)
+    northing = np.where(southern, rho * np.cos(dlam) + _upsFalseNorthing, -rho * np.cos(dlam) + _upsFalseNorthing)
+
+    atPole = np.fabs(lat - _PI_OVER_2) < 1.0e-10
+    easting = np.where(atPole, _upsFalseEasting, easting)
+    northing = np.where(atPole, _upsFalseNorthing, northing)
+
+    return easting, northing
+
+def _fromPolarStereographic(easting, northing, southern):
+    dy = northing - _upsFalseNorthing
+    dx = easting - _upsFalseEasting
+    rho = np.sqrt(dx * dx + dy * dy)
+    atPole = (dy == 0.0) & (dx == 0.0)
+
+    dy = np.where(southern, -dy, dy)
+    dx = np.where(southern, -dx, dx)
+
+    t = rho * _polar_tc / _polar_a_mc
+    phi = _PI_OVER_2 - 2.0 * np.arctan(t)
+    tempPhi = np.zeros_like(phi)
+
+    #iterate every point until it converges, frozen points keep their value
+    active = np.fabs(phi - tempPhi) > 1.0e-10
+    while active.any():
+        tempPhi = np.where(active, phi, tempPhi)
+        essin = _polar_e * np.sin(phi)
+        powEs = np.power((1.0 - essin) / (1.0 + essin), _polar_e_over_2)
+        phi = np.where(active, _PI_OVER_2 - 2.0 * np.arctan(t * powEs), phi)
+        active = active & (np.fabs(phi - tempPhi) > 1.0e-10)
+
+    lat = np.clip(phi, -_PI_OVER_2, _PI_OVER_2)
+    lon = np.arctan2(dx, -dy)
+    lon = np.where(lon > _PI, lon - _TWO_PI, np.where(lon < -_PI, lon + _TWO_PI, lon))
+    lon = np.clip(lon, -_PI, _PI)
+
+    lat = np.where(atPole, _PI_OVER_2, lat)
+    lon = np.where(atPole, 0.0, lon)
+
+    lat = np.where(southern, -lat, lat)
+    lon = np.where(southern, -lon, lon)
+
+    return lat, lon
+
+
+    ##########################
+    #                        #
+    #   UTM / UPS <-> MGRS   #
+    #                        #
+    ##########################
+
+def _utmZone(lat, lon):
+    #Convert_Geodetic_To_UTM zone selection, including the Norway and Svalbard exceptions
+    lat = np.where((lat > -1.0e-9) & (lat < 0), 0.0, lat)
+    lon = np.where(lon < 0, lon + ((2 * _PI) + 1.0e-10), lon)
+
+    latDegrees = np.trunc(lat * 180.0 / _PI)
+    lonDegrees = np.trunc(lon * 180.0 / _PI)
+
+    zone = np.where(lon < _PI, np.trunc(31 + ((lon * 180.0 / _PI) / 6.0)), np.trunc(((lon * 180.0 / _PI) / 6.0) - 29)).astype(np.int64)
+    zone[zone > 60] = 1
+
+    norway = (latDegrees > 55) & (latDegrees < 64)
+    svalbard = latDegrees > 71
+    zone[norway & (lonDegrees > -1) & (lonDegrees < 3)] = 31
+    zone[norway & (lonDegrees > 2) & (lonDegrees < 12)] = 32
+    zone[svalbard & (lonDegrees > -1) & (lonDegrees < 9)] = 31
+    zone[svalbard & (lonDegrees > 8) & (lonDegrees < 21)] = 33
+    zone[svalbard & (lonDegrees > 20) & (lonDegrees < 33)] = 35
+    zone[svalbard & (lonDegrees > 32) & (lonDegrees < 42)] = 37
+
+    return zone
+
+def _toUTM(lat, lon, zone):
+    #returns easting, northing for lat/lon (radians) projected into zone
+    lat = np.where((lat > -1.0e-9) & (lat < 0), 0.0, lat)
+    lon = np.where(lon < 0, lon + ((2 * _PI) + 1.0e-10), lon)
+
+    return _toTransverseMercator(lat, lon, _centralMeridian(zone), np.where(lat < 0, 10000000.0, 0.0))
+
+def _gridValues(zone):
+    #2nd letter low value and pattern offset for the set a zone belongs to
+    setNumber = zone % 6
+    setNumber[setNumber == 0] = 6
+
+    ltr2Low = np.choose(setNumber % 3, [_S, _A, _J])
+    patternOffset = np.where(setNumber % 2 == 0, 500000.0, 0.0)
+
+    return ltr2Low, patternOffset
+
+def _latitudeLetter(lat):
+    latDegrees = lat * _RAD_TO_DEG
+    temp = ((lat + (80.0 * _DEG_TO_RAD)) / (8.0 * _DEG_TO_RAD)) + 1.0e-12
+    row = np.clip(temp, 0, len(_BANDS) - 1).astype(np.int64)
+    return np.where((latDegrees >= 72) & (latDegrees < 84.5), _X, _BANDS[row])
+
+def _utmLetters(lat, lon, zone, easting, northing):
+    #UTM_To_MGRS, returns the (possibly re-zoned) zone, the three letters and the easting/northing to print
+
+    #special check for rounding to the (truncated) eastern edge of zone 31V
+    v31 = (zone == 31) & (lat >= 56.0 * _DEG_TO_RAD) & (lat < 64.0 * _DEG_TO_RAD) & ((lon >= 3.0 * _DEG_TO_RAD) | (easting >= 500000.0))
+    if v31.any():
+        zone = np.where(v31, 32, zone)
+        e32, n32 = _toUTM(lat[v31], lon[v31], zone[v31])
+        easting = easting.copy()
+        northing = northing.copy()
+        easting[v31] = e32
+        northing[v31] = n32
+
+    equator = (lat <= 0.0) & (northing == 1.0e7)
+    lat = np.where(equator, 0.0, lat)
+    northing = np.where(equator, 0.0, northing)
+
+    ltr2Low, patternOffset = _gridValues(zone)
+
+    letter1 = _latitudeLetter(lat)
+
+    gridNorthing = northing
+    for i in range(5):
+        gridNorthing = np.where(gridNorthing >= _TWOMIL, gridNorthing - _TWOMIL, gridNorthing)
+    gridNorthing = gridNorthing + patternOffset
+    gridNorthing = np.where(gridNorthing >= _TWOMIL, gridNorthing - _TWOMIL, gridNorthing)
+
+    letter3 = np.trunc(gridNorthing / _ONEHT).astype(np.int64)
+    letter3 = letter3 + (letter3 > _H)
+    letter3 = letter3 + (letter3 > _N)
+
+    gridEasting = np.where((letter1 == _V) & (zone == 31) & (easting == 500000.0), easting - 1.0, easting)
+
+    letter2 = ltr2Low + (np.trunc(gridEasting / _ONEHT).astype(np.int64) - 1)
+    letter2 = letter2 + ((ltr2Low == _J) & (letter2 > _N))
+
+    return zone, letter1, letter2, letter3, gridEasting, northing
+
+def _upsLetters(lat, easting, northing):
+    #Convert_UPS_To_MGRS, returns the three letters
+    east = easting >= _TWOMIL
+    letter1 = np.where(lat < 0, np.where(east, _B, _A), np.where(east, _Z, _Y))
+
+    ltr2Low = np.where(east, _A, _J)
+    falseEasting = np.where(east, 2000000.0, 800000.0)
+    falseNorthing = np.where(lat < 0, 800000.0, 1300000.0)
+
+    letter3 = np.trunc((northing - falseNorthing) / _ONEHT).astype(np.int64)
+    letter3 = letter3 + (letter3 > _H)
+    letter3 = letter3 + (letter3 > _N)
+
+    letter2 = ltr2Low + np.trunc((easting - falseEasting) / _ONEHT).astype(np.int64)
+    west = ~east
+    letter2 = letter2 + 3 * (west & (letter2 > _L))
+    letter2 = letter2 + 2 * (west & (letter2 > _U))
+    letter2 = letter2 + 2 * (east & (letter2 > _C))
+    letter2 = letter2 + 1 * (east & (letter2 > _H))
+    letter2 = letter2 + 3 * (east & (letter2 > _L))
+
+    return letter1, letter2, letter3
+
+def _digits(value, precision):
+    #value is an easting or northing in meters, returns the number printed at precision
+    divisor = math.pow(10.0, 5 - precision)
+    value = np.fmod(value, 100000.0)
+    value = np.where(value >= 99999.5, 99999.0, value)
+    return np.trunc(value / divisor).astype(np.int64)
+
+def _mgrsStrings(zone, letter1, letter2, letter3, east, north, precision):
+    #assembles the MGRS strings byte-wise, zone 0 marks a UPS id which has no zone digits
+    #precision may be a single value or one per id
+    n = len(zone)
+    precision = np.broadcast_to(precision, (n,))
+    maxPrecision = int(precision.max()) if n else 0
+    width = 5 + 2 * maxPrecision
+    out = np.zeros((n, width), dtype=np.uint8)
+
+    ups = zone == 0
+    shift = np.where(ups, 0, 2)
+    rows = np.arange(n)
+
+    out[:, 0] = np.where(ups, 0, zone // 10 + 48)
+    out[:, 1] = np.where(ups, 0, zone % 10 + 48)
+    out[rows, shift] = letter1 + 65
+    out[rows, shift + 1] = letter2 + 65
+    out[rows, shift + 2] = letter3 + 65
+    for i in range(maxPrecision):
+        inPrecision = i < precision
+        r = rows[inPrecision]
+        p = precision[inPrecision]
+        scale = 10 ** (p - 1 - i)
+        out[r, shift[inPrecision] + 3 + i] = (east[inPrecision] // scale) % 10 + 48
+        out[r, shift[inPrecision] + 3 + p + i] = (north[inPrecision] // scale) % 10 + 48
+
+    return out.view('S' + str(width)).ravel().astype('U' + str(width))
+
+
+    ##############
+    #            #
+    #   ENCODE   #
+    #            #
+    ##############
+
+def _locate(lats, lons):
+    #zone (0 for UPS), letters and full easting/northing of each lat/lon (degrees)
+    lat = lats.ravel() * _PI / 180.0
+    lon = lons.ravel() * _PI / 180.0
+
+    valid = (lat >= -_PI_OVER_2) & (lat <= _PI_OVER_2) & (lon >= -_PI) & (lon <= _TWO_PI)
+    if not valid.all():
+        raise ValueError(str(int((~valid).sum())) + ' latitude/longitude pairs are outside of the valid range (-90 to 90, -180 to 360)')
+
+    n = len(lat)
+    zone = np.zeros(n, dtype=np.int64)
+    letter1 = np.zeros(n, dtype=np.int64)
+    letter2 = np.zeros(n, dtype=np.int64)
+    letter3 = np.zeros(n, dtype=np.int64)
+    easting = np.zeros(n)
+    northing = np.zeros(n)
+
+    ups = (lat < _MIN_UTM_LAT) | (lat > _MAX_UTM_LAT)
+    utm = ~ups
+
+    if utm.any():
+        uLat = lat[utm]
+        uLon = lon[utm]
+        uZone = _utmZone(uLat, uLon)
+        uEasting, uNorthing = _toUTM(uLat, uLon, uZone)
+
+        outOfRange = (uEasting < 100000) | (uEasting > 900000) | (uNorthing < 0) | (uNorthing > 10000000)
+        if outOfRange.any():
+            raise ValueError(str(int(outOfRange.sum())) + ' latitude/longitude pairs project outside of their UTM zone')
+
+        uZone, l1, l2, l3, uEasting, uNorthing = _utmLetters(uLat, uLon, uZone, uEasting, uNorthing)
+        zone[utm] = uZone
+        letter1[utm] = l1
+        letter2[utm] = l2
+        letter3[utm] = l3
+        easting[utm] = uEasting
+        northing[utm] = uNorthing
+
+    if ups.any():
+        pLat = lat[ups]
+        pEasting, pNorthing = _toPolarStereographic(pLat, lon[ups])
+        l1, l2, l3 = _upsLetters(pLat, pEasting, pNorthing)
+        letter1[ups] = l1
+        letter2[ups] = l2
+        letter3[ups] = l3
+        easting[ups] = pEasting
+        northing[ups] = pNorthing
+
+    return zone, letter1, letter2, letter3, easting, northing
+
+def _checkPrecision(precision):
+    precision = int(precision)
+    if precision < 0 or precision > 5:
+        raise ValueError('precision must be between 0 and 5. Input was ' + str(precision))
+    return precision
+
+def encode(lats, lons, precision=5):
+    #vectorized equivalent of [Grid(lat,lon,precision).grid_id for lat,lon in zip(lats,lons)]
+    #returns a numpy array of MGRS grid ids with the shape of the broadcast inputs
+    lats, lons = np.broadcast_arrays(np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+    precision = _checkPrecision(precision)
+
+    zone, letter1, letter2, letter3, easting, northing = _locate(lats, lons)
+    ids = _mgrsStrings(zone, letter1, letter2, letter3, _digits(easting, precision), _digits(northing, precision), precision)
+    return ids.reshape(lats.shape)
+
+def _encodeCells(lats, lons, precision):
+    #encode straight to packed cells (see to_int), without building the strings
+    zone, letter1, letter2, letter3, easting, northing = _locate(np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+    return _pack(zone, letter1, letter2, letter3, _digits(easting, precision), _digits(northing, precision), precision)
+
+
+    ##############
+    #            #
+    #   DECODE   #
+    #            #
+    ##############
+
+def _asStrings(ids):
+    #accepts numpy string/object arrays, sequences of strings and pyarrow string arrays/chunked arrays
+    if hasattr(ids, 'to_pylist') and hasattr(ids, 'to_numpy'):
+        ids = ids.to_numpy(zero_copy_only=False)
+
+    ids = np.asarray(ids)
+    if ids.dtype.kind not in 'US':
+        ids = ids.astype('U')
+    if ids.size == 0:
+        return ids.astype('S1')
+
+    ids = np.char.replace(np.char.upper(ids), ' ', '')
+    return ids.astype('S')
+
+def _parse(ids):
+    #splits MGRS ids into zone, letters, easting, northing and precision in bulk
+    #zone is 0 for UPS ids, easting and northing are in meters inside the 100km grid square
+    ids = _asStrings(ids)
+    shape = ids.shape
+    ids = ids.ravel()
+
+    n = len(ids)
+    width = ids.dtype.itemsize
+    chars = np.zeros((n, width + 16), dtype=np.uint8)
+    chars[:, :width] = ids.view(np.uint8).reshape(n, width)
+
+    isDigit = (chars >= 48) & (chars <= 57)
+    isAlpha = (chars >= 65) & (chars <= 90)
+    digits = np.where(isDigit, chars.astype(np.int64) - 48, 0)
+    length = (chars != 0).sum(axis=1)
+    rows = np.arange(n)
+
+    zoneDigits = np.argmin(isDigit, axis=1)
+    lettersAt = zoneDigits[:, None] + np.arange(3)
+    numbersAt = zoneDigits + 3
+    numbers = length - numbersAt
+
+    trailingDigits = isDigit.sum(axis=1) - zoneDigits
+    valid = (zoneDigits <= 2) & isAlpha[rows[:, None], lettersAt].all(axis=1) & (numbers >= 0) & (numbers <= 10) & (numbers % 2 == 0) & (trailingDigits == numbers)
+
+    zone = np.where(zoneDigits == 2, digits[:, 0] * 10 + digits[:, 1], np.where(zoneDigits == 1, digits[:, 0], 0))
+    letters = chars[rows[:, None], lettersAt].astype(np.int64) - 65
+    letter1, letter2, letter3 = letters[:, 0], letters[:, 1], letters[:, 2]
+    valid &= (zoneDigits == 0) | ((zone >= 1) & (zone <= 60))
+    valid &= ~((letters == _I) | (letters == _O)).any(axis=1)
+
+    precision = numbers // 2
+    east = np.zeros(n, dtype=np.int64)
+    north = np.zeros(n, dtype=np.int64)
+    for i in range(5):
+        inPrecision = i < precision
+        east = np.where(inPrecision, east * 10 + digits[rows, numbersAt + i], east)
+        north = np.where(inPrecision, north * 10 + digits[rows, numbersAt + precision + i], north)
+
+    if not valid.all():
+        bad = ids[~valid][0].decode('ascii')
+        raise ValueError(str(int((~valid).sum())) + ' invalid MGRS grid ids, for example "' + bad + '"')
+
+    return shape, zone, letter1, letter2, letter3, east, north, precision
+
+def _utmFromGrid(zone, letter1, letter2, letter3, easting, northing):
+    #Convert_MGRS_To_UTM for the 100km square, returns full easting, northing and the hemisphere
+    southern = letter1 < _N
+    ltr2Low, patternOffset = _gridValues(zone)
+    ltr2High = ltr2Low + 7 + (ltr2Low == _J)
+
+    bandRow = _BAND_ROW[letter1]
+    valid = (bandRow >= 0) & (letter2 >= ltr2Low) & (letter2 <= ltr2High) & (letter3 <= _V)
+    valid &= ~((letter1 == _X) & ((zone == 32) | (zone == 34) | (zone == 36)))
+    if not valid.all():
+        raise ValueError(str(int((~valid).sum())) + ' MGRS grid ids have an invalid latitude band or 100km grid square')
+
+    rowLetterNorthing = letter3 * _ONEHT
+    gridEasting = (letter2 - ltr2Low + 1) * _ONEHT
+    gridEasting = np.where((ltr2Low == _J) & (letter2 > _O), gridEasting - _ONEHT, gridEasting)
+
+    rowLetterNorthing = np.where(letter3 > _O, rowLetterNorthing - _ONEHT, rowLetterNorthing)
+    rowLetterNorthing = np.where(letter3 > _I, rowLetterNorthing - _ONEHT, rowLetterNorthing)
+    rowLetterNorthing = np.where(rowLetterNorthing >= _TWOMIL, rowLetterNorthing - _TWOMIL, rowLetterNorthing)
+
+    gridNorthing = rowLetterNorthing - patternOffset
+    gridNorthing = np.where(gridNorthing < 0, gridNorthing + _TWOMIL, gridNorthing)
+    gridNorthing = gridNorthing + _BAND_NORTHING_OFFSET[bandRow]
+    gridNorthing = np.where(gridNorthing < _BAND_MIN_NORTHING[bandRow], gridNorthing + _TWOMIL, gridNorthing)
+
+    return gridEasting + easting, gridNorthing + northing, southern
+
+def _upsFromGrid(letter1, letter2, letter3, easting, northing):
+    #Convert_MGRS_To_UPS, returns full easting, northing and the hemisphere
+    table = np.array([_UPS_TABLE.get(i, (-1, -1, -1, 0.0, 0.0)) for i in range(26)])
+    ltr2Low, ltr2High, ltr3High = [table[letter1, i].astype(np.int64) for i in range(3)]
+    falseEasting, falseNorthing = table[letter1, 3], table[letter1, 4]
+
+    valid = (ltr2Low >= 0) & (letter2 >= ltr2Low) & (letter2 <= ltr2High) & (letter3 <= ltr3High)
+    valid &= ~np.isin(letter2, [ord(i) - 65 for i in 'DEMNVW'])
+    if not valid.all():
+        raise ValueError(str(int((~valid).sum())) + ' MGRS grid ids have an invalid polar grid square')
+
+    gridNorthing = letter3 * _ONEHT + falseNorthing
+    gridNorthing = np.where(letter3 > _I, gridNorthing - _ONEHT, gridNorthing)
+    gridNorthing = np.where(letter3 > _O, gridNorthing - _ONEHT, gridNorthing)
+
+    gridEasting = (letter2 - ltr2Low) * _ONEHT + falseEasting
+    west = ltr2Low != _A
+    gridEasting = np.where(west & (letter2 > _L), gridEasting - 300000.0, gridEasting)
+    gridEasting = np.where(west & (letter2 > _U), gridEasting - 200000.0, gridEasting)
+    gridEasting = np.where(~west & (letter2 > _C), gridEasting - 200000.0, gridEasting)
+    gridEasting = np.where(~west & (letter2 > _I), gridEasting - _ONEHT, gridEasting)
+    gridEasting = np.where(~west & (letter2 > _L), gridEasting - 300000.0, gridEasting)
+
+    return gridEasting + easting, gridNorthing + northing, letter1 < _Y
+
+def _corners(zone, letter1, letter2, letter3, east, north, precision, center=False):
+    #flat degree latitudes and longitudes of the southwest corners (or centers) of parsed grids
+    multiplier = np.power(10.0, 5 - precision)
+    easting = east * multiplier
+    northing = north * multiplier
+    if center:
+        easting = easting + multiplier / 2.0
+        northing = northing + multiplier / 2.0
+
+    lat = np.zeros(len(zone))
+    lon = np.zeros(len(zone))
+
+    utm = zone != 0
+    if utm.any():
+        uZone = zone[utm]
+        uEasting, uNorthing, southern = _utmFromGrid(uZone, letter1[utm], letter2[utm], letter3[utm], easting[utm], northing[utm])
+        lat[utm], lon[utm] = _fromTransverseMercator(uEasting, uNorthing, _centralMeridian(uZone), np.where(southern, 10000000.0, 0.0))
+
+    ups = ~utm
+    if ups.any():
+        pEasting, pNorthing, southern = _upsFromGrid(letter1[ups], letter2[ups], letter3[ups], easting[ups], northing[ups])
+        lat[ups], lon[ups] = _fromPolarStereographic(pEasting, pNorthing, southern)
+
+    return lat * 180.0 / _PI, lon * 180.0 / _PI
+
+def decode(ids, center=False):
+    #vectorized equivalent of [(Grid(i).lat,Grid(i).lon) for i in ids]
+    #returns float64 arrays of latitudes and longitudes of the southwest corner of each grid
+    #or of its center when center is True
+    shape, zone, letter1, letter2, letter3, east, north, precision = _parse(ids)
+    lat, lon = _corners(zone, letter1, letter2, letter3, east, north, precision, center)
+    return lat.reshape(shape), lon.reshape(shape)
+
+
+    #######################
+    #                     #
+    #   PACKED INTEGERS   #
+    #                     #
+    #######################
+
+#a cell packs into 59 bits of a uint64, most significant first:
+#   zone (6) | band (5) | column (5) | row (5) | level 1 ... level 5 (7 each) | precision (3)
+#each level holds one easting and one northing digit as 10*e+n and unused levels are 0,
+#so a cell's parent at precision p shares its top 21+7*p bits. Parents sort directly before
+#their children and all descendants of a cell form one contiguous range of integers
+
+_PRECISION_BITS = 3
+_LEVEL_BITS = 7
+
+def _levelShift(precision):
+    #bits below the last level used by a cell of this precision
+    return _PRECISION_BITS + _LEVEL_BITS * (5 - precision)
+
+def _packCell(zone, band, column, row, easting, northing, precision):
+    #single cell version of _pack, letters are alphabet indexes
+    value = ((zone * 32 + band) * 32 + column) * 32 + row
+    for i in range(5):
+        value = value << _LEVEL_BITS
+        if i < precision:
+            scale = 10 ** (precision - 1 - i)
+            value += (easting // scale % 10) * 10 + northing // scale % 10
+    return (value << _PRECISION_BITS) + precision
+
+def _unpackCell(value):
+    #inverse of _packCell
+    value = int(value)
+    precision = value & 7
+    if precision > 5 or value >> 59:
+        raise ValueError('Invalid packed MGRS cell: ' + str(value))
+
+    easting = 0
+    northing = 0
+    for i in range(precision):
+        pair = (value >> _levelShift(i + 1)) & 127
+        if pair > 99:
+            raise ValueError('Invalid packed MGRS cell: ' + str(value))
+        easting = easting * 10 + pair // 10
+        northing = northing * 10 + pair % 10
+
+    square = value >> _levelShift(0)
+    zone, band, column, row = square >> 15, (square >> 10) & 31, (square >> 5) & 31, square & 31
+    if zone > 60 or max(band, column, row) > 25:
+        raise ValueError('Invalid packed MGRS cell: ' + str(value))
+
+    return zone, band, column, row, easting, northing, precision
+
+def _containsCell(parent, child):
+    #True if child is strictly inside parent, both packed
+    p = parent & 7
+    return (child & 7) > p and (child >> _levelShift(p)) == (parent >> _levelShift(p))
+
+#divisor that brings the digit of level i to the units place by precision, levels a precision does
+#not use get one larger than any easting or northing so their digits come out 0
+_LEVEL_SCALES = np.array([[10 ** (p - 1 - i) if i < p else 10 ** 6 for i in range(5)] for p in range(6)], dtype=np.int64)
+
+def _pack(zone, band, column, row, easting, northing, precision):
+    value = ((zone * 32 + band) * 32 + column) * 32 + row
+    scales = _LEVEL_SCALES[precision]
+    for i in range(5):
+        scale = scales[..., i]
+        value = (value << _LEVEL_BITS) + (easting // scale % 10) * 10 + northing // scale % 10
+    return ((value << _PRECISION_BITS) + precision).astype(np.uint64)
+
+def to_int(ids):
+    #packs MGRS grid ids into uint64 cells, see Grid.to_int
+    shape, zone, letter1, letter2, letter3, east, north, precision = _parse(ids)
+    return _pack(zone, letter1, letter2, letter3, east, north, precision).reshape(shape)
+
+def _unpack(values):
+    #vectorized _unpackCell of a flat array of cells
+    values = np.asarray(values, dtype=np.uint64).ravel().astype(np.int64)
+
+    precision = values & 7
+    square = values >> _levelShift(0)
+    zone, letter1, letter2, letter3 = square >> 15, (square >> 10) & 31, (square >> 5) & 31, square & 31
+
+    east = np.zeros(len(values), dtype=np.int64)
+    north = np.zeros(len(values), dtype=np.int64)
+    valid = (precision <= 5) & (values >> 59 == 0) & (zone <= 60) & (letter1 <= 25) & (letter2 <= 25) & (letter3 <= 25)
+    for i in range(5):
+        inPrecision = i < precision
+        pair = (values >> _levelShift(i + 1)) & 127
+        valid &= ~inPrecision | (pair <= 99)
+        east = np.where(inPrecision, east * 10 + pair // 10, east)
+        north = np.where(inPrecision, north * 10 + pair % 10, north)
+
+    if not valid.all():
+        raise ValueError(str(int((~valid).sum())) + ' invalid packed MGRS cells')
+
+    return zone, letter1, letter2, letter3, east, north, precision
+
+def from_int(values):
+    #unpacks uint64 cells into MGRS grid ids, the inverse of to_int
+    values = np.asarray(values, dtype=np.uint64)
+    return _mgrsStrings(*_unpack(values)).reshape(values.shape)
+
+def _decodeCells(values, center=False):
+    #decode for a flat array of packed cells
+    return _corners(*_unpack(values), center=center)
+
+def contains(parents, children):
+    #True where each packed child lies strictly inside the matching packed parent (inputs broadcast)
+    parents, children = np.broadcast_arrays(np.asarray(parents, dtype=np.uint64), np.asarray(children, dtype=np.uint64))
+    shift = (_PRECISION_BITS + _LEVEL_BITS * (5 - (parents & np.uint64(7)).astype(np.int64))).astype(np.uint64)
+    return ((children & np.uint64(7)) > (parents & np.uint64(7))) & ((children >> shift) == (parents >> shift))
+
+
+    #################
+    #               #
+    #   HIERARCHY   #
+    #               #
+    #################
+
+#resizing a packed cell only touches its levels: coarser cells clear the levels they drop and
+#finer cells are the southwestern child, whose extra levels are already 0
+
+def _resizeCells(values, precision):
+    values = np.asarray(values, dtype=np.uint64)
+    precision = np.asarray(precision, dtype=np.int64)
+    if ((precision < 0) | (precision > 5)).any():
+        raise ValueError('precision must be between 0 and 5. Input was ' + str(precision.min() if (precision < 0).any() else precision.max()))
+
+    keep = np.minimum((values & np.uint64(7)).astype(np.int64), precision)
+    shift = (_PRECISION_BITS + _LEVEL_BITS * (5 - keep)).astype(np.uint64)
+    return ((values >> shift) << shift) | precision.astype(np.uint64)
+
+def resize(ids, precision):
+    #MGRS grid ids at a new precision, see Grid.resize
+    return from_int(_resizeCells(to_int(ids), precision))
+
+def increase(ids, by=1):
+    #MGRS grid ids by precision levels finer, see Grid.increase
+    values = to_int(ids)
+    precision = (values & np.uint64(7)).astype(np.int64) + by
+    if (precision > 5).any():
+        raise ValueError(str(int((precision > 5).sum())) + ' MGRS grid ids can not be increased by ' + str(by) + ', the maximum precision is 5')
+    return from_int(_resizeCells(values, precision))
+
+def decrease(ids, by=1):
+    #MGRS grid ids by precision levels coarser, see Grid.decrease
+    values = to_int(ids)
+    precision = (values & np.uint64(7)).astype(np.int64) - by
+    if (precision < 0).any():
+        raise ValueError(str(int((precision < 0).sum())) + ' MGRS grid ids can not be decreased by ' + str(by) + ', the minimum precision is 0')
+    return from_int(_resizeCells(values, precision))
+
+def _childOffsets(depth):
+    #packed levels of every child depth levels down, relative to the last of those levels,
+    #ordered like Grid.children: easting major, northing minor
+    count = 10 ** depth
+    easting, northing = np.divmod(np.arange(count * count, dtype=np.int64), count)
+    offsets = np.zeros(count * count, dtype=np.int64)
+    for i in range(depth):
+        scale = 10 ** (depth - 1 - i)
+        offsets = (offsets << _LEVEL_BITS) + (easting // scale % 10) * 10 + northing // scale % 10
+    return offsets.astype(np.uint64)
+
+def _descendantCells(values, depth):
+    #packed children depth levels down of packed cells, with one more trailing axis
+    precision = (values & np.uint64(7)).astype(np.int64) + depth
+    base = _resizeCells(values, precision)
+    shift = (_PRECISION_BITS + _LEVEL_BITS * (5 - precision)).astype(np.uint64)
+    return base[..., None] | (_childOffsets(depth) << shift[..., None])
+
+def children(ids, depth=1):
+    #all 100**depth children of every MGRS grid id, as an array with one more trailing axis
+    values = to_int(ids)
+    precision = (values & np.uint64(7)).astype(np.int64) + depth
+    if depth < 1 or (precision > 5).any():
+        raise ValueError(str(int((precision > 5).sum())) + ' MGRS grid ids have no children ' + str(depth) + ' levels down')
+    return from_int(_descendantCells(values, depth))
+
+#a cell's descendants run from the cell itself up to the cell with every bit below its last
+#level set, so a sorted array of cells none of which is inside another is a set of disjoint ranges
+
+def _rangeEnds(values):
+    shift = (_PRECISION_BITS + _LEVEL_BITS * (5 - (values & np.uint64(7)).astype(np.int64))).astype(np.uint64)
+    return values | ((np.uint64(1) << shift) - np.uint64(1))
+
+def _compactCells(values):
+    #sorted packed cells, dropping those inside another and replacing every complete set of 100
+    #children by their parent, from precision 5 up
+    values = np.asarray(values, dtype=np.uint64).ravel()
+    if not (values[1:] > values[:-1]).all():
+        values = np.unique(values)
+    if len(values) > 1:
+        inside = np.zeros(len(values), dtype=bool)
+        inside[1:] = values[1:] <= np.maximum.accumulate(_rangeEnds(values[:-1]))
+        values = values[~inside]
+
+    #sorted cells of each precision, the children of one parent sit next to each other
+    precisions = values & np.uint64(7)
+    levels = [values[precisions == p] for p in range(6)]
+    for precision in range(5, 0, -1):
+        cells = levels[precision]
+        if len(cells) < 100:
+            continue
+        parents = _resizeCells(cells, precision - 1)
+        starts = np.flatnonzero(np.concatenate([[True], parents[1:] != parents[:-1]]))
+        counts = np.diff(np.append(starts, len(cells)))
+        if (counts == 100).any():
+            levels[precision] = cells[~np.repeat(counts == 100, counts)]
+            levels[precision - 1] = np.sort(np.concatenate([levels[precision - 1], parents[starts[counts == 100]]]))
+    return np.sort(np.concatenate(levels))
+
+def _uncompactCells(values, precision):
+    #sorted packed cells of precision inside the packed cells
+    values = np.asarray(values, dtype=np.uint64).ravel()
+    precisions = (values & np.uint64(7)).astype(np.int64)
+    if (precisions > precision).any():
+        raise ValueError(str(int((precisions > precision).sum())) + ' MGRS grid ids are finer than precision ' + str(precision))
+    chunks = [_descendantCells(values[precisions == p], precision - p).ravel() for p in np.unique(precisions)]
+    return np.unique(np.concatenate([np.zeros(0, dtype=np.uint64)] + chunks))
+
+def _coveredCells(keys, values):
+    #True where each packed cell is one of the sorted compacted keys or inside one of them
+    if not len(keys):
+        return np.zeros(values.shape, dtype=bool)
+    at = np.maximum(np.searchsorted(keys, values, side='right') - 1, 0)
+    return (values >= keys[at]) & (values <= _rangeEnds(keys[at]))
+
+def compact(ids):
+    #the fewest MGRS grid ids covering the same ground as ids: ids inside another are dropped and
+    #every complete set of 100 children is replaced by their parent, repeatedly
+    return from_int(_compactCells(to_int(ids)))
+
+def uncompact(ids, precision=5):
+    #every MGRS grid id of precision inside ids, the inverse of compact
+    return from_int(_uncompactCells(to_int(ids), _checkPrecision(precision)))
+
+def covered(ids, covering):
+    #True where each MGRS grid id is one of covering or inside one of them, covering is compacted
+    #first so this is a binary search per id whatever the mix of precisions
+    values = to_int(ids)
+    return _coveredCells(_compactCells(to_int(covering)), values.ravel()).reshape(values.shape)
+
+
+    #################
+    #               #
+    #   NEIGHBORS   #
+    #               #
+    #################
+
+#neighbors are found by digit arithmetic: the easting/northing digits roll over into the
+#next 100km grid square, whose column and row letters follow from the zone's lettering
+#pattern. That is only valid while the neighbor keeps the zone and latitude band, so every
+#100km square is checked once for seams; neighbors in UPS or across a seam are found by
+#re-encoding the point one cell over in the cell's own projection
+
+#north, east, south, west and then the diagonals northeast, southeast, southwest, northwest
+_NEIGHBOR_OFFSETS = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (1, -1), (-1, -1), (-1, 1)]
+
+#(zone, band, column, row) -> True if no zone or band seam crosses the 100km grid square
+_cleanSquares = {}
+
+#centers of the 1m cells every 1km along the border of a 100km grid square, a square whose
+#whole border round trips into the same zone and band lies inside them
+_BORDER = np.append(np.arange(0.5, 100000.0, 1000.0), 99999.5)
+_BORDER_EAST = np.concatenate([_BORDER, _BORDER, np.full(len(_BORDER), 0.5), np.full(len(_BORDER), 99999.5)])
+_BORDER_NORTH = np.concatenate([np.full(len(_BORDER), 0.5), np.full(len(_BORDER), 99999.5), _BORDER, _BORDER])
+
+#100km squares checked per pass, each one projects and encodes len(_BORDER_EAST) points
+_SQUARES_PER_PASS = 1024
+
+def _checkSquares(squares):
+    #fills _cleanSquares for an (n, 4) array of zone, band, column, row, a bounded number of
+    #squares at a time
+    for i in range(0, len(squares), _SQUARES_PER_PASS):
+        _checkSquarePass(squares[i:i + _SQUARES_PER_PASS])
+
+def _checkSquarePass(squares):
+    n = len(squares)
+    samples = len(_BORDER_EAST)
+    zone, band, column, row = [np.repeat(squares[:, i], samples) for i in range(4)]
+    try:
+        easting, northing, southern = _utmFromGrid(zone, band, column, row, np.tile(_BORDER_EAST, n), np.tile(_BORDER_NORTH, n))
+        lat, lon = _fromTransverseMercator(easting, northing, _centralMeridian(zone), np.where(southern, 10000000.0, 0.0))
+        ids = encode(lat * _RAD_TO_DEG, lon * _RAD_TO_DEG, 0)
+    except ValueError:
+        #one bad square fails the whole batch, so settle them one at a time
+        if n == 1:
+            _cleanSquares[tuple(int(i) for i in squares[0])] = False
+        else:
+            for i in range(n):
+                _checkSquarePass(squares[i:i + 1])
+        return
+
+    origin = np.zeros(n, dtype=np.int64)
+    expected = _mgrsStrings(squares[:, 0], squares[:, 1], squares[:, 2], squares[:, 3], origin, origin, 0)
+    clean = (ids.reshape(n, samples) == expected[:, None]).all(axis=1)
+    for square, isClean in zip(squares, clean):
+        _cleanSquares[tuple(int(i) for i in square)] = bool(isClean)
+
+def _squareKeysClean(keys):
+    #_squareIsClean of UTM squares given as ((zone * 32 + band) * 32 + column) * 32 + row, the
+    #top bits of their packed cells
+    keys, inverse = np.unique(keys, return_inverse=True)
+    squares = np.stack([keys >> 15, (keys >> 10) & 31, (keys >> 5) & 31, keys & 31], axis=1)
+    unchecked = np.array([tuple(int(j) for j in s) not in _cleanSquares for s in squares], dtype=bool)
+    if unchecked.any():
+        _checkSquares(squares[unchecked])
+    clean = np.array([_cleanSquares[tuple(int(j) for j in s)] for s in squares], dtype=bool)
+    return clean[inverse.ravel()]
+
+def _squareIsClean(zone, band, column, row):
+    key = (zone, band, column, row)
+    if key not in _cleanSquares:
+        _checkSquares(np.array([key], dtype=np.int64))
+    return _cleanSquares[key]
+
+def _neighborParts(zone, band, column, row, easting, northing, precision, dx, dy):
+    #single cell neighbor dx, dy cells over by digit arithmetic, letters are alphabet indexes.
+    #returns None where it has to be found by projection instead
+    if zone == 0:
+        return None
+
+    size = 10 ** precision
+    carryEast, easting = divmod(easting + dx, size)
+    carryNorth, northing = divmod(northing + dy, size)
+
+    if carryEast:
+        #eight columns per zone, lettered from ltr2Low skipping I and O
+        ltr2Low = (_S, _A, _J)[(zone % 6 or 6) % 3]
+        k = column - ltr2Low - (ltr2Low == _J and column > _O) + carryEast
+        if not 0 <= k <= 7:
+            return None
+        column = ltr2Low + k
+        column += ltr2Low == _J and column > _N
+
+    if carryNorth:
+        #twenty rows A-V skipping I and O, repeating every 2000km
+        row = (row - (row > _I) - (row > _O) + carryNorth) % 20
+        row += row > _H
+        row += row > _N
+
+    if not _squareIsClean(zone, band, column, row):
+        return None
+
+    return zone, band, column, row, easting, northing, precision
+
+def _shiftedCenters(zone, letter1, letter2, letter3, east, north, precision, dx, dy):
+    #lat/lon in degrees of the centers of the cells dx, dy cells over, measured in each cell's
+    #own UTM or UPS projection. Used where digit arithmetic can not find the neighbor
+    multiplier = np.power(10.0, 5 - precision)
+    easting = (east + dx + 0.5) * multiplier
+    northing = (north + dy + 0.5) * multiplier
+
+    lat = np.zeros(len(zone))
+    lon = np.zeros(len(zone))
+
+    utm = zone != 0
+    if utm.any():
+        uZone = zone[utm]
+        uEasting, uNorthing, southern = _utmFromGrid(uZone, letter1[utm], letter2[utm], letter3[utm], easting[utm], northing[utm])
+        lat[utm], lon[utm] = _fromTransverseMercator(uEasting, uNorthing, _centralMeridian(uZone), np.where(southern, 10000000.0, 0.0))
+
+    ups = ~utm
+    if ups.any():
+        pEasting, pNorthing, southern = _upsFromGrid(letter1[ups], letter2[ups], letter3[ups], easting[ups], northing[ups])
+        lat[ups], lon[ups] = _fromPolarStereographic(pEasting, pNorthing, southern)
+
+    lat = lat * _RAD_TO_DEG
+    #crossing the antimeridian
+    lon = lon * _RAD_TO_DEG
+    lon = np.where(lon > 180.0, lon - 360.0, np.where(lon < -180.0, lon + 360.0, lon))
+    return lat, lon
+
+def _neighborCells(zone, letter1, letter2, letter3, east, north, precision, diagonal=False):
+    #packed 4 (or with diagonal 8) neighbors of unpacked cells, one row per cell in the order of
+    #Grid.adjacent
+    n = len(zone)
+    offsets = _NEIGHBOR_OFFSETS[:8 if diagonal else 4]
+    out = np.zeros((n, len(offsets)), dtype=np.uint64)
+
+    size = 10 ** precision
+    ltr2Low, patternOffset = _gridValues(np.where(zone == 0, 6, zone))
+    columnIndex = letter2 - ltr2Low - ((ltr2Low == _J) & (letter2 > _O))
+    rowIndex = letter3 - (letter3 > _I) - (letter3 > _O)
+
+    for i, (dx, dy) in enumerate(offsets):
+        carryEast, nEast = np.divmod(east + dx, size)
+        carryNorth, nNorth = np.divmod(north + dy, size)
+
+        column = columnIndex + carryEast
+        valid = (zone != 0) & (column >= 0) & (column <= 7)
+        column = ltr2Low + column
+        column = column + ((ltr2Low == _J) & (column > _N))
+
+        row = (rowIndex + carryNorth) % 20
+        row = row + (row > _H)
+        row = row + (row > _N)
+
+        valid[valid] = _squareKeysClean((((zone * 32 + letter1) * 32 + column) * 32 + row)[valid])
+
+        if valid.any():
+            out[valid, i] = _pack(zone[valid], letter1[valid], column[valid], row[valid], nEast[valid], nNorth[valid], precision[valid])
+
+        shifted = ~valid
+        if shifted.any():
+            lat, lon = _shiftedCenters(zone[shifted], letter1[shifted], letter2[shifted], letter3[shifted], east[shifted], north[shifted], precision[shifted], dx, dy)
+            cells = np.zeros(len(lat), dtype=np.uint64)
+            for p in np.unique(precision[shifted]):
+                atPrecision = precision[shifted] == p
+                cells[atPrecision] = _encodeCells(lat[atPrecision], lon[atPrecision], int(p))
+            out[shifted, i] = cells
+
+    return out
+
+def neighbors(ids, diagonal=False):
+    #the 4 (or with diagonal 8) neighbors of every MGRS grid id, as an array with one more
+    #trailing axis in the order of Grid.adjacent
+    shape, zone, letter1, letter2, letter3, east, north, precision = _parse(ids)
+    cells = _neighborCells(zone, letter1, letter2, letter3, east, north, precision, diagonal)
+    return _mgrsStrings(*_unpack(cells)).reshape(shape + (cells.shape[1],))
+
+def _shiftedCenter(zone, band, column, row, easting, northing, precision, dx, dy):
+    #single cell version of _shiftedCenters
+    lat, lon = _shiftedCenters(*[np.array([i]) for i in (zone, band, column, row, easting, northing, precision)], dx=dx, dy=dy)
+    return float(lat[0]), float(lon[0])
+
+
+    #################
+    #               #
+    #   GEODESICS   #
+    #               #
+    #################
+
+_wgs84 = FrameE(name='WGS84')
+
+#below this many pairs the array overhead costs more than solving them one at a time
+_SCALAR_PAIRS = 64
+
+def _inverseOne(lat1, lon1, lat2, lon2):
+    #_inverse for a single pair of floats, with the math module
+    L = (lon2 - lon1 + _PI) % _TWO_PI - _PI
+    U1 = math.atan((1 - _f) * math.tan(lat1))
+    U2 = math.atan((1 - _f) * math.tan(lat2))
+    sinU1, cosU1, sinU2, cosU2 = math.sin(U1), math.cos(U1), math.sin(U2), math.cos(U2)
+
+    lamda = L
+    for i in range(200):
+        sinLamda, cosLamda = math.sin(lamda), math.cos(lamda)
+        sinSigma = math.hypot(cosU2 * sinLamda, cosU1 * sinU2 - sinU1 * cosU2 * cosLamda)
+        cosSigma = sinU1 * sinU2 + cosU1 * cosU2 * cosLamda
+        sigma = math.atan2(sinSigma, cosSigma)
+        sinAlpha = 0.0 if sinSigma == 0 else cosU1 * cosU2 * sinLamda / sinSigma
+        cos2Alpha = 1 - sinAlpha * sinAlpha
+        cos2SigmaM = 0.0 if cos2Alpha == 0 else cosSigma - 2 * sinU1 * sinU2 / cos2Alpha
+        C = _f / 16 * cos2Alpha * (4 + _f * (4 - 3 * cos2Alpha))
+        last = lamda
+        lamda = L + (1 - C) * _f * sinAlpha * (sigma + C * sinSigma * (cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM * cos2SigmaM)))
+        if math.fabs(lamda - last) <= 1e-12:
+            break
+    else:
+        a = _wgs84.GeoPoint(latitude=lat1, longitude=lon1, z=0)
+        b = _wgs84.GeoPoint(latitude=lat2, longitude=lon2, z=0)
+        return [float(i) for i in a.distance_and_azimuth(b)]
+
+    u2 = cos2Alpha * (_a * _a - _b * _b) / (_b * _b)
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (cosSigma * (-1 + 2 * cos2SigmaM * cos2SigmaM)
+        - B / 6 * cos2SigmaM * (-3 + 4 * sinSigma * sinSigma) * (-3 + 4 * cos2SigmaM * cos2SigmaM)))
+
+    sinLamda, cosLamda = math.sin(lamda), math.cos(lamda)
+    return (_b * A * (sigma - deltaSigma),
+        math.atan2(cosU2 * sinLamda, cosU1 * sinU2 - sinU1 * cosU2 * cosLamda),
+        math.atan2(cosU1 * sinLamda, cosU1 * sinU2 * cosLamda - sinU1 * cosU2))
+
+def _inverse(lat1, lon1, lat2, lon2):
+    #Vincenty's inverse solution on the WGS84 ellipsoid, inputs in radians and broadcast.
+    #returns the distance in meters and the azimuths (radians) at both ends. Nearly antipodal
+    #points, where the iteration does not converge, are solved one by one with nvector
+    lat1, lon1, lat2, lon2 = [np.asarray(i, dtype=np.float64) for i in (lat1, lon1, lat2, lon2)]
+
+    shape = np.broadcast_shapes(lat1.shape, lon1.shape, lat2.shape, lon2.shape)
+    if math.prod(shape) <= _SCALAR_PAIRS:
+        pairs = [_inverseOne(*i) for i in zip(*[np.broadcast_to(i, shape).ravel().tolist() for i in (lat1, lon1, lat2, lon2)])]
+        return tuple(np.array([i[j] for i in pairs]).reshape(shape) for j in range(3))
+
+    #reduced latitudes are found before broadcasting, once per point rather than once per pair
+    U1 = np.arctan((1 - _f) * np.tan(lat1))
+    U2 = np.arctan((1 - _f) * np.tan(lat2))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    L = (lon2 - lon1 + _PI) % _TWO_PI - _PI
+    lat1, lon1, lat2, lon2, sinU1, cosU1, sinU2, cosU2, L = [i.ravel() if i.shape == shape else np.broadcast_to(i, shape).ravel()
+        for i in (lat1, lon1, lat2, lon2, sinU1, cosU1, sinU2, cosU2, L)]
+    ss, cc, cs, sc = sinU1 * sinU2, cosU1 * cosU2, cosU1 * sinU2, sinU1 * cosU2
+
+    #each pass only works on the pairs that have not converged yet
+    lamda = L.copy()
+    sinSigma, cosSigma, sigma = np.empty_like(L), np.empty_like(L), np.empty_like(L)
+    cos2Alpha, cos2SigmaM = np.empty_like(L), np.empty_like(L)
+    active = slice(None)
+    for i in range(200):
+        sinLamda, cosLamda = np.sin(lamda[active]), np.cos(lamda[active])
+        sinS = np.hypot(cosU2[active] * sinLamda, cs[active] - sc[active] * cosLamda)
+        cosS = ss[active] + cc[active] * cosLamda
+        sig = np.arctan2(sinS, cosS)
+
+        coincident = sinS == 0
+        sinAlpha = np.where(coincident, 0.0, cc[active] * sinLamda / np.where(coincident, 1.0, sinS))
+        c2A = 1 - sinAlpha * sinAlpha
+        equatorial = c2A == 0
+        c2SM = np.where(equatorial, 0.0, cosS - 2 * ss[active] / np.where(equatorial, 1.0, c2A))
+
+        sinSigma[active], cosSigma[active], sigma[active] = sinS, cosS, sig
+        cos2Alpha[active], cos2SigmaM[active] = c2A, c2SM
+
+        C = _f / 16 * c2A * (4 + _f * (4 - 3 * c2A))
+        step = L[active] + (1 - C) * _f * sinAlpha * (sig + C * sinS * (c2SM + C * cosS * (-1 + 2 * c2SM * c2SM)))
+        moving = np.fabs(step - lamda[active]) > 1e-12
+        lamda[active] = step
+        active = np.flatnonzero(moving) if isinstance(active, slice) else active[moving]
+        if not active.size:
+            break
+
+    u2 = cos2Alpha * (_a * _a - _b * _b) / (_b * _b)
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (cosSigma * (-1 + 2 * cos2SigmaM * cos2SigmaM)
+        - B / 6 * cos2SigmaM * (-3 + 4 * sinSigma * sinSigma) * (-3 + 4 * cos2SigmaM * cos2SigmaM)))
+    distance = _b * A * (sigma - deltaSigma)
+
+    sinLamda, cosLamda = np.sin(lamda), np.cos(lamda)
+    azimuth1 = np.arctan2(cosU2 * sinLamda, cs - sc * cosLamda)
+    azimuth2 = np.arctan2(cosU1 * sinLamda, cs * cosLamda - sc)
+
+    for i in active:
+        a = _wgs84.GeoPoint(latitude=lat1[i], longitude=lon1[i], z=0)
+        b = _wgs84.GeoPoint(latitude=lat2[i], longitude=lon2[i], z=0)
+        distance[i], azimuth1[i], azimuth2[i] = a.distance_and_azimuth(b)
+
+    distance, azimuth1, azimuth2 = distance.reshape(shape), azimuth1.reshape(shape), azimuth2.reshape(shape)
+    return distance, azimuth1, azimuth2
+
+def _ecef(lat, lon):
+    #earth centered, earth fixed x, y, z (meters) of points on the WGS84 ellipsoid, inputs in
+    #radians. The straight line between two points is never longer than the geodesic between them
+    sinLat, cosLat = np.sin(lat), np.cos(lat)
+    N = _a / np.sqrt(1 - _es * sinLat * sinLat)
+    return np.stack([N * cosLat * np.cos(lon), N * cosLat * np.sin(lon), N * (1 - _es) * sinLat], axis=-1)
+
+#points summed at a time by _meanPosition
+_MEAN_CHUNK = 1 << 20
+
+def _meanPosition(lats, lons):
+    #geographic mean of points, in and out in degrees: the normalized sum of their n-vectors (the
+    #unit normals to the ellipsoid), so it does not care about the antimeridian or the poles.
+    #None when the points balance out around the earth's center and there is no mean
+    x = y = z = 0.0
+    for start in range(0, len(lats), _MEAN_CHUNK):
+        lat = np.asarray(lats[start:start + _MEAN_CHUNK], dtype=np.float64) * _DEG_TO_RAD
+        lon = np.asarray(lons[start:start + _MEAN_CHUNK], dtype=np.float64) * _DEG_TO_RAD
+        cosLat = np.cos(lat)
+        x += float(np.dot(cosLat, np.cos(lon)))
+        y += float(np.dot(cosLat, np.sin(lon)))
+        z += float(np.sin(lat).sum())
+
+    horizontal = math.hypot(x, y)
+    if math.hypot(horizontal, z) <= 1e-9 * len(lats):
+        return None
+    return math.atan2(z, horizontal) * _RAD_TO_DEG, math.atan2(y, x) * _RAD_TO_DEG
+
+
+    ##################
+    #                #
+    #   RECTANGLES   #
+    #                #
+    ##################
+
+#a rectangle is measured in the UTM (or UPS) projection of the cell it is centered on, its
+#home frame, and holds every cell whose southwest corner lies inside it. Cells of the home
+#frame are enumerated directly and get their letters from their 100km grid square, only
+#squares crossed by a zone or band seam are checked cell by cell. Other zones the rectangle
+#reaches into are found by sampling it, and their cells are checked one by one
+
+#cells per chunk yielded by iterRectBuffer
+_CHUNK = 65536
+
+#(zone, southern, square easting, square northing) -> (band, column, row) of a 100km square in
+#a projection frame, or None if a seam crosses it
+_frameSquares = {}
+
+def _toFrame(lat, lon, zone, southern):
+    #lat/lon (radians) to easting/northing in one fixed frame, unlike encode the false northing
+    #does not change at the equator so the frame stays continuous
+    if zone == 0:
+        return _toPolarStereographic(lat, lon, np.full(len(lat), southern))
+    return _toTransverseMercator(lat, lon, _centralMeridian(np.int64(zone)), 10000000.0 if southern else 0.0)
+
+def _fromFrame(easting, northing, zone, southern):
+    if zone == 0:
+        return _fromPolarStereographic(easting, northing, np.full(len(easting), southern))
+    return _fromTransverseMercator(easting, northing, _centralMeridian(np.int64(zone)), 10000000.0 if southern else 0.0)
+
+def _inFrame(zone, letter1, frame):
+    #True where parsed ids belong to the frame
+    if frame[0] == 0:
+        return (zone == 0) & ((letter1 < _Y) == frame[1])
+    return zone == frame[0]
+
+def _squareLetters(frame, squareEastings, squareNorthings):
+    #band, column and row of the 100km squares at every squareNorthings x squareEastings index in a
+    #frame, as (rows, columns) tables. ok is False where a seam crosses the square
+    keys = [(frame[0], frame[1], int(e), int(n)) for n in squareNorthings for e in squareEastings]
+    unchecked = [k for k in keys if k not in _frameSquares]
+
+    if unchecked:
+        squares = np.array([k[2:] for k in unchecked], dtype=np.float64)
+        lat, lon = _fromFrame(squares[:, 0] * _ONEHT + 50000.0, squares[:, 1] * _ONEHT + 50000.0, *frame)
+        _, zone, letter1, letter2, letter3, _, _, _ = _parse(encode(lat * _RAD_TO_DEG, lon * _RAD_TO_DEG, 0))
+        for k, z, l1, l2, l3 in zip(unchecked, zone, letter1, letter2, letter3):
+            clean = frame[0] != 0 and z == frame[0] and _squareIsClean(int(z), int(l1), int(l2), int(l3))
+            _frameSquares[k] = (int(l1), int(l2), int(l3)) if clean else None
+
+    letters = [_frameSquares[k] for k in keys]
+    shape = (len(squareNorthings), len(squareEastings))
+    ok = np.array([i is not None for i in letters], dtype=bool).reshape(shape)
+    table = np.array([i if i is not None else (0, 0, 0) for i in letters], dtype=np.int64).reshape(shape + (3,))
+    return table[..., 0], table[..., 1], table[..., 2], ok
+
+#points along each side of a cell that decide whether it reaches into its frame's zone, by
+#precision. Larger cells get more so that thin slivers cut off by a curved seam are still found
+_CELL_POINTS = [9, 7, 5, 3, 3, 3]
+
+#the points on the border are moved this many meters inside the cell, well clear of the
+#1e-10 radian longitude offset geotrans adds before projecting
+_INSET = 0.01
+
+def _packFromFrame(easting, northing, frame, precision):
+    #packs the cells with these southwest corners in a frame that cover some part of the frame's
+    #zone. A cell a band seam crosses is returned once per band
+    size = 10 ** (5 - precision)
+    cells = []
+    along = np.linspace(_INSET, size - _INSET, _CELL_POINTS[precision])
+    for x in along:
+        for y in along:
+            lat, lon = _fromFrame(easting + x, northing + y, *frame)
+            zone, letter1, letter2, letter3, east, north = _locate(lat * _RAD_TO_DEG, lon * _RAD_TO_DEG)
+            keep = _inFrame(zone, letter1, frame)
+            cells.append(_pack(zone[keep], letter1[keep], letter2[keep], letter3[keep], _digits(east[keep], precision), _digits(north[keep], precision), precision))
+    return np.unique(np.concatenate(cells))
+
+def _homeCell(gridId):
+    #the frame of a grid id and the easting, northing of its southwest corner in it
+    _, zone, letter1, letter2, letter3, east, north, precision = _parse([gridId])
+    precision = int(precision[0])
+    size = 10 ** (5 - precision)
+    if zone[0]:
+        easting, northing, southern = _utmFromGrid(zone, letter1, letter2, letter3, east * size * 1.0, north * size * 1.0)
+    else:
+        easting, northing, southern = _upsFromGrid(letter1, letter2, letter3, east * size * 1.0, north * size * 1.0)
+    return (int(zone[0]), bool(southern[0])), int(easting[0]), int(northing[0]), precision, size
+
+def _packHomeCells(home, easting, northing, precision):
+    #packs cells of the home frame by their (integer) southwest corners, using the letters of
+    #their 100km square and only checking cells one by one in squares crossed by a seam
+    size = 10 ** (5 - precision)
+    squareEasting = easting // 100000
+    squareNorthing = northing // 100000
+    west = squareEasting.min()
+    south = squareNorthing.min()
+    bands, columns, rows, clean = _squareLetters(home, np.arange(west, squareEasting.max() + 1), np.arange(south, squareNorthing.max() + 1))
+
+    square = (squareNorthing - south, squareEasting - west)
+    ok = clean[square]
+    cells = _pack(home[0], bands[square][ok], columns[square][ok], rows[square][ok], easting[ok] % 100000 // size, northing[ok] % 100000 // size, precision)
+    if not ok.all():
+        cells = np.concatenate([cells, _packFromFrame(easting[~ok], northing[~ok], home, precision)])
+    return cells
+
+def _frames(home, box, size):
+    #samples the border and inside of a box in the home frame to find every frame it reaches
+    #into, returns {frame: (lat, lon) of the samples in it}
+    west, east, south, north = box
+    edge = int(min(1024, max(east - west, north - south) // size + 2))
+    along = np.linspace(0.0, 1.0, edge)
+    grid = np.linspace(0.0, 1.0, 32)
+    u = np.concatenate([along, along, np.zeros(edge), np.ones(edge), np.repeat(grid, 32)])
+    v = np.concatenate([np.zeros(edge), np.ones(edge), along, along, np.tile(grid, 32)])
+
+    lat, lon = _fromFrame(west + u * (east - west), south + v * (north - south), *home)
+    lat = lat * _RAD_TO_DEG
+    lon = lon * _RAD_TO_DEG
+    _, zone, letter1, _, _, _, _, _ = _parse(encode(lat, lon, 0))
+
+    frames = {}
+    for z in np.unique(zone):
+        if z == 0:
+            for southern in (True, False):
+                inIt = (zone == 0) & ((letter1 < _Y) == southern)
+                if inIt.any():
+                    frames[(0, southern)] = (lat[inIt], lon[inIt])
+        else:
+            southern = home[1] if home[0] != 0 else bool((lat[zone == z] < 0).all())
+            frames[(int(z), southern)] = (lat[zone == z], lon[zone == z])
+    return frames
+
+def _iterOtherFrames(home, box, precision, keep):
+    #packed cells of the frames other than home that the box reaches into, enumerated over the
+    #bounds of the samples that fell in each frame. keep(lat, lon, easting, northing) takes the
+    #southwest corners in radians and in the home frame and picks the cells to return
+    size = 10 ** (5 - precision)
+    spacing = max(box[1] - box[0], box[3] - box[2]) / 31.0 + size
+    for frame, (lat, lon) in _frames(home, box, size).items():
+        if frame == home:
+            continue
+
+        sampleEasting, sampleNorthing = _toFrame(lat * _DEG_TO_RAD, lon * _DEG_TO_RAD, *frame)
+        columns = np.arange((sampleEasting.min() - spacing) // size, (sampleEasting.max() + spacing) // size + 1, dtype=np.int64) * size
+        rows = np.arange((sampleNorthing.min() - spacing) // size, (sampleNorthing.max() + spacing) // size + 1, dtype=np.int64) * size
+
+        step = max(1, _CHUNK // len(columns))
+        for i in range(0, len(rows), step):
+            cellEasting = np.tile(columns, len(rows[i:i + step])).astype(np.float64)
+            cellNorthing = np.repeat(rows[i:i + step], len(columns)).astype(np.float64)
+
+            cellLat, cellLon = _fromFrame(cellEasting, cellNorthing, *frame)
+            homeEasting, homeNorthing = _toFrame(cellLat, cellLon, *home)
+            kept = keep(cellLat, cellLon, homeEasting, homeNorthing)
+            if kept.any():
+                cells = _packFromFrame(cellEasting[kept], cellNorthing[kept], frame, precision)
+                if len(cells):
+                    yield cells
+
+def iterRectBuffer(gridId, width, height=None):
+    #generator of uint64 arrays of packed cells that together make up rectBuffer(gridId, width, height)
+    if height is None:
+        height = width
+
+    home, x, y, precision, size = _homeCell(gridId)
+    width = max(width, 0)
+    height = max(height, 0)
+    return _iterBoxCells(home, (x - width / 2.0, x + width / 2.0, y - height / 2.0, y + height / 2.0), precision)
+
+def _iterBoxCells(home, box, precision):
+    #generator of uint64 arrays of the packed cells whose southwest corner is in a box (west,
+    #east, south, north meters) of the home frame, whichever frame they belong to
+    size = 10 ** (5 - precision)
+
+    #the home frame, a block of rows at a time
+    columns = np.arange(-(-box[0] // size), box[1] // size + 1, dtype=np.int64) * size
+    rows = np.arange(-(-box[2] // size), box[3] // size + 1, dtype=np.int64) * size
+    step = max(1, _CHUNK // max(len(columns), 1))
+    for i in range(0, len(rows) if len(columns) else 0, step):
+        cells = _packHomeCells(home, np.tile(columns, len(rows[i:i + step])), np.repeat(rows[i:i + step], len(columns)), precision)
+        if len(cells):
+            yield cells
+
+    #the cells of other frames whose southwest corner falls in the rectangle
+    def inBox(lat, lon, easting, northing):
+        return (easting >= box[0]) & (easting <= box[1]) & (northing >= box[2]) & (northing <= box[3])
+
+    for cells in _iterOtherFrames(home, box, precision, inBox):
+        yield cells
+
+def rectBuffer(gridId, width, height=None):
+    #uint64 array of every packed cell whose southwest corner is in a rectangle width by height
+    #meters centered on the southwest corner of gridId, see Grid.rectBuffer
+    chunks = list(iterRectBuffer(gridId, width, height))
+    if not chunks:
+        return np.zeros(0, dtype=np.uint64)
+    return np.concatenate(chunks)
+
+
+    #############
+    #           #
+    #   DISKS   #
+    #           #
+    #############
+
+#a disk or annulus holds every cell whose southwest corner is between inner and radius meters
+#(geodesic) from the southwest corner of the cell it is centered on. Rows of the home frame
+#are scanned with the easting span of each row worked out from the planar distance, widened and
+#narrowed by the least and greatest point scale factor of the frame over the disk, so that only
+#the few cells at the ends of each span need an exact distance
+
+#the point scale of transverse mercator is k0 cosh(x / k0 R) and of polar stereographic
+#k0 (1 + rho^2 / 4 k0^2 R^2) on a sphere of radius R, x being the distance from the central
+#meridian and rho from the pole. The ellipsoid's radii of curvature lie between the meridional
+#radius at the equator and the radius at the poles, which bound the scale from both sides, and
+#_SCALE_SLACK covers what is left of the ellipsoid's departure from those spheres
+_UPS_SCALE = 0.994
+_MIN_RADIUS = _a * (1 - _es)
+_MAX_RADIUS = _a * _a / _b
+_SCALE_SLACK = 0.0005
+
+def _scaleRange(center, radius):
+    #least and greatest point scale factor of the home frame within radius meters of the center
+    (zone, _southern), x, y = center[:3]
+    reach = radius
+    for _ in range(2):
+        #planar distances reach kmax times the geodesic ones, so the box is found twice
+        if zone:
+            near, far = _axisRange(x - reach, x + reach, _utmFalseEasting)
+            low = _utmScale * math.cosh(near / (_utmScale * _MAX_RADIUS))
+            high = _utmScale * math.cosh(far / (_utmScale * _MIN_RADIUS))
+        else:
+            nearX, farX = _axisRange(x - reach, x + reach, _upsFalseEasting)
+            nearY, farY = _axisRange(y - reach, y + reach, _upsFalseNorthing)
+            low = _UPS_SCALE * (1 + (nearX * nearX + nearY * nearY) / (4 * _UPS_SCALE * _UPS_SCALE * _MAX_RADIUS * _MAX_RADIUS))
+            high = _UPS_SCALE * (1 + (farX * farX + farY * farY) / (4 * _UPS_SCALE * _UPS_SCALE * _MIN_RADIUS * _MIN_RADIUS))
+        reach = radius * high * (1 + _SCALE_SLACK) + center[-1]
+    return low * (1 - _SCALE_SLACK), high * (1 + _SCALE_SLACK)
+
+def _axisRange(start, stop, origin):
+    #nearest and farthest distance from origin of the interval start, stop
+    far = max(abs(start - origin), abs(stop - origin))
+    near = 0.0 if start <= origin <= stop else min(abs(start - origin), abs(stop - origin))
+    return near, far
+
+def _spans(dy, outer, inner, size):
+    #cell offsets (in cells) east of the center that may lie in the annulus, for rows dy meters
+    #north of it. Returns the offsets and the row each belongs to
+    far = np.floor(np.sqrt(np.clip(outer * outer - dy * dy, 0, None)) / size).astype(np.int64)
+    hole = np.where(inner > np.fabs(dy), np.ceil(np.sqrt(np.clip(inner * inner - dy * dy, 0, None)) / size).astype(np.int64) - 1, -1)
+    inRow = np.fabs(dy) <= outer
+
+    #each row is split around its hole into an eastern and a western span
+    eastStart = np.maximum(hole + 1, 0)
+    westEnd = -np.maximum(hole + 1, 1)
+    starts = np.stack([-far, eastStart], axis=1).ravel()
+    counts = np.clip(np.stack([westEnd + far + 1, far - eastStart + 1], axis=1), 0, None)
+    counts = np.where(inRow[:, None], counts, 0).ravel()
+
+    total = counts.sum()
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+    row = np.repeat(np.repeat(np.arange(len(dy)), 2), counts)
+    return offsets, row
+
+def _annulus(lat, lon, radius, inner):
+    #keep function of _iterOtherFrames for the cells between inner and radius meters of lat, lon
+    def inAnnulus(cellLat, cellLon, easting, northing):
+        distance = _inverse(lat, lon, cellLat, cellLon)[0]
+        return (distance <= radius) & (distance >= inner)
+    return inAnnulus
+
+def _bufferCenter(gridId):
+    #home frame, southwest corner in it and in radians, precision and size of a buffer's center
+    home, x, y, precision, size = _homeCell(gridId)
+    lat, lon = _fromFrame(np.array([float(x)]), np.array([float(y)]), *home)
+    return home, x, y, float(lat[0]), float(lon[0]), precision, size
+
+def _bufferRows(center, dy, radius, inner):
+    #packed cells of the home frame in the annulus, for rows dy meters north of the center
+    home, x, y, lat, lon, precision, size = center
+    low, high = _scaleRange(center, radius)
+    outer = radius * high
+    hole = inner * low
+    sureOuter = radius * low
+    sureInner = inner * high
+
+    offsets, row = _spans(dy.astype(np.float64), outer, hole, size)
+    dx = offsets * size
+    planar = np.hypot(dx, dy[row])
+
+    #only the cells near either end of a span need their geodesic distance
+    unsure = (planar > sureOuter) | (planar < sureInner)
+    if unsure.any():
+        cellLat, cellLon = _fromFrame((x + dx[unsure]).astype(np.float64), (y + dy[row][unsure]).astype(np.float64), *home)
+        keep = ~unsure
+        keep[unsure] = _annulus(lat, lon, radius, inner)(cellLat, cellLon, None, None)
+        dx = dx[keep]
+        row = row[keep]
+
+    if not len(dx):
+        return np.zeros(0, dtype=np.uint64)
+    return _packHomeCells(home, x + dx, y + dy[row], precision)
+
+def _bufferBlocks(center, radius):
+    #the rows north of the center a disk spans, in blocks of about _CHUNK cells
+    size = center[-1]
+    outer = radius * _scaleRange(center, radius)[1]
+    rows = np.arange(-int(outer // size), int(outer // size) + 1, dtype=np.int64) * size
+    step = max(1, _CHUNK // (2 * int(outer // size) + 1))
+    return [rows[i:i + step] for i in range(0, len(rows), step)]
+
+def _iterBufferOtherFrames(center, radius, inner):
+    home, x, y, lat, lon, precision, size = center
+    box = (x - radius, x + radius, y - radius, y + radius)
+    return _iterOtherFrames(home, box, precision, _annulus(lat, lon, radius, inner))
+
+def iterBuffer(gridId, radius, inner=0):
+    #generator of uint64 arrays of packed cells that together make up buffer(gridId, radius, inner)
+    center = _bufferCenter(gridId)
+
+    #the home frame, a block of rows at a time
+    for dy in _bufferBlocks(center, radius):
+        cells = _bufferRows(center, dy, radius, inner)
+        if len(cells):
+            yield cells
+
+    #cells of other frames
+    for cells in _iterBufferOtherFrames(center, radius, inner):
+        yield cells
+
+def buffer(gridId, radius, inner=0):
+    #uint64 array of every packed cell whose southwest corner is between inner and radius meters
+    #from the southwest corner of gridId, see Grid.buffer
+    chunks = list(iterBuffer(gridId, radius, inner))
+    if not chunks:
+        return np.zeros(0, dtype=np.uint64)
+    return np.concatenate(chunks)
+
+
+    ################
+    #              #
+    #   MATRICES   #
+    #              #
+    ################
+
+#mean earth radius for the spherical methods
+_EARTH_RADIUS = 6371008.8
+
+#pairs worked on at a time, bounds the temporary arrays of a large matrix
+_MATRIX_CHUNK = 1 << 20
+
+def _latLons(points):
+    #latitudes and longitudes (radians) of a single Grid, a collection of Grids, MGRS grid ids
+    #or an (n, 2) array of latitude, longitude pairs in degrees
+    if hasattr(points, 'lat'):
+        points = [points]
+    if not isinstance(points, np.ndarray):
+        points = list(points) if not hasattr(points, 'to_pylist') else points.to_pylist()
+        if len(points) and hasattr(points[0], 'lat'):
+            points = np.array([(i.lat, i.lon) for i in points], dtype=np.float64)
+        elif len(points) and isinstance(points[0], str):
+            lat, lon = decode(points)
+            return lat * _DEG_TO_RAD, lon * _DEG_TO_RAD
+        else:
+            points = np.asarray(points, dtype=np.float64)
+
+    if points.dtype.kind in 'US':
+        lat, lon = decode(points.ravel())
+        return lat * _DEG_TO_RAD, lon * _DEG_TO_RAD
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points[:, 0] * _DEG_TO_RAD, points[:, 1] * _DEG_TO_RAD
+
+#the spherical methods take sines and cosines of each point, and of half its angles, before
+#broadcasting and combine them with the angle sum and difference identities, so the only
+#trigonometry done per pair is the final arcsin or arctan2
+
+def _halfAngles(lat1, lon1, lat2, lon2):
+    return [(np.sin(i / 2.0), np.cos(i / 2.0)) for i in (lat1, lon1, lat2, lon2)]
+
+def _haversine(lat1, lon1, lat2, lon2):
+    (sLat1, cLat1), (sLon1, cLon1), (sLat2, cLat2), (sLon2, cLon2) = _halfAngles(lat1, lon1, lat2, lon2)
+    sinLat = sLat2 * cLat1 - cLat2 * sLat1
+    sinLon = sLon2 * cLon1 - cLon2 * sLon1
+    h = sinLat * sinLat + np.cos(lat1) * np.cos(lat2) * sinLon * sinLon
+    return 2.0 * _EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+def _sphericalBearing(lat1, lon1, lat2, lon2):
+    sinLon1, cosLon1, sinLon2, cosLon2 = np.sin(lon1), np.cos(lon1), np.sin(lon2), np.cos(lon2)
+    sinLat1, cosLat1, sinLat2, cosLat2 = np.sin(lat1), np.cos(lat1), np.sin(lat2), np.cos(lat2)
+    sinLon = sinLon2 * cosLon1 - cosLon2 * sinLon1
+    cosLon = cosLon2 * cosLon1 + sinLon2 * sinLon1
+    return np.arctan2(sinLon * cosLat2, cosLat1 * sinLat2 - sinLat1 * cosLat2 * cosLon)
+
+def _equirectangular(lat1, lon1, lat2, lon2):
+    #planar offsets (x east, y north) in meters, on the sphere
+    (sLat1, cLat1), _lon1, (sLat2, cLat2), _lon2 = _halfAngles(lat1, 0.0, lat2, 0.0)
+    dLon = lon2 - lon1
+    dLon -= _TWO_PI * np.rint(dLon / _TWO_PI)
+    return dLon * (cLat1 * cLat2 - sLat1 * sLat2) * _EARTH_RADIUS, (lat2 - lat1) * _EARTH_RADIUS
+
+def _distances(lat1, lon1, lat2, lon2, method):
+    if method == 'geodesic':
+        return _inverse(lat1, lon1, lat2, lon2)[0]
+    elif method == 'haversine':
+        return _haversine(lat1, lon1, lat2, lon2)
+    elif method == 'equirectangular':
+        x, y = _equirectangular(lat1, lon1, lat2, lon2)
+        return np.sqrt(x * x + y * y)
+    raise ValueError('method must be one of geodesic, haversine or equirectangular. Input was ' + str(method))
+
+def _bearings(lat1, lon1, lat2, lon2, method):
+    if method == 'geodesic':
+        bearing = _inverse(lat1, lon1, lat2, lon2)[1]
+    elif method == 'haversine':
+        bearing = _sphericalBearing(lat1, lon1, lat2, lon2)
+    elif method == 'equirectangular':
+        x, y = _equirectangular(lat1, lon1, lat2, lon2)
+        bearing = np.arctan2(x, y)
+    else:
+        raise ValueError('method must be one of geodesic, haversine or equirectangular. Input was ' + str(method))
+    return bearing * _RAD_TO_DEG
+
+def _matrix(a, b, method, solve):
+    lat1, lon1 = _latLons(a)
+    lat2, lon2 = lat1, lon1
+    if b is not None:
+        lat2, lon2 = _latLons(b)
+
+    out = np.zeros((len(lat1), len(lat2)))
+    step = max(1, _MATRIX_CHUNK // max(len(lat2), 1))
+    for i in range(0, len(lat1), step):
+        out[i:i + step] = solve(lat1[i:i + step, None], lon1[i:i + step, None], lat2[None, :], lon2[None, :], method)
+    return out
+
+def distance_matrix(a, b=None, method='geodesic'):
+    #meters between every point of a (rows) and every point of b (columns), b defaults to a.
+    #method is geodesic (WGS84, as Grid.distance), haversine or equirectangular
+    return _matrix(a, b, method, _distances)
+
+def bearing_matrix(a, b=None, method='geodesic'):
+    #bearing in degrees (-180 to 180, as Grid.bearing) from every point of a (rows) to every
+    #point of b (columns), b defaults to a
+    return _matrix(a, b, method, _bearings)
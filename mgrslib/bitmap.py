@@ -0,0 +1,411 @@
+#
+#  mgrslib.bitmap
+#  Regions of MGRS cells of one precision kept as bitmaps of each 100km grid square
+#
+#  Within a 100km grid square the cells of precision p form a 10^p by 10^p lattice. A
+#  BitmapRegion cuts each square's lattice into 64 by 64 tiles and keeps only the tiles holding
+#  cells, as 64 uint64 rows of one bit a cell. Set algebra is bitwise and, or and not of matching
+#  tiles, and a one cell buffer is the region shifted one cell each way and or-ed together.
+#
+#  Cells on the edge of a square, and every cell of a square a zone or band seam crosses (or of a
+#  polar square), have neighbors outside the lattice, so they are stepped with the exact neighbor
+#  kernel of mgrslib.batch instead.
+#
+#  Copyright 2017-2021 (c) Peter E Lenz [pelenz@pelenz.com]
+#  MIT License, see mgrslib.py
+#
+
+import numpy as np
+
+from .batch import _unpack, _pack, _neighborCells, _squareKeysClean, _checkPrecision
+from .mgrslib import Grid, mgrsSet
+from .rtree import _asCells
+
+
+    #############
+    #           #
+    #   TILES   #
+    #           #
+    #############
+
+#cells along the side of a tile, one uint64 row of bits each
+_TILE = 64
+
+#a tile is keyed by square << 22 | tile row << 11 | tile column, square being the top 21 bits of
+#its packed cells. 10^5 / 64 rounds up to 1563 tiles a side, which fits in 11 bits
+_TILE_BITS = 11
+_TILE_MASK = (1 << _TILE_BITS) - 1
+
+_ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+_ONE = np.uint64(1)
+
+#set bits in every byte value
+_BIT_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+def _emptyTiles():
+    return np.zeros(0, dtype=np.int64), np.zeros((0, _TILE), dtype=np.uint64)
+
+def _tileKeys(square, tileRow, tileColumn):
+    return (square << (2 * _TILE_BITS)) | (tileRow << _TILE_BITS) | tileColumn
+
+def _keyParts(keys):
+    return keys >> (2 * _TILE_BITS), (keys >> _TILE_BITS) & _TILE_MASK, keys & _TILE_MASK
+
+def _lastTile(precision):
+    #index of the last tile along a side, and how many cells of it are inside the lattice
+    side = 10 ** precision
+    last = (side - 1) // _TILE
+    return last, side - last * _TILE
+
+def _lowBits(count):
+    return _ALL >> np.uint64(_TILE - count)
+
+def _latticeMask(keys, precision):
+    #the bits of each tile that are cells of the lattice, tiles on the far edges are cut short
+    last, width = _lastTile(precision)
+    _square, tileRow, tileColumn = _keyParts(keys)
+    columns = np.where(tileColumn == last, _lowBits(width), _ALL)
+    rows = np.where(tileRow[:, None] == last, np.arange(_TILE)[None, :] < width, True)
+    return np.where(rows, columns[:, None], np.uint64(0))
+
+def _rimMask(keys, precision):
+    #the bits of each tile that are cells on the edge of their square's lattice
+    last, width = _lastTile(precision)
+    _square, tileRow, tileColumn = _keyParts(keys)
+    mask = np.zeros((len(keys), _TILE), dtype=np.uint64)
+    mask[tileRow == 0, 0] = _ALL
+    mask[tileRow == last, width - 1] = _ALL
+    mask |= np.where(tileColumn == 0, _ONE, np.uint64(0))[:, None]
+    mask |= np.where(tileColumn == last, _ONE << np.uint64(width - 1), np.uint64(0))[:, None]
+    return mask & _latticeMask(keys, precision)
+
+def _compact(keys, bits):
+    #drops empty tiles
+    full = bits.any(axis=1)
+    return keys[full], bits[full]
+
+def _take(keys, bits, want):
+    #the tiles keyed want, empty where there is no such tile
+    out = np.zeros((len(want), _TILE), dtype=np.uint64)
+    if len(keys) and len(want):
+        at = np.minimum(np.searchsorted(keys, want), len(keys) - 1)
+        found = keys[at] == want
+        out[found] = bits[at[found]]
+    return out
+
+def _fromCells(cells):
+    #(keys, bits) of packed cells of one precision
+    if not len(cells):
+        return _emptyTiles()
+    zone, letter1, letter2, letter3, east, north, _precision = _unpack(cells)
+    square = ((zone * 32 + letter1) * 32 + letter2) * 32 + letter3
+
+    #one word per tile row, the bits of every cell in it or-ed together
+    word = _tileKeys(square, north // _TILE, east // _TILE) * _TILE + north % _TILE
+    bit = _ONE << (east % _TILE).astype(np.uint64)
+    order = np.argsort(word, kind='stable')
+    word, bit = word[order], bit[order]
+    starts = np.flatnonzero(np.concatenate([[True], word[1:] != word[:-1]]))
+    values = np.bitwise_or.reduceat(bit, starts)
+    word = word[starts]
+
+    keys, tile = np.unique(word // _TILE, return_inverse=True)
+    bits = np.zeros((len(keys), _TILE), dtype=np.uint64)
+    bits[tile.ravel(), word % _TILE] = values
+    return keys, bits
+
+def _toCells(keys, bits, precision):
+    #packed cells of the set bits, in tile order
+    tile, row = np.nonzero(bits)
+    words = np.ascontiguousarray(bits[tile, row], dtype='<u8')
+    expanded = np.unpackbits(words.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    which, column = np.nonzero(expanded)
+    tile, row = tile[which], row[which]
+
+    square, tileRow, tileColumn = _keyParts(keys[tile])
+    return _pack(square >> 15, (square >> 10) & 31, (square >> 5) & 31, square & 31, tileColumn * _TILE + column, tileRow * _TILE + row, precision)
+
+def _contains(keys, bits, cells, precision):
+    #True for each packed cell that is set
+    if not len(keys):
+        return np.zeros(cells.shape, dtype=bool)
+    zone, letter1, letter2, letter3, east, north, cellPrecision = _unpack(cells)
+    square = ((zone * 32 + letter1) * 32 + letter2) * 32 + letter3
+    want = _tileKeys(square, north // _TILE, east // _TILE)
+    at = np.minimum(np.searchsorted(keys, want), len(keys) - 1)
+    word = bits[at, north % _TILE]
+    found = (keys[at] == want) & (cellPrecision == precision) & ((word >> (east % _TILE).astype(np.uint64)) & _ONE).astype(bool)
+    return found.reshape(cells.shape)
+
+def _cleanTiles(keys):
+    #True for tiles of UTM squares no seam crosses, where lattice neighbors are MGRS neighbors
+    square = keys >> (2 * _TILE_BITS)
+    clean = square >> 15 != 0
+    if clean.any():
+        clean[clean] = _squareKeysClean(square[clean])
+    return clean
+
+def _union(parts):
+    keys = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + [k for k, _b in parts]))
+    bits = np.zeros((len(keys), _TILE), dtype=np.uint64)
+    for k, b in parts:
+        bits[np.searchsorted(keys, k)] |= b
+    return keys, bits
+
+def _shift(keys, bits, precision, dNorth, dEast):
+    #the set moved one cell north, south, east or west within each square's lattice. Cells moved
+    #off the lattice are dropped
+    last, _width = _lastTile(precision)
+    square, tileRow, tileColumn = _keyParts(keys)
+    row, column = tileRow + dNorth, tileColumn + dEast
+    ok = (row >= 0) & (row <= last) & (column >= 0) & (column <= last)
+    targets = np.union1d(keys, _tileKeys(square[ok], row[ok], column[ok]))
+
+    #bits moving across a tile edge come from the tile behind each target
+    square, tileRow, tileColumn = _keyParts(targets)
+    row, column = tileRow - dNorth, tileColumn - dEast
+    ok = (row >= 0) & (row <= last) & (column >= 0) & (column <= last)
+    same = _take(keys, bits, targets)
+    behind = np.zeros_like(same)
+    behind[ok] = _take(keys, bits, _tileKeys(square[ok], row[ok], column[ok]))
+
+    moved = np.empty_like(same)
+    if dEast == 1:
+        moved = (same << _ONE) | (behind >> np.uint64(_TILE - 1))
+    elif dEast == -1:
+        moved = (same >> _ONE) | (behind << np.uint64(_TILE - 1))
+    elif dNorth == 1:
+        moved[:, 1:] = same[:, :-1]
+        moved[:, 0] = behind[:, -1]
+    else:
+        moved[:, :-1] = same[:, 1:]
+        moved[:, -1] = behind[:, 0]
+    return _compact(targets, moved & _latticeMask(targets, precision))
+
+def _moved(keys, bits, precision, dNorth, dEast):
+    #_shift for moves of one cell in any of the eight directions
+    if dNorth:
+        keys, bits = _shift(keys, bits, precision, dNorth, 0)
+    if dEast:
+        keys, bits = _shift(keys, bits, precision, 0, dEast)
+    return keys, bits
+
+
+    ####################
+    #                  #
+    #   BITMAP REGION  #
+    #                  #
+    ####################
+
+#(north, east) steps to the four side neighbors, then the four corner neighbors
+_MOVES = [(1, 0), (0, 1), (-1, 0), (0, -1), (1, 1), (-1, 1), (-1, -1), (1, -1)]
+
+#first bytes of a region written by tobytes
+_MAGIC = b'MGRSBM01'
+
+#kinds of tile in tobytes: 64 rows of bits, a list of set positions, or every lattice cell set.
+#A list is shorter than the rows while it holds fewer than _ARRAY_LIMIT positions
+_BITMAP, _ARRAY, _FULL = 0, 1, 2
+_ARRAY_LIMIT = _TILE * _TILE // 16
+
+class BitmapRegion(object):
+    #set of MGRS cells of one precision stored as bitmaps, see the notes at the top of the module
+
+    def __init__(self, cells=(), precision=None):
+        cells = np.unique(_asCells(cells))
+        precisions = np.unique(cells & np.uint64(7)).astype(np.int64).tolist()
+        if precision is None:
+            if len(precisions) != 1:
+                raise ValueError('a BitmapRegion needs cells of one precision, or a precision when it is empty. Precisions were ' + str(precisions))
+            precision = precisions[0]
+        _checkPrecision(precision)
+        if precisions and precisions != [precision]:
+            raise ValueError('a BitmapRegion of precision ' + str(precision) + ' can not hold cells of precisions ' + str(precisions))
+
+        self.precision = precision
+        self.__keys, self.__bits = _fromCells(cells)
+
+    @classmethod
+    def __fromTiles(cls, keys, bits, precision):
+        region = cls.__new__(cls)
+        region.precision = precision
+        region.__keys, region.__bits = keys, bits
+        return region
+
+    def __len__(self):
+        return int(_BIT_COUNTS[self.__bits.view(np.uint8)].sum())
+
+    def __contains__(self, cell):
+        return bool(_contains(self.__keys, self.__bits, _asCells([cell]), self.precision)[0])
+
+    def __iter__(self):
+        for cell in self.cells().tolist():
+            yield Grid.from_int(cell)
+
+    def __eq__(self, other):
+        if not isinstance(other, BitmapRegion):
+            return NotImplemented
+        return self.precision == other.precision and np.array_equal(self.__keys, other.__keys) and np.array_equal(self.__bits, other.__bits)
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        if eq is NotImplemented:
+            return eq
+        return not eq
+
+    def __repr__(self):
+        return 'BitmapRegion(' + str(len(self)) + ' cells at precision ' + str(self.precision) + ')'
+
+    @property
+    def nbytes(self):
+        return self.__keys.nbytes + self.__bits.nbytes
+
+    def cells(self):
+        #uint64 array of the packed cells, sorted
+        return np.sort(_toCells(self.__keys, self.__bits, self.precision))
+
+    def to_set(self):
+        return mgrsSet(self)
+
+    def contains(self, cells):
+        #True for each of an array of packed cells, grid ids or Grids that is in the region
+        return _contains(self.__keys, self.__bits, _asCells(cells), self.precision)
+
+    ####################
+    #                  #
+    #   SET ALGEBRA    #
+    #                  #
+    ####################
+
+    def __other(self, other):
+        if not isinstance(other, BitmapRegion):
+            other = BitmapRegion(other, self.precision)
+        if other.precision != self.precision:
+            raise ValueError('can not combine BitmapRegions of precisions ' + str(self.precision) + ' and ' + str(other.precision))
+        return other.__keys, other.__bits
+
+    def union(self, other):
+        return BitmapRegion.__fromTiles(*_union([(self.__keys, self.__bits), self.__other(other)]), precision=self.precision)
+
+    def intersection(self, other):
+        keys, bits = self.__other(other)
+        keys = np.intersect1d(self.__keys, keys)
+        return BitmapRegion.__fromTiles(*_compact(keys, _take(self.__keys, self.__bits, keys) & _take(*self.__other(other), want=keys)), precision=self.precision)
+
+    def difference(self, other):
+        keys, bits = self.__other(other)
+        return BitmapRegion.__fromTiles(*_compact(self.__keys, self.__bits & ~_take(keys, bits, self.__keys)), precision=self.precision)
+
+    def symmetric_difference(self, other):
+        keys, bits = self.__other(other)
+        keys = np.union1d(self.__keys, keys)
+        return BitmapRegion.__fromTiles(*_compact(keys, _take(self.__keys, self.__bits, keys) ^ _take(*self.__other(other), want=keys)), precision=self.precision)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __xor__ = symmetric_difference
+
+    ##########################
+    #                        #
+    #   DILATION / EROSION   #
+    #                        #
+    ##########################
+
+    def __exactCells(self):
+        #cells the lattice can not step: those on a square's edge and those in unclean squares
+        clean = _cleanTiles(self.__keys)
+        exact = np.where(clean[:, None], self.__bits & _rimMask(self.__keys, self.precision), self.__bits)
+        return clean, _toCells(self.__keys, exact, self.precision)
+
+    def __dilated(self, diagonal):
+        clean, exact = self.__exactCells()
+        keys, bits = self.__keys[clean], self.__bits[clean]
+        parts = [(self.__keys, self.__bits)]
+        parts += [_moved(keys, bits, self.precision, dNorth, dEast) for dNorth, dEast in _MOVES[:8 if diagonal else 4]]
+        parts.append(_fromCells(_neighborCells(*_unpack(exact), diagonal=diagonal).ravel()))
+        return BitmapRegion.__fromTiles(*_union(parts), precision=self.precision)
+
+    def __eroded(self, diagonal):
+        #a cell stays if every neighbor is in the region, that is if it is in the region moved back
+        #from each neighbor
+        clean, exact = self.__exactCells()
+        keys, bits = self.__keys[clean], self.__bits[clean]
+        kept = bits & ~_rimMask(keys, self.precision)
+        for dNorth, dEast in _MOVES[:8 if diagonal else 4]:
+            kept &= _take(*_moved(keys, bits, self.precision, -dNorth, -dEast), want=keys)
+
+        neighbors = _neighborCells(*_unpack(exact), diagonal=diagonal)
+        stays = exact[_contains(self.__keys, self.__bits, neighbors, self.precision).all(axis=1)]
+        return BitmapRegion.__fromTiles(*_union([_compact(keys, kept), _fromCells(stays)]), precision=self.precision)
+
+    def dilate(self, steps=1, diagonal=False):
+        #the region grown by steps cells, each step adds the neighbors of every cell
+        region = self
+        for _i in range(steps):
+            region = region.__dilated(diagonal)
+        return region
+
+    def erode(self, steps=1, diagonal=False):
+        #the region shrunk by steps cells, each step keeps the cells whose neighbors are all in it
+        region = self
+        for _i in range(steps):
+            region = region.__eroded(diagonal)
+        return region
+
+    ###################
+    #                 #
+    #   SERIALIZING   #
+    #                 #
+    ###################
+
+    def tobytes(self, compress=True):
+        #the region as bytes for frombytes. With compress, tiles holding few cells are written as
+        #a list of their positions and tiles holding every cell of the lattice are not written at
+        #all, in the manner of Roaring bitmaps
+        keys, bits = self.__keys, self.__bits
+        kinds = np.full(len(keys), _BITMAP, dtype=np.uint8)
+        counts = np.zeros(len(keys), dtype=np.uint16)
+        if compress:
+            counts[:] = _BIT_COUNTS[bits.view(np.uint8)].reshape(len(keys), _TILE * 8).sum(axis=1)
+            kinds[counts < _ARRAY_LIMIT] = _ARRAY
+            kinds[(bits == _latticeMask(keys, self.precision)).all(axis=1)] = _FULL
+            counts[kinds != _ARRAY] = 0
+
+        #positions, row * 64 + column, of the list tiles in tile order
+        tile, row = np.nonzero(bits * (kinds == _ARRAY)[:, None])
+        words = np.ascontiguousarray(bits[tile, row], dtype='<u8')
+        which, column = np.nonzero(np.unpackbits(words.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little'))
+        positions = (row[which] * _TILE + column).astype('<u2')
+
+        header = np.array([self.precision, len(keys)], dtype='<u8')
+        return b''.join([_MAGIC, header.tobytes(), keys.astype('<i8').tobytes(), kinds.tobytes(), counts.astype('<u2').tobytes(),
+                         bits[kinds == _BITMAP].astype('<u8').tobytes(), positions.tobytes()])
+
+    @classmethod
+    def frombytes(cls, data):
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError('not a BitmapRegion written by tobytes')
+        offset = len(_MAGIC)
+        precision, count = np.frombuffer(data, dtype='<u8', count=2, offset=offset).tolist()
+        offset += 16
+        keys = np.frombuffer(data, dtype='<i8', count=count, offset=offset).astype(np.int64)
+        offset += 8 * count
+        kinds = np.frombuffer(data, dtype=np.uint8, count=count, offset=offset)
+        offset += count
+        counts = np.frombuffer(data, dtype='<u2', count=count, offset=offset).astype(np.int64)
+        offset += 2 * count
+
+        bits = np.zeros((count, _TILE), dtype=np.uint64)
+        dense = kinds == _BITMAP
+        bits[dense] = np.frombuffer(data, dtype='<u8', count=int(dense.sum()) * _TILE, offset=offset).reshape(-1, _TILE)
+        offset += 8 * _TILE * int(dense.sum())
+
+        full = kinds == _FULL
+        bits[full] = _latticeMask(keys[full], precision)
+
+        listed = np.flatnonzero(kinds == _ARRAY)
+        positions = np.frombuffer(data, dtype='<u2', count=int(counts.sum()), offset=offset).astype(np.int64)
+        tile = np.repeat(listed, counts[listed])
+        np.bitwise_or.at(bits, (tile, positions // _TILE), _ONE << (positions % _TILE).astype(np.uint64))
+        return cls.__fromTiles(keys, bits, precision)
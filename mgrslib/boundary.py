@@ -0,0 +1,157 @@
+#
+#  mgrslib.boundary
+#  Exterior and interior cells, connected components and holes of regions of MGRS cells
+#
+#  Regions are arrays of packed cells (see Grid.to_int), given as packed cells, grid ids or
+#  Grids. Neighbors come from digit arithmetic and membership from a binary search of the sorted
+#  cells, so exterior, interior and components take time linear in the size of the region. Holes
+#  also need the cells around the region and take time linear in the area of its bounding box.
+#
+#  Copyright 2017-2021 (c) Peter E Lenz [pelenz@pelenz.com]
+#  MIT License, see mgrslib.py
+#
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .batch import _unpack, _neighborCells, _decodeCells, _toFrame, _iterBoxCells, _DEG_TO_RAD, _N, _Y
+from .rtree import _asCells
+
+
+#cells handled at a time, bounds the temporary neighbor arrays for huge regions
+_CHUNK = 1 << 20
+
+def _lookup(keys, cells):
+    #row of each cell in the sorted keys, -1 where it is not one of them
+    if not len(keys):
+        return np.full(cells.shape, -1, dtype=np.int64)
+    at = np.minimum(np.searchsorted(keys, cells), len(keys) - 1)
+    return np.where(keys[at] == cells, at, -1)
+
+def _neighborRows(cells, keys, diagonal):
+    #rows in keys of the neighbors of each cell, -1 for neighbors that are not in keys
+    return _lookup(keys, _neighborCells(*_unpack(cells), diagonal=diagonal))
+
+
+    ###########################
+    #                         #
+    #   EXTERIOR / INTERIOR   #
+    #                         #
+    ###########################
+
+def _iterExteriorMasks(cells, diagonal):
+    #True for the cells with a neighbor outside the region, a chunk at a time
+    keys = np.unique(cells)
+    for start in range(0, len(cells), _CHUNK):
+        yield (_neighborRows(cells[start:start + _CHUNK], keys, diagonal) < 0).any(axis=1)
+
+def _exteriorMask(cells, diagonal=False):
+    cells = _asCells(cells)
+    return np.concatenate([np.zeros(0, dtype=bool)] + list(_iterExteriorMasks(cells, diagonal)))
+
+def iterExterior(cells, diagonal=False):
+    #generator of uint64 arrays of the cells with at least one neighbor outside the region
+    cells = _asCells(cells)
+    for start, mask in zip(range(0, len(cells), _CHUNK), _iterExteriorMasks(cells, diagonal)):
+        yield cells[start:start + _CHUNK][mask]
+
+def iterInterior(cells, diagonal=False):
+    #generator of uint64 arrays of the cells whose neighbors are all in the region
+    cells = _asCells(cells)
+    for start, mask in zip(range(0, len(cells), _CHUNK), _iterExteriorMasks(cells, diagonal)):
+        yield cells[start:start + _CHUNK][~mask]
+
+def exterior(cells, diagonal=False):
+    #uint64 array of the cells of a region with a neighbor outside it, in the order given
+    return np.concatenate([np.zeros(0, dtype=np.uint64)] + list(iterExterior(cells, diagonal)))
+
+def interior(cells, diagonal=False):
+    #uint64 array of the cells of a region that are not on its exterior, in the order given
+    return np.concatenate([np.zeros(0, dtype=np.uint64)] + list(iterInterior(cells, diagonal)))
+
+
+    ##################
+    #                #
+    #   COMPONENTS   #
+    #                #
+    ##################
+
+def _graph(keys, diagonal, around=None):
+    #adjacency matrix of the sorted keys, and which keys have a neighbor in neither keys nor around
+    rows = []
+    columns = []
+    escapes = np.zeros(len(keys), dtype=bool)
+    for start in range(0, len(keys), _CHUNK):
+        neighbors = _neighborCells(*_unpack(keys[start:start + _CHUNK]), diagonal=diagonal)
+        found = _lookup(keys, neighbors)
+        row, column = np.nonzero(found >= 0)
+        rows.append(row + start)
+        columns.append(found[row, column])
+        if around is not None:
+            escapes[start:start + _CHUNK] = ((found < 0) & (_lookup(around, neighbors) < 0)).any(axis=1)
+
+    rows = np.concatenate([np.zeros(0, dtype=np.int64)] + rows)
+    columns = np.concatenate([np.zeros(0, dtype=np.int64)] + columns)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, columns)), shape=(len(keys), len(keys))).tocsr()
+    return graph, escapes
+
+def components(cells, diagonal=False):
+    #component number of every cell, in the order given. Cells sharing a side (with diagonal, also
+    #a corner) share a number. Numbers start at 0 and follow each component's smallest packed cell
+    keys, inverse = np.unique(_asCells(cells), return_inverse=True)
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64)
+    _count, labels = connected_components(_graph(keys, diagonal)[0], directed=False)
+    return labels[inverse.ravel()].astype(np.int64)
+
+
+    #############
+    #           #
+    #   HOLES   #
+    #           #
+    #############
+
+#cells of padding around a region's bounding box when looking for its holes, covers the slight
+#turn of the grid in zones next to the one the box is drawn in
+_HOLE_MARGIN = 2
+
+def _homeFrame(zone, letter1):
+    #the frame most of the cells are in
+    southern = letter1 < np.where(zone == 0, _Y, _N)
+    frames, counts = np.unique(zone * 2 + southern, return_counts=True)
+    home = int(frames[np.argmax(counts)])
+    return home // 2, bool(home % 2)
+
+def holes(cells, diagonal=False):
+    #(cells, hole numbers): the packed cells that are not in the region but are enclosed by it, and
+    #which hole each belongs to. Holes are joined the other way from the region: for a region
+    #joined at corners (diagonal) they are joined by sides only, and the other way around
+    keys = np.unique(_asCells(cells))
+    if not len(keys):
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+
+    zone, letter1, _l2, _l3, _e, _n, precision = _unpack(keys)
+    if (precision != precision[0]).any():
+        raise ValueError('holes needs cells of a single precision, got precisions ' + ', '.join(str(i) for i in np.unique(precision)))
+    precision = int(precision[0])
+    size = 10 ** (5 - precision)
+
+    #every cell around the region in a box of its main frame, cells at the box edge lead outside
+    home = _homeFrame(zone, letter1)
+    lat, lon = _decodeCells(keys)
+    easting, northing = _toFrame(lat * _DEG_TO_RAD, lon * _DEG_TO_RAD, *home)
+    margin = _HOLE_MARGIN * size
+    box = (easting.min() - margin, easting.max() + margin, northing.min() - margin, northing.max() + margin)
+    others = np.setdiff1d(np.concatenate([np.zeros(0, dtype=np.uint64)] + list(_iterBoxCells(home, box, precision))), keys)
+    if not len(others):
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+
+    graph, escapes = _graph(others, not diagonal, keys)
+    count, labels = connected_components(graph, directed=False)
+    outside = np.zeros(count, dtype=bool)
+    outside[labels[escapes]] = True
+
+    enclosed = ~outside[labels]
+    _numbers, number = np.unique(labels[enclosed], return_inverse=True)
+    return others[enclosed], number.ravel().astype(np.int64)
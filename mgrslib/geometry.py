@@ -0,0 +1,207 @@
+#
+#  mgrslib.geometry
+#  Lightweight points, segments and polygons, and cell polygons in bulk
+#
+#  A cell's corners are found by inverse projecting the eastings and northings of its corners in
+#  its own UTM or UPS frame, for any number of packed cells at once, instead of walking from its
+#  southwest corner with geodesic translations. The corner rings come out as one float64 array
+#  of (longitude, latitude) pairs, which shapely.polygons, GeoArrow or a WKB reader can take as
+#  it is. wkb() lays the same rings out as fixed size WKB records in a single numpy buffer.
+#
+#  Copyright 2017-2021 (c) Peter E Lenz [pelenz@pelenz.com]
+#  MIT License, see mgrslib.py
+#
+
+import struct
+
+import numpy as np
+
+from .batch import from_int, _PI, _TWO_PI, _RAD_TO_DEG
+from .rtree import _asCells, _cellCorners
+
+
+    ##############
+    #            #
+    #   SHAPES   #
+    #            #
+    ##############
+
+#WKB is written little endian, 1 is its byte order marker
+_WKB_POINT = struct.Struct('<BIdd')
+_WKB_HEAD = struct.Struct('<BI')
+_WKB_COUNT = struct.Struct('<I')
+
+def _ringWKB(points):
+    return _WKB_COUNT.pack(len(points)) + np.array([(i.longitude, i.latitude) for i in points], dtype='<f8').tobytes()
+
+class Point(object):
+    __slots__ = ('latitude', 'longitude')
+
+    def __init__(self, latitude, longitude):
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+
+    @property
+    def lat(self):
+        return self.latitude
+
+    @property
+    def lon(self):
+        return self.longitude
+
+    @property
+    def __geo_interface__(self):
+        return {'type': 'Point', 'coordinates': (self.longitude, self.latitude)}
+
+    @property
+    def wkb(self):
+        return _WKB_POINT.pack(1, 1, self.longitude, self.latitude)
+
+    def __eq__(self, other):
+        if not isinstance(other, Point):
+            return NotImplemented
+        return (self.latitude, self.longitude) == (other.latitude, other.longitude)
+
+    def __ne__(self, other):
+        if not isinstance(other, Point):
+            return NotImplemented
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.latitude, self.longitude))
+
+    def __repr__(self):
+        return 'Point(' + repr(self.latitude) + ', ' + repr(self.longitude) + ')'
+
+class Segment(object):
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @property
+    def points(self):
+        return [self.start, self.end]
+
+    @property
+    def __geo_interface__(self):
+        return {'type': 'LineString', 'coordinates': [(i.longitude, i.latitude) for i in self.points]}
+
+    @property
+    def wkb(self):
+        return _WKB_HEAD.pack(1, 2) + _ringWKB(self.points)
+
+    def __repr__(self):
+        return 'Segment(' + repr(self.start) + ', ' + repr(self.end) + ')'
+
+class Polygon(object):
+    #a single ring of Points, closed by repeating the first Point if it is not already
+    __slots__ = ('points',)
+
+    def __init__(self, points):
+        points = list(points)
+        if len(points) < 3:
+            raise ValueError('A Polygon needs at least 3 points. Input had ' + str(len(points)))
+        if points[0] != points[-1]:
+            points.append(points[0])
+        self.points = points
+
+    @property
+    def segments(self):
+        return [Segment(a, b) for a, b in zip(self.points[:-1], self.points[1:])]
+
+    @property
+    def __geo_interface__(self):
+        return {'type': 'Polygon', 'coordinates': [[(i.longitude, i.latitude) for i in self.points]]}
+
+    @property
+    def wkb(self):
+        return _WKB_HEAD.pack(1, 3) + _WKB_COUNT.pack(1) + _ringWKB(self.points)
+
+    def __eq__(self, other):
+        if not isinstance(other, Polygon):
+            return NotImplemented
+        return self.points == other.points
+
+    def __ne__(self, other):
+        if not isinstance(other, Polygon):
+            return NotImplemented
+        return not self == other
+
+    def __repr__(self):
+        return type(self).__name__ + '(' + repr(self.points) + ')'
+
+class Rect(Polygon):
+    #four cornered Polygon, its ring runs counterclockwise from the southwest corner as GeoJSON asks
+    __slots__ = ('southeast', 'southwest', 'northeast', 'northwest')
+
+    def __init__(self, southeast, southwest, northeast, northwest):
+        self.southeast = southeast
+        self.southwest = southwest
+        self.northeast = northeast
+        self.northwest = northwest
+        Polygon.__init__(self, [southwest, southeast, northeast, northwest])
+
+
+    ####################
+    #                  #
+    #   CELL POLYGONS  #
+    #                  #
+    ####################
+
+#rows of _cellCorners that make a closed counterclockwise ring: southwest, southeast, northeast,
+#northwest and southwest again
+_RING = [0, 1, 3, 2, 0]
+
+#one WKB Polygon with a single ring of 5 points, 93 bytes with no padding
+_WKB_POLYGON = np.dtype([('order', 'u1'), ('type', '<u4'), ('rings', '<u4'), ('points', '<u4'), ('coords', '<f8', (5, 2))])
+
+def _rings(cells):
+    #radian latitudes and longitudes of the closed corner ring of every packed cell, (n, 5) each
+    lat, lon, _x, _y, _southern, utm = _cellCorners(cells)
+    ups = ~utm
+    if ups.any():
+        #UPS longitudes are brought within half a turn of the southwest corner so rings across the
+        #antimeridian do not wrap around the globe
+        lon[ups] = lon[ups, :1] + (lon[ups] - lon[ups, :1] + _PI) % _TWO_PI - _PI
+    return lat[:, _RING], lon[:, _RING]
+
+def polygons(cells):
+    #(n, 5, 2) float64 array of the closed (longitude, latitude) corner rings of cells, given as
+    #packed cells, grid ids or Grids
+    lat, lon = _rings(_asCells(cells))
+    return np.stack([lon, lat], axis=-1) * _RAD_TO_DEG
+
+def wkb(cells):
+    #the cell polygons as an array of 93 byte WKB records. Every record is one WKB Polygon, so the
+    #array's buffer is the polygons back to back and wkb(cells)[i].tobytes() is the ith on its own
+    coords = polygons(cells)
+    records = np.empty(len(coords), dtype=_WKB_POLYGON)
+    records['order'] = 1
+    records['type'] = 3
+    records['rings'] = 1
+    records['points'] = 5
+    records['coords'] = coords
+    return records
+
+def geojson(cells):
+    #GeoJSON FeatureCollection of the cell polygons, each Feature's id is its grid id
+    cells = _asCells(cells)
+    ids = from_int(cells).tolist()
+    rings = polygons(cells).tolist()
+    return {'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'id': i, 'properties': {}, 'geometry': {'type': 'Polygon', 'coordinates': [ring]}} for i, ring in zip(ids, rings)]}
+
+def _cellRect(cell):
+    #Rect of a single packed cell
+    (sw, se, ne, nw, _sw), = polygons(np.array([cell], dtype=np.uint64)).tolist()
+    return Rect(Point(se[1], se[0]), Point(sw[1], sw[0]), Point(ne[1], ne[0]), Point(nw[1], nw[0]))
+
+def _boundingRect(cells):
+    #Rect around the corners of every packed cell, in plain latitude and longitude
+    if not len(cells):
+        raise ValueError('can not find the bounding box of an empty collection')
+    lat, lon = _rings(cells)
+    south, west, north, east = [float(i) * _RAD_TO_DEG for i in (lat.min(), lon.min(), lat.max(), lon.max())]
+    return Rect(Point(south, east), Point(south, west), Point(north, east), Point(north, west))
@@ -0,0 +1,257 @@
+#
+#  mgrslib.gridarray
+#  Columnar container of MGRS cells backed by numpy arrays
+#
+#  A GridArray keeps packed cells (see Grid.to_int) and their latitudes and longitudes in three
+#  contiguous arrays, 16 or 24 bytes a cell where a Grid in an mgrsList costs several hundred,
+#  and answers the mgrsList/mgrsSet queries with vectorized kernels. Grid objects are only built
+#  for the members taken out of it.
+#
+#  Copyright 2017-2021 (c) Peter E Lenz [pelenz@pelenz.com]
+#  MIT License, see mgrslib.py
+#
+
+from math import radians
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .batch import _unpack, _neighborCells, _decodeCells, _encodeCells, _checkPrecision, _inverse, _ecef, from_int
+from .mgrslib import Grid, mgrsList, mgrsSet, _gridLatLons, _meanGrid, _instanceTypeCheck
+from .rtree import RTree, _asCells
+from .boundary import _exteriorMask, components, holes
+from .geometry import polygons, wkb, geojson
+
+
+def _readOnly(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+class GridArray(object):
+    #cells, lats and lons are read only numpy arrays of the same length. Slices are views of the
+    #arrays of the GridArray they are taken from, masks and index arrays copy the rows they select
+
+    def __init__(self, cells=(), lats=None, lons=None, dtype=np.float64):
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise TypeError('dtype must be float32 or float64. Input was ' + str(dtype))
+
+        grids = None
+        if not isinstance(cells, np.ndarray):
+            cells = list(cells)
+            if cells and isinstance(cells[0], Grid):
+                grids = cells
+        cells = _asCells(cells)
+
+        if lats is None and lons is None:
+            #Grids keep their own lat/lon, cells from ids or integers get their southwest corners
+            lats, lons = _gridLatLons(grids) if grids is not None else _decodeCells(cells)
+        elif lats is None or lons is None:
+            raise ValueError('lats and lons must be given together')
+
+        lats = np.asarray(lats, dtype=dtype).ravel()
+        lons = np.asarray(lons, dtype=dtype).ravel()
+        if not len(cells) == len(lats) == len(lons):
+            raise ValueError('cells, lats and lons must be the same length. Lengths were ' + str(len(cells)) + ', ' + str(len(lats)) + ', ' + str(len(lons)))
+        self.__setArrays(cells, lats, lons)
+
+    def __setArrays(self, cells, lats, lons):
+        self.cells = _readOnly(cells)
+        self.lats = _readOnly(lats)
+        self.lons = _readOnly(lons)
+        self.__keys = None
+        self.__tree = None
+
+    @classmethod
+    def __fromArrays(cls, cells, lats, lons):
+        array = cls.__new__(cls)
+        array.__setArrays(cells, lats, lons)
+        return array
+
+    @classmethod
+    def from_latlon(cls, lats, lons, precision=5, dtype=np.float64):
+        #the cells of precision containing each point, keeping the points as Grid(lat, lon) does
+        _checkPrecision(precision)
+        lats, lons = [np.asarray(i, dtype=np.float64).ravel() for i in np.broadcast_arrays(lats, lons)]
+        return cls(_encodeCells(lats, lons, precision), lats, lons, dtype)
+
+    @classmethod
+    def concatenate(cls, arrays):
+        arrays = list(arrays)
+        if not arrays:
+            return cls()
+        return cls.__fromArrays(*[np.concatenate([getattr(i, name) for i in arrays]) for name in ('cells', 'lats', 'lons')])
+
+    #################
+    #               #
+    #   CONTAINER   #
+    #               #
+    #################
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __grid(self, row):
+        grid = Grid.from_int(int(self.cells[row]))
+        grid._Grid__lat = float(self.lats[row])
+        grid._Grid__lon = float(self.lons[row])
+        return grid
+
+    def __getitem__(self, key):
+        #one Grid for an integer, otherwise a GridArray of the selected rows
+        if isinstance(key, (int, np.integer)):
+            return self.__grid(key)
+        return GridArray.__fromArrays(self.cells[key], self.lats[key], self.lons[key])
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.__grid(row)
+
+    def __contains__(self, grid):
+        if not isinstance(grid, Grid):
+            return False
+        return bool(self.__isMember(np.array([grid.to_int()], dtype=np.uint64))[0])
+
+    def __repr__(self):
+        return 'GridArray(' + str(len(self)) + ' cells)'
+
+    @property
+    def nbytes(self):
+        return self.cells.nbytes + self.lats.nbytes + self.lons.nbytes
+
+    def grid_ids(self):
+        return from_int(self.cells)
+
+    def to_list(self):
+        return mgrsList(self)
+
+    def to_set(self):
+        return mgrsSet(self)
+
+    def __isMember(self, cells):
+        #True where a packed cell is one of the members, by binary search of the sorted cells
+        if self.__keys is None:
+            self.__keys = np.unique(self.cells)
+        if not len(self.__keys):
+            return np.zeros(cells.shape, dtype=bool)
+        at = np.minimum(np.searchsorted(self.__keys, cells), len(self.__keys) - 1)
+        return self.__keys[at] == cells
+
+    ###################
+    #                 #
+    #   GRID STRUCT   #
+    #                 #
+    ###################
+
+    def __sweep(self):
+        #latitudes and longitudes of the members for the extremes and centers below
+        if not len(self.cells):
+            raise ValueError('can not find the extremes or centers of an empty collection')
+        return self.lats, self.lons
+
+    def northernmost(self):
+        #members at the largest latitude
+        lats, _lons = self.__sweep()
+        return self[lats == lats.max()]
+
+    def westernmost(self):
+        _lats, lons = self.__sweep()
+        return self[lons == lons.min()]
+
+    def easternmost(self):
+        _lats, lons = self.__sweep()
+        return self[lons == lons.max()]
+
+    def southernmost(self):
+        lats, _lons = self.__sweep()
+        return self[lats == lats.min()]
+
+    def centerEasting(self):
+        #returns Grid containing the avg(latitude),max(longitude)
+        lats, lons = self.__sweep()
+        return Grid(float(lats.mean(dtype=np.float64)), float(lons.max()))
+
+    def centerX(self):
+        return self.centerEasting()
+
+    def centerNorthing(self):
+        #returns Grid containing the max(latitude),avg(longitude)
+        lats, lons = self.__sweep()
+        return Grid(float(lats.max()), float(lons.mean(dtype=np.float64)))
+
+    def centerY(self):
+        return self.centerNorthing()
+
+    def centeroid(self, geodesic=False):
+        #returns Grid containing the max(latitude),max(longitude), or with geodesic the n-vector
+        #mean of the members
+        lats, lons = self.__sweep()
+        if geodesic:
+            return _meanGrid(lats, lons)
+        return Grid(float(lats.max()), float(lons.max()))
+
+    def extremes(self):
+        #the northernmost, easternmost, southernmost and westernmost members
+        return {'northernmost': self.northernmost(), 'easternmost': self.easternmost(),
+                'southernmost': self.southernmost(), 'westernmost': self.westernmost()}
+
+    def __neighborsAreMembers(self, cells, diagonal):
+        return self.__isMember(_neighborCells(*_unpack(cells), diagonal=diagonal))
+
+    def exterior(self, diagonal=False):
+        #members with at least one neighbor outside the collection
+        return self[_exteriorMask(self.cells, diagonal)]
+
+    def interior(self, diagonal=False):
+        return self[~_exteriorMask(self.cells, diagonal)]
+
+    def components(self, diagonal=False):
+        #component number of every member, see mgrslib.boundary.components
+        return components(self.cells, diagonal)
+
+    def holes(self, diagonal=False):
+        #GridArray of the cells enclosed by the members that are not members themselves
+        return GridArray(holes(self.cells, diagonal)[0], dtype=self.lats.dtype)
+
+    def isContiguous(self, grid, diagonal=False):
+        #return true if all neighbors of grid have the same membership type as grid
+        cell = np.array([grid.to_int()], dtype=np.uint64)
+        return bool((self.__neighborsAreMembers(cell, diagonal) == self.__isMember(cell)[0]).all())
+
+    def isIsoated(self, grid, diagonal=False):
+        cell = np.array([grid.to_int()], dtype=np.uint64)
+        return not (self.__neighborsAreMembers(cell, diagonal) == self.__isMember(cell)[0]).all()
+
+    def nearestTo(self, gridB):
+        #returns the member closest to gridB, measured like Grid.distance. The KD tree of member
+        #positions is built on first use
+        _instanceTypeCheck(gridB, Grid)
+        if not len(self):
+            raise ValueError('can not find the nearest Grid in an empty GridArray')
+        if self.__tree is None:
+            self.__tree = cKDTree(_ecef(np.radians(self.lats.astype(np.float64)), np.radians(self.lons.astype(np.float64))).reshape(-1, 3))
+
+        lat, lon = radians(gridB.lat), radians(gridB.lon)
+        xyz = _ecef(lat, lon)
+        _d, row = self.__tree.query(xyz)
+        bound = self.__distances(lat, lon, [row])[0]
+
+        #a straight line is never longer than the geodesic, so nothing closer lies outside this ball
+        rows = np.sort(self.__tree.query_ball_point(xyz, bound * (1 + 1e-9) + 1e-6))
+        return self[int(rows[np.argmin(self.__distances(lat, lon, rows))])]
+
+    def __distances(self, lat, lon, rows):
+        return _inverse(lat, lon, np.radians(self.lats[rows].astype(np.float64)), np.radians(self.lons[rows].astype(np.float64)))[0]
+
+    def rTree(self):
+        return RTree(self.cells)
+
+    def polygons(self):
+        #(n, 5, 2) array of closed (longitude, latitude) corner rings, see mgrslib.geometry
+        return polygons(self.cells)
+
+    def wkb(self):
+        return wkb(self.cells)
+
+    def geojson(self):
+        return geojson(self.cells)
@@ -1,144 +1,382 @@
-
-    ####################################
-    #                                  #
-    #   MGRSSET/MGRSLIST PARENT CLASS  #
-    #                                  #
-    ####################################
-
-class _gridStruct(object):
-
-    def __containsOnlyGrids(self):
-        test = [True if isinstance(i,Grid) else False for i in self]
-        if False in test:
-            return False
-        else:
-            return True
-
-    def __removeNonGrids(self):
-        for i in self:
-            if not isinstance(i,Grid):
-                del self[i]
- 
-    def isContiguous(self,grid,diagonal=False):
-        #return true if all neighbors of g have the same membership type as grid
-        membershipType = grid in self
-        tests = [(i in self) == membershipType for i in grid.neighbors]
-        return not (False in tests) 
-
-    def isIsoated(self,grid,diagonal=False):
-        #return true if all neighbors of g have the opposite membership type as grid
-        membershipType = grid in self
-        tests = [(i in self) == membershipType for i in grid.neighbors]
-        return False in tests
-
-    def __distanceMap(self,to):
-        out={}
-        for i in self:
-            d=i.distance(to)
-            if d not in out:
-                out[d]=[i]
-            else:
-                out[d].append(i)
-        return out
-
-    def nearestTo(self,gridB):
-        #returns the Grid in self closest to gridB
-        d=self.__distanceMap(gridB)
-        return mgrsSet(d[min(d.keys())]).centerEasting()
-
-    def centerEasting(self):
-         #returns Grid containing the avg(latitude),max(longitude)
-        lats = [i.latitude for i in self]
-        lons = [i.longitude for i in self]
-        c = Grid(mean(lats),max(lons))
-
-        return c
-
-    def centerX(self):
-        return self.centerEasting()
-
-    def centerNorthing(self):
-         #returns Grid containing the avg(longitude),max(latitude) or else the nearest member of self to said point
-        lats = [i.latitude for i in self]
-        lons = [i.longitude for i in self]
-        c = Grid(max(lats),mean(lons))
-
-        return c
-
-    def centerY(self):
-        return self.centerNorthing()
-
-    def centeroid(self):
-        return Grid(self.centerNorthing().latitude,self.centerEasting().longitude)
-
-    def northernmost(self):
-        #returns the northernmost Grids in self. If multiple grids qualify it returns the one with max(easting)          
-        max_lat = max(sorted(self, key=lambda x: x.latitude))
-        print max_lat
-        return self.__offspring([i for i in self if i.latitude==max_lat.latitude])
-
-    def westernmost(self):
-        #returns the westernmost Grids in self.           
-        min_lon = min(sorted(self, key=lambda x: x.longitude))
-        return self.__offspring([i for i in self if i.longitude==min_lon.longitude])
-
-    def easternmost(self):
-         #returns the easternmost Grids in self.      
-        max_lon = max(sorted(self, key=lambda x: x.longitude))
-        return self.__offspring([i for i in self if i.longitude==max_lon.longitude])
-
-    def southernmost(self):
-        #returns the southernmost Grids in self.
-        min_lat = min(sorted(self, key=lambda x: x.latitude))
-        return self.__offspring([i for i in self if i.latitude==min_lat.latitude])
-
-    def exterior(self):
-        out=[]
-        for g in self:
-            for n in g.neighbors:
-                if n not in self:
-                    out.append(g)
-                    break
-        return self.__offspring(out)
-
-    def interior(self):
-        return self.__offspring(mgrsSet(self).difference(mgrsSet(self.exterior())))
-
-    def boundingBox(self):
-        #returns grids at the corners of a bounding box encomposing all members of self
-        nw = _Geometry.Point(self.northernmost().longitude,westernmost().latitude)
-        ne = _Geometry.Point(self.northernmost().longitude,easternmost().latitude)
-        sw = _Geometry.Point(self.southernmost().longitude,westernmost().latitude)
-        se = _Geometry.Point(self.southernmost().longitude,easternmost().latitude)
-
-        return _Geometry.Rect(se,sw,ne,nw)
-
-    def __offspring(self,struct):
-        if isinstance(self,mgrsSet):
-            return mgrsSet(struct)
-        elif isinstance(self,mgrsList):
-            return mgrsList(struct)
-
-    def __insert(self,item):
-        _instanceTypeCheck(value,Grid)
-        if isinstance(self,mgrsSet):
-            self.add(item)
-        elif isinstance(self,mgrsList):
-            self.append(item)
-
-    #def rTree(self):
-        #Future idea: r tree exporter
-
-
-    ###############################################################
-    #                                                             #
-    #   CREATE MGRSSET/MGRSLIST CLASSES VIA MULTIPLE INHERITANCE  #
-    #                                                             #
-    ###############################################################
-
-
-class mgrsList(list, _gridStruct):
-    pass
-
-class mgrsSet(set, _gridStruct):
-    pass
+#
+#  mgrslib.mgrsagg
+#  Out-of-core aggregation of values grouped by MGRS cell
+#
+#  Events are grouped by their packed cell (see Grid.to_int) at one precision. Each batch added
+#  is reduced straight away to one row per cell of count, count of values, sum, min and max, and
+#  optionally to a quantile sketch: the counts of each cell's values in logarithmic buckets, as
+#  in DDSketch, which answer any quantile to a fixed relative accuracy. Partial aggregates are
+#  kept as runs sorted by cell. They are merged in memory, written to disk when they outgrow the
+#  memory budget and merged range by range of cells when results are read, so an aggregate of
+#  any size is read with about a budget's worth of memory. Every part of the state adds up, so
+#  aggregates built apart, in other processes or on other machines, merge into one.
+#
+#  Copyright 2017-2021 (c) Peter E Lenz [pelenz@pelenz.com]
+#  MIT License, see mgrslib.py
+#
+
+import os
+import shutil
+import tempfile
+import weakref
+import zipfile
+
+import numpy as np
+
+from .batch import _encodeCells, _resizeCells, _checkPrecision
+from .rtree import _asCells
+
+
+#bytes of partial aggregates held in memory before they are written to disk
+_MEMORY = 1 << 28
+
+#in memory runs merged into one once there are this many
+_RUNS = 16
+
+#relative accuracy of the quantile sketches
+_ACCURACY = 0.01
+
+#bucket indexes are moved up by this so those of positive values are always positive, and
+#negated for negative values; bucket 0 holds zeros. Buckets then sort in the order of values
+_BUCKET_OFFSET = 1 << 20
+
+_STATS = ('cells', 'count', 'valued', 'sum', 'min', 'max')
+_SKETCH = ('sketchCells', 'buckets', 'bucketCounts')
+
+
+    ################
+    #              #
+    #   REDUCING   #
+    #              #
+    ################
+
+def _starts(keys):
+    #first row of each run of equal keys in sorted keys
+    return np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) else np.zeros(0, dtype=np.int64)
+
+def _reduceStats(cells, count, valued, total, low, high):
+    #one row per cell, sorted by cell, of rows of partial stats in any order
+    order = np.argsort(cells, kind='stable')
+    cells = cells[order]
+    starts = _starts(cells)
+    if not len(starts):
+        return dict((name, np.zeros(0, dtype=np.uint64 if name == 'cells' else np.float64 if name in ('sum', 'min', 'max') else np.int64)) for name in _STATS)
+    return {'cells': cells[starts],
+            'count': np.add.reduceat(count[order], starts),
+            'valued': np.add.reduceat(valued[order], starts),
+            'sum': np.add.reduceat(total[order], starts),
+            'min': np.fmin.reduceat(low[order], starts),
+            'max': np.fmax.reduceat(high[order], starts)}
+
+def _reduceSketch(cells, buckets, counts):
+    #one row per cell and bucket, sorted by cell then bucket
+    order = np.lexsort((buckets, cells))
+    cells = cells[order]
+    buckets = buckets[order]
+    if not len(cells):
+        return {'sketchCells': cells, 'buckets': buckets, 'bucketCounts': counts}
+    starts = np.flatnonzero(np.concatenate([[True], (cells[1:] != cells[:-1]) | (buckets[1:] != buckets[:-1])]))
+    return {'sketchCells': cells[starts], 'buckets': buckets[starts], 'bucketCounts': np.add.reduceat(counts[order], starts)}
+
+def _reduceRuns(runs, sketches):
+    #merges runs of stats and, with sketches, of sketch rows into one of each
+    run = _reduceStats(*[np.concatenate([i[name] for i in runs]) for name in _STATS])
+    if sketches:
+        run.update(_reduceSketch(*[np.concatenate([i[name] for i in runs]) for name in _SKETCH]))
+    return run
+
+def _nbytes(run):
+    return sum(i.nbytes for i in run.values())
+
+#rows of each column read at a time by Aggregator.load
+_LOAD_ROWS = 1 << 20
+
+def _iterColumn(saved, name, rows):
+    #blocks of rows of a one dimensional array in an open .npz file. Always yields at least one,
+    #possibly empty, block so the columns of a table stay in step
+    with saved.open(name + '.npy') as f:
+        version = np.lib.format.read_magic(f)
+        shape, _fortran, dtype = (np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0)(f)
+        left = shape[0]
+        while True:
+            count = min(rows, left)
+            yield np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype, count=count).copy()
+            left -= count
+            if not left:
+                return
+
+
+    ################
+    #              #
+    #   SKETCHES   #
+    #              #
+    ################
+
+def _buckets(values, gamma):
+    #sketch bucket of every value
+    magnitude = np.fabs(values)
+    positive = magnitude > 0
+    index = np.zeros(len(values), dtype=np.int64)
+    index[positive] = np.ceil(np.log(magnitude[positive]) / np.log(gamma)).astype(np.int64) + _BUCKET_OFFSET
+    return np.where(values < 0, -index, index)
+
+def _bucketValues(buckets, gamma):
+    #the value each bucket stands for, within the sketch's relative accuracy of all its values
+    index = np.fabs(buckets) - _BUCKET_OFFSET
+    value = 2.0 * np.power(gamma, index.astype(np.float64)) / (gamma + 1.0)
+    return np.where(buckets == 0, 0.0, np.where(buckets < 0, -value, value))
+
+def _quantiles(cells, sketchCells, buckets, bucketCounts, q, gamma):
+    #q quantile of the values of each of the sorted cells, NaN for cells with no values
+    out = np.full(len(cells), np.nan)
+    if not len(sketchCells):
+        return out
+    starts = _starts(sketchCells)
+    counts = np.add.reduceat(bucketCounts, starts)
+    #rank (from 0) of the quantile among each cell's values, and the first bucket that reaches it
+    rank = np.floor(q * (counts - 1) + 0.5).astype(np.int64)
+    before = np.cumsum(bucketCounts) - bucketCounts
+    cumulative = np.cumsum(bucketCounts) - np.repeat(before[starts], np.diff(np.append(starts, len(bucketCounts))))
+    reached = cumulative > np.repeat(rank, np.diff(np.append(starts, len(bucketCounts))))
+    first = np.flatnonzero(reached & np.concatenate([[True], ~reached[:-1] | (sketchCells[1:] != sketchCells[:-1])]))
+    rows = np.searchsorted(cells, sketchCells[first])
+    out[rows] = _bucketValues(buckets[first], gamma)
+    return out
+
+
+    ##################
+    #                #
+    #   AGGREGATOR   #
+    #                #
+    ##################
+
+class Aggregator(object):
+    #count, count of values, sum, mean, min and max (and with sketch quantiles) of values grouped
+    #by MGRS cell at precision, holding about memory bytes of partial aggregates before spilling
+    #them to a temporary folder in directory
+
+    def __init__(self, precision=5, sketch=False, accuracy=_ACCURACY, memory=_MEMORY, directory=None):
+        if not 0 < accuracy < 1:
+            raise ValueError('accuracy must be between 0 and 1. Input was ' + str(accuracy))
+        self.precision = _checkPrecision(precision)
+        self.sketch = bool(sketch)
+        self.accuracy = float(accuracy)
+        self.memory = int(memory)
+        self.directory = directory
+        self.__gamma = (1.0 + self.accuracy) / (1.0 - self.accuracy)
+        self.__runs = []
+        self.__nbytes = 0
+        self.__spilled = []
+        self.__folder = None
+        self.__cleanup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        #drops the aggregate and removes its spilled runs from disk
+        self.__runs = []
+        self.__nbytes = 0
+        self.__spilled = []
+        if self.__cleanup is not None:
+            self.__cleanup()
+            self.__cleanup = None
+            self.__folder = None
+
+    @property
+    def nbytes(self):
+        #bytes of partial aggregates held in memory
+        return self.__nbytes
+
+    @property
+    def spilled(self):
+        #number of runs written to disk
+        return len(self.__spilled)
+
+    def __emptyRun(self):
+        return self.__batchRun(np.zeros(0, dtype=np.uint64), np.zeros(0))
+
+    def __batchRun(self, cells, values):
+        #partial aggregate of one batch of cells and values
+        has = ~np.isnan(values)
+        run = _reduceStats(cells, np.ones(len(cells), dtype=np.int64), has.astype(np.int64), np.where(has, values, 0.0), values, values)
+        if self.sketch:
+            run.update(_reduceSketch(cells[has], _buckets(values[has], self.__gamma), np.ones(int(has.sum()), dtype=np.int64)))
+        return run
+
+    def __addRun(self, run):
+        self.__runs.append(run)
+        self.__nbytes += _nbytes(run)
+        if len(self.__runs) >= _RUNS:
+            self.__compact()
+        if self.__nbytes > self.memory:
+            self.__spill()
+
+    def __compact(self):
+        if len(self.__runs) > 1:
+            self.__runs = [_reduceRuns(self.__runs, self.sketch)]
+            self.__nbytes = _nbytes(self.__runs[0])
+
+    def __spill(self):
+        #writes the in memory runs to disk as one run of .npy files
+        self.__compact()
+        if not self.__runs:
+            return
+        if self.__folder is None:
+            self.__folder = tempfile.mkdtemp(prefix='mgrsagg-', dir=self.directory)
+            self.__cleanup = weakref.finalize(self, shutil.rmtree, self.__folder, True)
+        path = os.path.join(self.__folder, str(len(self.__spilled)))
+        for name, column in self.__runs[0].items():
+            np.save(path + '.' + name + '.npy', column)
+        self.__spilled.append(path)
+        self.__runs = []
+        self.__nbytes = 0
+
+    def __check(self, cells):
+        precision = (cells & np.uint64(7)).astype(np.int64)
+        if (precision < self.precision).any():
+            raise ValueError(str(int((precision < self.precision).sum())) + ' cells are coarser than the aggregate precision ' + str(self.precision))
+        return _resizeCells(cells, self.precision)
+
+    def add(self, lats, lons, values=None):
+        #adds events at latitudes and longitudes (degrees) with their values, events without values
+        #(None or NaN) are only counted
+        lats, lons = np.broadcast_arrays(np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+        self.addCells(_encodeCells(lats.ravel(), lons.ravel(), self.precision), values)
+
+    def addCells(self, cells, values=None):
+        #adds events by cell, given as packed cells, grid ids or Grids of this precision or finer
+        cells = self.__check(_asCells(cells))
+        values = np.full(len(cells), np.nan) if values is None else np.asarray(values, dtype=np.float64).ravel()
+        if len(values) != len(cells):
+            raise ValueError('cells and values must be the same length. Lengths were ' + str(len(cells)) + ', ' + str(len(values)))
+        if len(cells):
+            self.__addRun(self.__batchRun(cells, values))
+
+    def merge(self, other):
+        #adds the partial aggregates of another Aggregator with the same precision and sketch
+        if (other.precision, other.sketch, other.accuracy) != (self.precision, self.sketch, self.accuracy):
+            raise ValueError('Only Aggregators of the same precision, sketch and accuracy can be merged')
+        #a snapshot, other may be self and adding runs changes the list they come from
+        for run in list(other.__iterRuns()):
+            self.__addRun(run)
+
+    def __iterRuns(self, cuts=None):
+        #every run, spilled ones read back from disk, cut down to cells in [cuts[0], cuts[1])
+        for path in self.__spilled:
+            run = dict((name, np.load(path + '.' + name + '.npy', mmap_mode='r')) for name in _STATS + (_SKETCH if self.sketch else ()))
+            yield self.__cut(run, cuts)
+        for run in self.__runs:
+            yield self.__cut(run, cuts)
+
+    def __cut(self, run, cuts):
+        if cuts is None:
+            return dict((name, np.array(column)) for name, column in run.items())
+        out = {}
+        for key, names in (('cells', _STATS), ('sketchCells', _SKETCH)):
+            if key in run:
+                lo, hi = np.searchsorted(run[key], np.array(cuts, dtype=np.uint64))
+                out.update((name, np.array(run[name][lo:hi])) for name in names)
+        return out
+
+    def __ranges(self):
+        #cell ranges that each hold about half the memory budget of partial aggregates
+        spilled = [np.load(path + '.cells.npy', mmap_mode='r') for path in self.__spilled]
+        total = self.__nbytes + sum(os.path.getsize(path + '.' + name + '.npy') for path in self.__spilled for name in _STATS + (_SKETCH if self.sketch else ()))
+        parts = int(total // max(self.memory // 2, 1)) + 1
+        if parts == 1:
+            return [None]
+        #cut points spread evenly over a sample of the cells of every run
+        runs = [i for i in spilled + [run['cells'] for run in self.__runs] if len(i)]
+        samples = np.sort(np.concatenate([np.asarray(i[np.linspace(0, len(i) - 1, min(len(i), parts * 8)).astype(np.int64)]) for i in runs]))
+        cuts = np.unique(samples[np.linspace(0, len(samples) - 1, parts + 1).astype(np.int64)[1:-1]]).tolist()
+        #no cell is all ones, its precision bits are at most 5
+        bounds = [0] + cuts + [(1 << 64) - 1]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def __iterReduced(self):
+        #the aggregate reduced to one run a range of cells at a time
+        for cuts in self.__ranges():
+            runs = list(self.__iterRuns(cuts))
+            if runs:
+                run = _reduceRuns(runs, self.sketch)
+                if len(run['cells']):
+                    yield run
+
+    def iterResults(self, quantiles=()):
+        #dictionaries of result columns, sorted by cell, a range of cells at a time: cells, count,
+        #valued (the count of events with values), sum, mean, min, max and one column per quantile
+        #named q followed by its percentage, such as q50 for the median
+        if quantiles and not self.sketch:
+            raise ValueError('quantiles need an Aggregator made with sketch=True')
+        for run in self.__iterReduced():
+            out = dict((name, run[name]) for name in _STATS)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out['mean'] = np.where(run['valued'] > 0, run['sum'] / run['valued'], np.nan)
+            for q in quantiles:
+                if not 0 <= q <= 1:
+                    raise ValueError('quantiles must be between 0 and 1. Input was ' + str(q))
+                out['q' + ('%g' % (q * 100))] = _quantiles(run['cells'], run['sketchCells'], run['buckets'], run['bucketCounts'], q, self.__gamma)
+            yield out
+
+    def results(self, quantiles=()):
+        #iterResults joined into one dictionary of columns
+        chunks = list(self.iterResults(quantiles))
+        if not chunks:
+            chunks = [dict((name, column) for name, column in self.__emptyRun().items() if name in _STATS)]
+            chunks[0]['mean'] = np.zeros(0)
+            for q in quantiles:
+                chunks[0]['q' + ('%g' % (q * 100))] = np.zeros(0)
+        return dict((name, np.concatenate([i[name] for i in chunks])) for name in chunks[0])
+
+    def save(self, path):
+        #writes the aggregate to an .npz file that load reads back. It is reduced and written a
+        #range of cells at a time through files in a temporary folder, so saving takes about the
+        #memory budget whatever the size of the aggregate
+        names = _STATS + (_SKETCH if self.sketch else ())
+        dtypes = dict((name, column.dtype) for name, column in self.__emptyRun().items())
+        lengths = dict.fromkeys(names, 0)
+        if isinstance(path, str) and not path.endswith('.npz'):
+            path += '.npz'
+        folder = tempfile.mkdtemp(prefix='mgrsagg-', dir=self.directory)
+        try:
+            parts = dict((name, open(os.path.join(folder, name), 'wb')) for name in names)
+            try:
+                for run in self.__iterReduced():
+                    for name in names:
+                        parts[name].write(np.ascontiguousarray(run[name], dtype=dtypes[name]).tobytes())
+                        lengths[name] += len(run[name])
+            finally:
+                for part in parts.values():
+                    part.close()
+
+            with zipfile.ZipFile(path, 'w', allowZip64=True) as saved:
+                for name, value in (('precision', self.precision), ('sketch', self.sketch), ('accuracy', self.accuracy)):
+                    with saved.open(name + '.npy', 'w') as out:
+                        np.lib.format.write_array(out, np.asarray(value))
+                for name in names:
+                    with saved.open(name + '.npy', 'w', force_zip64=True) as out, open(os.path.join(folder, name), 'rb') as part:
+                        header = {'descr': np.lib.format.dtype_to_descr(dtypes[name]), 'fortran_order': False, 'shape': (lengths[name],)}
+                        np.lib.format.write_array_header_2_0(out, header)
+                        shutil.copyfileobj(part, out)
+        finally:
+            shutil.rmtree(folder, True)
+
+    @classmethod
+    def load(cls, path, memory=_MEMORY, directory=None):
+        #an Aggregator of a file written by save, read a block of rows at a time and spilled to disk
+        #as it outgrows memory
+        with np.load(path) as saved:
+            aggregator = cls(int(saved['precision']), bool(saved['sketch']), float(saved['accuracy']), memory, directory)
+        with zipfile.ZipFile(path) as saved:
+            for names in (_STATS,) + ((_SKETCH,) if aggregator.sketch else ()):
+                columns = [_iterColumn(saved, name, _LOAD_ROWS) for name in names]
+                for blocks in zip(*columns):
+                    run = aggregator.__emptyRun()
+                    run.update(zip(names, blocks))
+                    aggregator.__addRun(run)
+        return aggregator
@@ -32,10 +32,22 @@
 from mgrs import MGRS 
 from nvector import FrameE, deg #replace with pyproj
 from pyproj import CRS
-from collections import namedtuple
-from math import fabs
+from collections import namedtuple, OrderedDict
+from threading import Lock, local
+from weakref import WeakValueDictionary
+from math import fabs, radians
 from numbers import Number as number
 from compassheadinglib import Compass
+from .batch import _packCell, _unpackCell, _containsCell, _neighborParts, _shiftedCenter
+from .batch import iterRectBuffer as _iterRectBuffer, iterBuffer as _iterBuffer
+from .batch import _inverse, _ecef, _meanPosition, decode as _decode
+from .batch import _compactCells, _uncompactCells, _coveredCells
+from .rtree import RTree
+from .boundary import _exteriorMask, components as _components, holes as _holes
+from .polygon import iterPolyfill as _iterPolyfill
+from . import geometry as _Geometry
+from scipy.spatial import cKDTree
+import numpy as np
 
 mgrs = MGRS()
 
@@ -66,6 +78,160 @@ def _instanceTypeCheck(inst,typeof):
         
         raise TypeError('Variable type must be '+isMultMsg+acceptable+'. Input was type '+str(type(inst)))
 
+    ################
+    #              #
+    #   CACHING    #
+    #              #
+    ################
+
+#entries kept by each cache unless setCacheSize or gridCache say otherwise
+_DEFAULT_CACHE_SIZE=65536
+
+CacheInfo=namedtuple('CacheInfo',['hits','misses','evictions','size','maxsize'])
+
+class _LRUCache(object):
+    #bounded least recently used map, a maxsize of 0 turns it off
+
+    def __init__(self,maxsize=_DEFAULT_CACHE_SIZE):
+        self.maxsize=maxsize
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+        self.__data=OrderedDict()
+        self.__lock=Lock()
+
+    def lookup(self,key,compute,*args):
+        #cached value of key, calling compute(*args) and keeping the result on a miss
+        if not self.maxsize:
+            return compute(*args)
+
+        with self.__lock:
+            if key in self.__data:
+                self.__data.move_to_end(key)
+                self.hits+=1
+                return self.__data[key]
+            self.misses+=1
+
+        value=compute(*args)
+        with self.__lock:
+            self.__data[key]=value
+            self.__trim()
+        return value
+
+    def __trim(self):
+        while len(self.__data)>self.maxsize:
+            self.__data.popitem(last=False)
+            self.evictions+=1
+
+    def resize(self,maxsize):
+        with self.__lock:
+            self.maxsize=maxsize
+            self.__trim()
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+
+    def info(self):
+        return CacheInfo(self.hits,self.misses,self.evictions,len(self.__data),self.maxsize)
+
+#grid id -> lat/lon, (lat, lon, precision) -> grid id, (grid id, dx, dy) -> neighbor and
+#(lat, lon, distance, azimuth) -> translated lat/lon, shared by every Grid in the process
+_caches={'latlon':_LRUCache(),'grid_id':_LRUCache(),'neighbor':_LRUCache(),'translation':_LRUCache()}
+
+#each thread's stack of caches of the gridCache blocks it is in
+_scopes=local()
+
+def _activeCaches():
+    #the caches of this thread's innermost gridCache block, or the process wide ones outside any
+    stack=getattr(_scopes,'stack',None)
+    return stack[-1] if stack else _caches
+
+def cacheInfo():
+    #hit, miss and eviction counts and sizes of each cache
+    return dict((name,cache.info()) for name,cache in _activeCaches().items())
+
+def setCacheSize(maxsize):
+    #entries kept by each cache from now on, the least recently used are evicted to fit and 0
+    #turns caching off
+    if maxsize<0:
+        raise ValueError('maxsize must be 0 or more. Input was '+str(maxsize))
+    for cache in _activeCaches().values():
+        cache.resize(maxsize)
+
+def clearCaches():
+    for cache in _activeCaches().values():
+        cache.clear()
+
+class gridCache(object):
+    #scopes caching to a with block in the thread that enters it: inside it every cache starts
+    #empty and keeps at most maxsize entries (0 turns caching off). Other threads, and this one
+    #after the block, go on using the caches they had, and setCacheSize or clearCaches inside the
+    #block only reach the block's own caches
+
+    def __init__(self,maxsize=_DEFAULT_CACHE_SIZE):
+        if maxsize<0:
+            raise ValueError('maxsize must be 0 or more. Input was '+str(maxsize))
+        self.maxsize=maxsize
+        self.__scope=None
+
+    def __enter__(self):
+        if not hasattr(_scopes,'stack'):
+            _scopes.stack=[]
+        self.__scope=dict((name,_LRUCache(self.maxsize)) for name in _caches)
+        _scopes.stack.append(self.__scope)
+        return self
+
+    def __exit__(self,*exc):
+        #removes this block's caches wherever they are in the stack, so blocks closed out of order
+        #still leave the right ones in place
+        stack=_scopes.stack
+        for i in range(len(stack)-1,-1,-1):
+            if stack[i] is self.__scope:
+                del stack[i]
+                break
+        self.__scope=None
+        return False
+
+    ################
+    #              #
+    #   INTERNING  #
+    #              #
+    ################
+
+#(Grid key, source) -> the one Grid built from a grid id while interning is on, held weakly so
+#unused Grids are still freed
+_interned=WeakValueDictionary()
+_interning=False
+
+def setInterning(enabled=True):
+    #with interning on Grid(grid_id) returns the Grid already built for the same key if there is one
+    global _interning
+    _interning=bool(enabled)
+
+def internedCount():
+    #number of interned Grids still alive
+    return len(_interned)
+
+class interning(object):
+    #turns interning on (or off) for a with block, putting back the setting from before it after
+
+    def __init__(self,enabled=True):
+        self.enabled=bool(enabled)
+        self.__outer=None
+
+    def __enter__(self):
+        self.__outer=_interning
+        setInterning(self.enabled)
+        return self
+
+    def __exit__(self,*exc):
+        setInterning(self.__outer)
+        return False
+
+def _toMGRS(lat,lon,precision):
+    return mgrs.toMGRS(lat,lon,MGRSPrecision=precision)
+
 #TBD: a function for returning the grid that is the average of a list of grids 
 #def average(grids):
 #    #averages the locations of a list of grids
@@ -80,41 +246,88 @@ def _instanceTypeCheck(inst,typeof):
 
 class Grid(object):
 
+    #grids are parsed once into these fields, __slots__ keeps millions of them small
+    __slots__ = ('grid_id','source','__lat','__lon','__zone','__band','__column','__row','__easting','__northing','__precision','__weakref__')
+
     ######################
     #                    #
     #   PARSING GRID ID  #
     #                    #
     ######################
+
+    def __parse(self):
+        #splits grid_id into zone, latitude band, 100km column & row letters, easting, northing and precision
+        gid=self.grid_id
+
+        i=0
+        while i<len(gid) and gid[i].isdigit():
+            i+=1
+
+        digits=gid[i+3:]
+        if i>2 or len(gid)<i+3 or not gid[i:i+3].isalpha() or (digits and not digits.isdigit()) or len(digits)%2 or len(digits)>10:
+            raise ValueError('Invalid MGRS grid id: '+gid)
+
+        self.__zone=int(gid[:i]) if i else 0
+        self.__band=gid[i]
+        self.__column=gid[i+1]
+        self.__row=gid[i+2]
+        self.__precision=len(digits)//2
+        self.__easting=int(digits[:self.__precision] or 0)
+        self.__northing=int(digits[self.__precision:] or 0)
+
     @property
-    def __lastAlphaCharacter(self):
-        c=-1
-        for i in reversed(self.grid_id):
-            c+=1
-            if i.isalpha():
-                return len(self.grid_id)-c
+    def zone(self):
+        #UTM zone number, 0 for the polar (UPS) regions
+        return self.__zone
+
+    @property
+    def band(self):
+        return self.__band
+
     @property
     def gzd(self):
-        return self.grid_id[0:self.__lastAlphaCharacter-2]
+        return self.grid_id[:len(self.grid_id)-2-2*self.__precision]
 
     @property
     def gridSquare(self):
-        return self.grid_id[self.__lastAlphaCharacter-2:self.__lastAlphaCharacter]
+        return self.__column+self.__row
 
     @property
-    def __numerical_location(self):
-            try:
-                return int(self.grid_id[self.__lastAlphaCharacter:])
-            except:
-                return 0
-    @property
     def easting(self):
-        return int(self.grid_id[self.__lastAlphaCharacter:self.__lastAlphaCharacter+self.precision])
+        return self.__easting
 
     @property
     def northing(self):
-        return int(self.grid_id[self.__lastAlphaCharacter+self.precision:])
+        return self.__northing
+
+    ###########################
+    #                         #
+    #   LATITUDE / LONGITUDE  #
+    #                         #
+    ###########################
+
+    def __resolveLatLon(self):
+        #grids built from a grid id only pay for the projection the first time lat/lon is used
+        if self.__lat is None:
+            self.__lat, self.__lon = _activeCaches()['latlon'].lookup(self.key,mgrs.toLatLon,self.grid_id)
+
+    @property
+    def lat(self):
+        self.__resolveLatLon()
+        return self.__lat
+
+    @property
+    def latitude(self):
+        return self.lat
 
+    @property
+    def lon(self):
+        self.__resolveLatLon()
+        return self.__lon
 
+    @property
+    def longitude(self):
+        return self.lon
 
     ############################
     #                          #
@@ -124,11 +337,26 @@ class Grid(object):
 
     @property
     def size(self):
-        return int('1'+('0'*(abs(5-self.precision))))
+        return 10**(5-self.__precision)
 
     @property
     def precision(self):
-        return len(str(self.__numerical_location))/2
+        return self.__precision
+
+    #######################
+    #                     #
+    #   PACKED INTEGERS   #
+    #                     #
+    #######################
+
+    def to_int(self):
+        #packs this Grid into a 64 bit integer, parents are a bit prefix of their children
+        return _packCell(self.__zone,ord(self.__band)-65,ord(self.__column)-65,ord(self.__row)-65,self.__easting,self.__northing,self.__precision)
+
+    @classmethod
+    def from_int(cls,value):
+        zone,band,column,row,easting,northing,precision=_unpackCell(value)
+        return cls._fromParts(zone,chr(band+65),chr(column+65),chr(row+65),easting,northing,precision)
 
     #####################
     #                   #
@@ -137,19 +365,47 @@ class Grid(object):
     #####################
 
 
+    @classmethod
+    def _fromParts(cls,zone,band,column,row,easting,northing,precision,source='grid_id',gzd=None):
+        #builds a Grid from already parsed fields, skipping parsing and projection
+        if gzd is None:
+            gzd=('%02d' % zone if zone else '')+band
+
+        g=cls.__new__(cls)
+        g.grid_id=gzd+column+row+str(easting).zfill(precision)[:precision]+str(northing).zfill(precision)[:precision]
+        g.source=source
+        g.__lat=None
+        g.__lon=None
+        g.__zone=zone
+        g.__band=band
+        g.__column=column
+        g.__row=row
+        g.__easting=easting
+        g.__northing=northing
+        g.__precision=precision
+        return g
+
+    def __derive(self,easting,northing,precision,source):
+        #new Grid in the same 100km grid square
+        return Grid._fromParts(self.__zone,self.__band,self.__column,self.__row,easting,northing,precision,source,gzd=self.gzd)
+
     def resize(self,newPrecsision):
+        if not 0<=newPrecsision<=5:
+            raise ValueError('precision must be between 0 and 5. Input was '+str(newPrecsision))
 
+        #both directions stay in MGRS digit space, nothing is re-projected
         if self.precision==newPrecsision:
             return self
         elif self.precision>newPrecsision:
             #larger size, truncate mgrs easting and northing
             source = 'upsize'
-            grid_id=self.gzd+self.gridSquare+str(self.easting)[:newPrecsision]+str(self.northing)[:newPrecsision]
-            return Grid(grid_id,precision=newPrecsision,source=source)
+            scale=10**(self.precision-newPrecsision)
+            return self.__derive(self.easting//scale,self.northing//scale,newPrecsision,source)
         else:
+            #smaller size, pad mgrs easting and northing with zeros - the southwestern child
             source = 'downsize'
-            #smaller size - return new Grid object based on currect Grid object's lat/lon value at the newPrecsision size
-            return Grid(self.lat,self.lon,precision=newPrecsision,source=source)
+            scale=10**(newPrecsision-self.precision)
+            return self.__derive(self.easting*scale,self.northing*scale,newPrecsision,source)
 
     @property
     def mgrs1(self):
@@ -189,7 +445,7 @@ class Grid(object):
     @property
     def mgrs100000(self):
         #0
-        return Grid(self.gzd+self.gridSquare)
+        return self.resize(0)
 
     @property
     def mgrs100k(self):
@@ -197,14 +453,41 @@ class Grid(object):
         return self.mgrs100000
 
     def increase(self,increase_by=1):
-        for i in range(decrease_by):
-            r = self.resize(self.grid_id,precision=min([self.precision-1,1]),source='upsize')
-        return r
+        #a smaller grid, increase_by precision levels finer
+        if self.precision+increase_by>5:
+            raise ValueError('Can not increase precision '+str(self.precision)+' by '+str(increase_by)+', the maximum precision is 5')
+        return self.resize(self.precision+increase_by)
 
     def decrease(self,decrease_by=1):
-        for i in range(decrease_by):
-            r=self.resize(self.grid_id,precision=max([self.precision+1,5]),source='downsize')
-        return r
+        #a larger grid, decrease_by precision levels coarser
+        if self.precision-decrease_by<0:
+            raise ValueError('Can not decrease precision '+str(self.precision)+' by '+str(decrease_by)+', the minimum precision is 0')
+        return self.resize(self.precision-decrease_by)
+
+    def parent(self,precision=None):
+        #the Grid containing this one at precision, by default one level larger
+        if precision==None:
+            return self.decrease()
+        if precision>=self.precision:
+            raise ValueError('A parent must have a lower precision than '+str(self.precision)+'. Input was '+str(precision))
+        return self.resize(precision)
+
+    def ancestors(self):
+        #every Grid containing this one, from the parent up to the 100km grid square
+        return [self.resize(p) for p in range(self.precision-1,-1,-1)]
+
+    def children(self,depth=1):
+        #generator of the 100**depth Grids inside this one, depth precision levels finer
+        precision=self.precision+depth
+        if depth<1 or precision>5:
+            raise ValueError('Can not enumerate children '+str(depth)+' levels below precision '+str(self.precision))
+
+        count=10**depth
+        easting=self.easting*count
+        northing=self.northing*count
+        for e in range(count):
+            for n in range(count):
+                yield self.__derive(easting+e,northing+n,precision,'downsize')
 
     ######################
     #                    #
@@ -217,25 +500,67 @@ class Grid(object):
     def __point(self):
         return wgs84.GeoPoint(latitude=self.lat, longitude=self.lon, z=0, degrees=True)
 
-    def translate(self,dist,azimuth):
+    def __destination(self,dist,azimuth):
         dest, azimuth_dest = self.__point.geo_point(distance=dist, azimuth=azimuth, degrees=True)
-        return Grid(dest.latitude_deg,dest.longitude_deg,precision=self.precision,source='translation')
+        return dest.latitude_deg, dest.longitude_deg
+
+    def translate(self,dist,azimuth):
+        #keyed on the point, not the cell, a Grid built from coordinates starts from its own lat/lon
+        lat,lon=_activeCaches()['translation'].lookup((self.lat,self.lon,dist,azimuth),self.__destination,dist,azimuth)
+        return Grid(lat,lon,precision=self.precision,source='translation')
+
+    def __findNeighbor(self,dx,dy):
+        #_fromParts arguments and lat/lon (None until used) of the Grid dx, dy grids over
+        parts=(self.__zone,ord(self.__band)-65,ord(self.__column)-65,ord(self.__row)-65,self.__easting,self.__northing,self.__precision)
+        neighbor=_neighborParts(*parts,dx=dx,dy=dy)
+
+        if neighbor is None:
+            lat,lon=_shiftedCenter(*parts,dx=dx,dy=dy)
+            g=Grid(lat,lon,precision=self.precision)
+            return g.__zone,g.__band,g.__column,g.__row,g.__easting,g.__northing,g.__precision,g.gzd,lat,lon
+
+        zone,band,column,row,easting,northing,precision=neighbor
+        return zone,self.__band,chr(column+65),chr(row+65),easting,northing,precision,self.gzd,None,None
+
+    def __neighbor(self,dx,dy):
+        #the same sized Grid dx, dy grids over, by digit arithmetic where no zone or band seam is crossed
+        zone,band,column,row,easting,northing,precision,gzd,lat,lon=_activeCaches()['neighbor'].lookup((self.key,dx,dy),self.__findNeighbor,dx,dy)
+        g=Grid._fromParts(zone,band,column,row,easting,northing,precision,'translation',gzd=gzd)
+        g.__lat=lat
+        g.__lon=lon
+        return g
 
     @property
     def north(self):
-        return self.translate(self.size,Compass.north)
+        return self.__neighbor(0,1)
 
     @property
     def east(self):
-        return self.translate(self.size,Compass.east)
+        return self.__neighbor(1,0)
 
     @property
     def south(self):
-        return self.translate(self.size,Compass.south)
+        return self.__neighbor(0,-1)
 
     @property
     def west(self):
-        return self.translate(self.size,Compass.west)
+        return self.__neighbor(-1,0)
+
+    @property
+    def northeast(self):
+        return self.__neighbor(1,1)
+
+    @property
+    def southeast(self):
+        return self.__neighbor(1,-1)
+
+    @property
+    def southwest(self):
+        return self.__neighbor(-1,-1)
+
+    @property
+    def northwest(self):
+        return self.__neighbor(-1,1)
 
     ################
     #              #
@@ -249,7 +574,8 @@ class Grid(object):
     def distance(self,gridB,km=False):
         _instanceTypeCheck(gridB,Grid)
 
-        dist, _azia, _azib = self.__point.distance_and_azimuth(gridB.__point)
+        dist, _azia, _azib = _inverse(radians(self.lat),radians(self.lon),radians(gridB.lat),radians(gridB.lon))
+        dist=float(dist)
 
         if km:
             return dist/1000.0
@@ -266,39 +592,35 @@ class Grid(object):
     #             #
     ###############
 
-    def rectBuffer(self,dist,distY=None):
-        #TBD: return values in a GridList
-        dist=int(dist)
+    def iterRectBuffer(self,dist,distY=None):
+        #generator version of rectBuffer, Grids are built as they are reached
+        for cells in _iterRectBuffer(self.grid_id,dist,distY):
+            for cell in cells:
+                yield Grid.from_int(cell)
 
-        if not distY:
-            distY=dist
-        else:
-            distY=int(distY)        
-
-        row=self.translate(int(dist/2),Compass.west).translate(int(distY/2),Compass.south)
-        cell=row
-        out=mgrsList()
-        for i in range(self.__distToGridCount(distY)):
-            for j in range(self.__distToGridCount(dist)):
-                out.append(cell)
-                cell=cell.east
-            row=row.north
-            cell=row
+    def rectBuffer(self,dist,distY=None):
+        #every Grid with its southwest corner in a dist by distY meter rectangle centered on this one's,
+        #enumerated in MGRS digit space rather than by walking east and north
+        out=mgrsList(self.iterRectBuffer(dist,distY))
 
         if len(out)==0:
-            return [self]
+            return mgrsList([self])
         else:
             return out
 
-    def buffer(self,dist):
-        #TBD: return values in a GridList
-        sq=self.rectBuffer(dist*2)
-        out=mgrsList()
-        for i in sq:
-            if self.distance(i)<=dist:
-                out.append(i)
-        if len(out)==0:
-            return [self]
+    def iterBuffer(self,dist,inner=0):
+        #generator version of buffer, Grids are built as they are reached
+        for cells in _iterBuffer(self.grid_id,dist,inner):
+            for cell in cells:
+                yield Grid.from_int(cell)
+
+    def buffer(self,dist,inner=0):
+        #every Grid with its southwest corner between inner and dist meters of this one's, scanned
+        #row by row so only the Grids at the ends of each row need a geodesic distance
+        out=mgrsList(self.iterBuffer(dist,inner))
+
+        if len(out)==0 and not inner:
+            return mgrsList([self])
         else:
             return out
 
@@ -312,8 +634,8 @@ class Grid(object):
     def bearing(self,gridB):
             _instanceTypeCheck(gridB,Grid)
 
-            _dist, azia, _azib = self.__point.distance_and_azimuth(gridB.__point)
-            return deg(azia)
+            _dist, azia, _azib = _inverse(radians(self.lat),radians(self.lon),radians(gridB.lat),radians(gridB.lon))
+            return deg(float(azia))
 
     def heading(self,gridB,order=4):
         _instanceTypeCheck(gridB,Grid)
@@ -390,25 +712,11 @@ class Grid(object):
 
     def contains(self,gridB):
         _instanceTypeCheck(gridB,Grid)
-
-        if self.precision<gridB.precision:
-                if gridB.resize(self.precision)==self:
-                    return True
-                else:
-                    return False
-        else:
-            return False
+        return _containsCell(self.to_int(),gridB.to_int())
 
     def isContainedBy(self,gridB):
         _instanceTypeCheck(gridB,Grid)
-
-        if self.precision>gridB.precision:
-            if self.resize(gridB.precision)==gridB:
-                return True
-            else:
-                return False
-        else:
-            return False
+        return _containsCell(gridB.to_int(),self.to_int())
 
     def __contains__(x):
         _instanceTypeCheck(gridB,Grid)
@@ -422,12 +730,20 @@ class Grid(object):
 
     @property
     def neighbors(self):
-        #TBD: make output into a GridList
+        return self.adjacent()
+
+    def adjacent(self,diagonal=False):
+        #north, east, south, west and with diagonal also northeast, southeast, southwest, northwest
         out = mgrsList()
         out.append(self.north)
         out.append(self.east)
         out.append(self.south)
         out.append(self.west)
+        if diagonal:
+            out.append(self.northeast)
+            out.append(self.southeast)
+            out.append(self.southwest)
+            out.append(self.northwest)
         return out
 
     def adjoins(self,gridB):
@@ -475,22 +791,14 @@ class Grid(object):
 
     @property
     def boundingBox(self):
-        out ={}
-        
-        sw = self
-        se = self.translate(self.size,90)
-        ne = se.translate(self.size,0)
-        nw = se.translate(self.size,270)
+        #Rect of the cell's corners, inverse projected from their eastings and northings
+        return _Geometry._cellRect(self.to_int())
 
-        se_p=_Geometry.Point(se.latitude,se.longitude)
-        sw_p=_Geometry.Point(sw.latitude,sw.longitude)
-        ne_p=_Geometry.Point(ne.latitude,ne.longitude)
-        nw_p=_Geometry.Point(nw.latitude,nw.longitude)
-
-        #bb=_Geometry.Polygon([_Geometry.Segment(se_p,_Geometry.Segment(sw_p,_Geometry.Segment(ne_p,_Geometry.Segment(nw_p, None))))])
-        bb=_Geometry.Rect(se_p,sw_p,ne_p,nw_p)
-
-        return bb
+    @property
+    def bounds(self):
+        bb=self.boundingBox
+        return {name:{'latitude':corner.latitude,'longitude':corner.longitude} for name,corner in
+                (('southeast',bb.southeast),('southwest',bb.southwest),('northwest',bb.northwest),('northeast',bb.northeast))}
 
 
     def __str__(self):
@@ -499,14 +807,31 @@ class Grid(object):
     def __repr__(self):
         return self.grid_id
 
+    @property
+    def key(self):
+        #canonical form of grid_id - uppercase, no spaces and no zero padding on the zone
+        return self.grid_id.lstrip('0')
+
+    def __hash__(self):
+        return hash(self.key)
+
     def __eq__(self, gridB):
-        if self.grid_id.lstrip('0') == gridB.grid_id.lstrip('0'):
+        if self is gridB:
+            #always the case for equal interned Grids
+            return True
+        if not isinstance(gridB,Grid):
+            return NotImplemented
+
+        if self.key == gridB.key:
             return True
         else:
             return False
 
     def __ne__(self, gridB):
-        return not self.__eq__(gridB)
+        eq=self.__eq__(gridB)
+        if eq is NotImplemented:
+            return eq
+        return not eq
 
     #This is not the right way to do this - rewrite these!
     def __gt__(self, gridB):
@@ -529,6 +854,32 @@ class Grid(object):
     def __contains__(self,gribB):
         return self.contains(gribB)
     
+    def __new__(cls,lat=None,lon=None,precision=5,source=None):
+        #only Grids built from a grid id alone are interned. Their lat/lon always come from the id,
+        #so a Grid is identified by its key and source and nothing else
+        if _interning and isinstance(lat,str) and lon is None:
+            identity=(lat.upper().replace(' ','').lstrip('0'),'grid_id' if source is None else source)
+            g=_interned.get(identity)
+            if g is None:
+                g=object.__new__(cls)
+                g.__fromGridId(lat,source)
+                _interned[identity]=g
+            return g
+        return object.__new__(cls)
+
+    def __fromGridId(self,gridId,source):
+        if source == None:
+            self.source='grid_id'
+        else:
+            self.source=source
+
+        self.grid_id = gridId.upper().replace(' ','')
+        self.__parse()
+
+        #resolved on first access to lat/lon
+        self.__lat=None
+        self.__lon=None
+
     def __init__(self,lat,lon=None,precision=5,source=None):
 
         if isinstance(lat,number) and isinstance(lon,number):
@@ -538,28 +889,17 @@ class Grid(object):
             else:
                 self.source=source
 
-            self.grid_id = mgrs.toMGRS(lat, lon, MGRSPrecision=precision)
+            self.grid_id = _activeCaches()['grid_id'].lookup((lat,lon,precision),_toMGRS,lat,lon,precision)
+            self.__parse()
 
-            self.lat=lat
-            self.latitude = self.lat
-            self.lon=lon
-            self.longitude = self.lon
+            self.__lat=lat
+            self.__lon=lon
 
 
         elif isinstance(lat,str) and lon == None:
-            # passed in mgrs grid id
-            if source == None:
-                self.source='grid_id'
-            else:
-                self.source=source
-
-            self.grid_id = lat.upper().replace(' ','')
-
-            ll=mgrs.toLatLon(self.grid_id)
-            self.lat=ll[0]
-            self.latitude = self.lat
-            self.lon=ll[1]
-            self.longitude = self.lon
+            # passed in mgrs grid id, interned Grids were already built by __new__
+            if not hasattr(self,'grid_id'):
+                self.__fromGridId(lat,source)
 
         else:
             if lon==None:
@@ -569,3 +909,495 @@ class Grid(object):
                 pass
                 #throw error, can not make a valid grid from these inputs
 
+
+    #####################
+    #                   #
+    #   SPATIAL INDEX   #
+    #                   #
+    #####################
+
+def _gridLatLons(grids):
+    #lat/lon (degrees) of many Grids, the ones not yet projected are decoded in one batch
+    lats=np.array([i._Grid__lat if i._Grid__lat is not None else np.nan for i in grids],dtype=np.float64)
+    lons=np.array([i._Grid__lon if i._Grid__lon is not None else np.nan for i in grids],dtype=np.float64)
+    todo=np.flatnonzero(np.isnan(lats))
+    if len(todo):
+        lats[todo],lons[todo]=_decode([grids[i].grid_id for i in todo])
+    return lats,lons
+
+def _meanGrid(lats,lons):
+    #Grid at the n-vector mean of lat/lons in degrees
+    if not len(lats):
+        raise ValueError('can not find the center of an empty collection')
+    center=_meanPosition(lats,lons)
+    if center is None:
+        raise ValueError('the Grids are spread evenly around the earth and have no geographic mean')
+    return Grid(*center)
+
+def _latLonArrays(grids):
+    #as _gridLatLons, in radians
+    lats,lons=_gridLatLons(grids)
+    return np.radians(lats),np.radians(lons)
+
+class GridIndex(object):
+    #nearest neighbor and radius queries over a collection of Grids, measured between lat/lons like
+    #Grid.distance. Grids are held in a KD tree of their earth centered (ECEF) positions, a straight
+    #line is never longer than the geodesic so the tree gives a superset of the answer that is then
+    #measured exactly on the WGS84 ellipsoid. Added Grids wait in a short pending list and removed
+    #ones are only marked, the tree is rebuilt once either outgrows a few times its square root
+
+    def __init__(self,grids=()):
+        self.__tree=None
+        self.__grids=[]
+        self.__lats=np.zeros(0)
+        self.__lons=np.zeros(0)
+        self.__removed=set()
+        self.__pending=[]
+        self.__pendingPoints=None
+        #Grid -> tree row, or None while pending
+        self.__rows={}
+        self.update(grids)
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def __contains__(self,grid):
+        return grid in self.__rows
+
+    def __iter__(self):
+        return iter(self.__rows)
+
+    def add(self,grid):
+        self.update([grid])
+
+    def update(self,grids):
+        for i in grids:
+            _instanceTypeCheck(i,Grid)
+            if i not in self.__rows:
+                self.__rows[i]=None
+                self.__pending.append(i)
+                self.__pendingPoints=None
+        self.__settle()
+
+    def discard(self,grid):
+        if grid not in self.__rows:
+            return
+        row=self.__rows.pop(grid)
+        if row is None:
+            self.__pending.remove(grid)
+            self.__pendingPoints=None
+        else:
+            self.__removed.add(row)
+        self.__settle()
+
+    def remove(self,grid):
+        if grid not in self.__rows:
+            raise KeyError(grid)
+        self.discard(grid)
+
+    def __settle(self):
+        limit=max(1024,4*int(len(self.__grids)**0.5))
+        if len(self.__pending)>limit or len(self.__removed)>limit:
+            self.__rebuild()
+
+    def __rebuild(self):
+        #only the pending Grids need projecting, the rest keep their points
+        live=np.ones(len(self.__grids),dtype=bool)
+        live[list(self.__removed)]=False
+        points,lats,lons=self.__pendingArrays()
+        if self.__tree is not None:
+            points=np.concatenate([self.__tree.data[live],points])
+            lats,lons=np.concatenate([self.__lats[live],lats]),np.concatenate([self.__lons[live],lons])
+
+        self.__grids=[g for g,keep in zip(self.__grids,live.tolist()) if keep]+self.__pending
+        self.__lats,self.__lons=lats,lons
+        self.__tree=cKDTree(points) if self.__grids else None
+        self.__removed=set()
+        self.__pending=[]
+        self.__pendingPoints=None
+        self.__rows=dict((g,i) for i,g in enumerate(self.__grids))
+
+    def __pendingArrays(self):
+        if self.__pendingPoints is None:
+            lats,lons=_latLonArrays(self.__pending)
+            self.__pendingPoints=(_ecef(lats,lons).reshape(-1,3),lats,lons)
+        return self.__pendingPoints
+
+    def __boundOfNearest(self,xyz,lat,lon,k):
+        #geodesic distance to the kth nearest Grid by straight line, no more than k Grids are closer
+        rows=[]
+        if self.__tree is not None:
+            n=self.__tree.n
+            count=min(k,n)
+            while True:
+                _d,found=self.__tree.query(xyz,count)
+                rows=[i for i in np.atleast_1d(found).tolist() if i not in self.__removed]
+                if len(rows)>=k or count==n:
+                    break
+                count=min(count*2,n)
+            rows=rows[:k]
+        lats,lons=self.__lats[rows],self.__lons[rows]
+
+        if self.__pending:
+            points,pendingLats,pendingLons=self.__pendingArrays()
+            near=np.argsort(np.linalg.norm(points-xyz,axis=1))[:k]
+            lats,lons=np.concatenate([lats,pendingLats[near]]),np.concatenate([lons,pendingLons[near]])
+
+        d=np.sort(_inverse(lat,lon,lats,lons)[0])
+        return d[min(k,len(d))-1]
+
+    def __measureWithin(self,xyz,lat,lon,radius):
+        #Grids whose straight line distance is within radius, with their geodesic distances
+        rows=[i for i in self.__tree.query_ball_point(xyz,radius) if i not in self.__removed] if self.__tree is not None else []
+        grids=[self.__grids[i] for i in rows]
+        lats,lons=self.__lats[rows],self.__lons[rows]
+
+        if self.__pending:
+            points,pendingLats,pendingLons=self.__pendingArrays()
+            near=np.flatnonzero(np.linalg.norm(points-xyz,axis=1)<=radius)
+            grids+=[self.__pending[i] for i in near.tolist()]
+            lats,lons=np.concatenate([lats,pendingLats[near]]),np.concatenate([lons,pendingLons[near]])
+
+        d=_inverse(lat,lon,lats,lons)[0]
+        order=np.argsort(d,kind='stable')
+        return [grids[i] for i in order.tolist()],d[order]
+
+    def __query(self,grid):
+        _instanceTypeCheck(grid,Grid)
+        lat,lon=radians(grid.lat),radians(grid.lon)
+        return _ecef(lat,lon),lat,lon
+
+    def k_nearest(self,grid,k):
+        #the k Grids closest to grid, nearest first
+        if k<1 or not len(self):
+            return mgrsList()
+        xyz,lat,lon=self.__query(grid)
+        bound=self.__boundOfNearest(xyz,lat,lon,k)
+        grids,_d=self.__measureWithin(xyz,lat,lon,bound*(1+1e-9)+1e-6)
+        return mgrsList(grids[:k])
+
+    def nearest(self,grid):
+        #the Grid closest to grid
+        if not len(self):
+            raise ValueError('can not find the nearest Grid in an empty GridIndex')
+        return self.k_nearest(grid,1)[0]
+
+    def within_radius(self,grid,radius):
+        #every Grid within radius meters of grid, nearest first
+        xyz,lat,lon=self.__query(grid)
+        grids,d=self.__measureWithin(xyz,lat,lon,radius*(1+1e-9)+1e-6)
+        return mgrsList(grids[:int(np.searchsorted(d,radius,side='right'))])
+
+
+    ####################################
+    #                                  #
+    #   MGRSSET/MGRSLIST PARENT CLASS  #
+    #                                  #
+    ####################################
+
+class _gridStruct(object):
+    _index=None
+    _members=None
+
+    def _changed(self):
+        #drops the views of the members kept between calls, every mutator calls it
+        self._members=None
+
+    def __containsOnlyGrids(self):
+        test = [True if isinstance(i,Grid) else False for i in self]
+        if False in test:
+            return False
+        else:
+            return True
+
+    def __removeNonGrids(self):
+        for i in self:
+            if not isinstance(i,Grid):
+                del self[i]
+
+    def __memberSet(self):
+        #hashed view of self so membership tests are O(1) for lists too, kept until self changes
+        if isinstance(self,set):
+            return self
+        if self._members is None:
+            self._members=frozenset(self)
+        return self._members
+
+    def isContiguous(self,grid,diagonal=False):
+        #return true if all neighbors of g have the same membership type as grid
+        members = self.__memberSet()
+        membershipType = grid in members
+        tests = [(i in members) == membershipType for i in grid.adjacent(diagonal)]
+        return not (False in tests)
+
+    def isIsoated(self,grid,diagonal=False):
+        #return true if all neighbors of g have the opposite membership type as grid
+        members = self.__memberSet()
+        membershipType = grid in members
+        tests = [(i in members) == membershipType for i in grid.adjacent(diagonal)]
+        return False in tests
+
+    def spatialIndex(self):
+        #GridIndex of the members, built on first use and then kept up to date as members are added
+        #and removed
+        if self._index is None:
+            self._index=GridIndex(self)
+        return self._index
+
+    def nearestTo(self,gridB):
+        #returns the Grid in self closest to gridB
+        return self.spatialIndex().nearest(gridB)
+
+    def __sweep(self):
+        #the members and their latitudes and longitudes, gathered in one pass for the extremes and
+        #centers below
+        members=list(self)
+        if not members:
+            raise ValueError('can not find the extremes or centers of an empty collection')
+        lats,lons=_gridLatLons(members)
+        return members,lats,lons
+
+    def centerEasting(self):
+        #returns Grid containing the avg(latitude),max(longitude)
+        _members,lats,lons=self.__sweep()
+        return Grid(float(lats.mean()),float(lons.max()))
+
+    def centerX(self):
+        return self.centerEasting()
+
+    def centerNorthing(self):
+        #returns Grid containing the max(latitude),avg(longitude)
+        _members,lats,lons=self.__sweep()
+        return Grid(float(lats.max()),float(lons.mean()))
+
+    def centerY(self):
+        return self.centerNorthing()
+
+    def centeroid(self,geodesic=False):
+        #returns Grid containing the max(latitude),max(longitude), or with geodesic the geographic
+        #mean of the members (the mean of their n-vectors), which is right across the antimeridian
+        _members,lats,lons=self.__sweep()
+        if geodesic:
+            return _meanGrid(lats,lons)
+        return Grid(float(lats.max()),float(lons.max()))
+
+    def __membersAt(self,members,values,extreme):
+        return self.__offspring([members[i] for i in np.flatnonzero(values==extreme).tolist()])
+
+    def extremes(self):
+        #the northernmost, easternmost, southernmost and westernmost members from a single pass
+        members,lats,lons=self.__sweep()
+        return {'northernmost':self.__membersAt(members,lats,lats.max()),
+                'easternmost':self.__membersAt(members,lons,lons.max()),
+                'southernmost':self.__membersAt(members,lats,lats.min()),
+                'westernmost':self.__membersAt(members,lons,lons.min())}
+
+    def northernmost(self):
+        #returns the northernmost Grids in self, all of them if several share the largest latitude
+        members,lats,_lons=self.__sweep()
+        return self.__membersAt(members,lats,lats.max())
+
+    def westernmost(self):
+        #returns the westernmost Grids in self.
+        members,_lats,lons=self.__sweep()
+        return self.__membersAt(members,lons,lons.min())
+
+    def easternmost(self):
+        #returns the easternmost Grids in self.
+        members,_lats,lons=self.__sweep()
+        return self.__membersAt(members,lons,lons.max())
+
+    def southernmost(self):
+        #returns the southernmost Grids in self.
+        members,lats,_lons=self.__sweep()
+        return self.__membersAt(members,lats,lats.min())
+
+    def exterior(self,diagonal=False):
+        #members with at least one neighbor outside self, see mgrslib.boundary
+        members=list(self)
+        mask=_exteriorMask(members,diagonal)
+        return self.__offspring([members[i] for i in np.flatnonzero(mask).tolist()])
+
+    def interior(self,diagonal=False):
+        members=list(self)
+        mask=_exteriorMask(members,diagonal)
+        return self.__offspring([members[i] for i in np.flatnonzero(~mask).tolist()])
+
+    def __groups(self,grids,numbers):
+        #one offspring per number, in number order
+        order=np.argsort(numbers,kind='stable')
+        splits=np.flatnonzero(np.diff(numbers[order]))+1
+        return [self.__offspring([grids[i] for i in group.tolist()]) for group in np.split(order,splits)] if len(order) else []
+
+    def components(self,diagonal=False):
+        #the members split into groups of touching Grids
+        members=list(self)
+        return self.__groups(members,_components(members,diagonal))
+
+    def holes(self,diagonal=False):
+        #Grids enclosed by self that are not members, one group per hole
+        cells,numbers=_holes(list(self),diagonal)
+        return self.__groups([Grid.from_int(int(i)) for i in cells],numbers)
+
+    def boundingBox(self):
+        #returns a Rect around the corners of all members of self
+        return _Geometry._boundingRect(np.array([i.to_int() for i in self],dtype=np.uint64))
+
+    def __offspring(self,struct):
+        if isinstance(self,mgrsSet):
+            return mgrsSet(struct)
+        elif isinstance(self,mgrsList):
+            return mgrsList(struct)
+
+    def __insert(self,item):
+        _instanceTypeCheck(item,Grid)
+        if isinstance(self,mgrsSet):
+            self.add(item)
+        elif isinstance(self,mgrsList):
+            self.append(item)
+
+    def rTree(self):
+        #packed R-tree of the members' bounding boxes, see RTree.save for writing it to disk
+        return RTree(self)
+
+
+    ###############################################################
+    #                                                             #
+    #   CREATE MGRSSET/MGRSLIST CLASSES VIA MULTIPLE INHERITANCE  #
+    #                                                             #
+    ###############################################################
+
+
+def _dropsIndex(method):
+    #mutators not worth following one Grid at a time, the spatialIndex is rebuilt on next use instead
+    def mutator(self,*args):
+        self._index=None
+        self._changed()
+        return method(self,*args)
+    return mutator
+
+class mgrsList(list, _gridStruct):
+
+    def append(self,item):
+        list.append(self,item)
+        self._changed()
+        if self._index is not None:
+            self._index.add(item)
+
+    def insert(self,position,item):
+        list.insert(self,position,item)
+        self._changed()
+        if self._index is not None:
+            self._index.add(item)
+
+    def extend(self,items):
+        items=list(items)
+        list.extend(self,items)
+        self._changed()
+        if self._index is not None:
+            self._index.update(items)
+
+    def remove(self,item):
+        list.remove(self,item)
+        self._changed()
+        if self._index is not None and item not in self:
+            self._index.discard(item)
+
+    def pop(self,*position):
+        item=list.pop(self,*position)
+        self._changed()
+        if self._index is not None and item not in self:
+            self._index.discard(item)
+        return item
+
+    clear=_dropsIndex(list.clear)
+    __setitem__=_dropsIndex(list.__setitem__)
+    __delitem__=_dropsIndex(list.__delitem__)
+    __iadd__=_dropsIndex(list.__iadd__)
+    __imul__=_dropsIndex(list.__imul__)
+
+class mgrsSet(set, _gridStruct):
+    _compacted=None
+
+    def _changed(self):
+        _gridStruct._changed(self)
+        self._compacted=None
+
+    def add(self,item):
+        set.add(self,item)
+        self._changed()
+        if self._index is not None:
+            self._index.add(item)
+
+    def update(self,*others):
+        items=[i for other in others for i in other]
+        set.update(self,items)
+        self._changed()
+        if self._index is not None:
+            self._index.update(items)
+
+    def discard(self,item):
+        set.discard(self,item)
+        self._changed()
+        if self._index is not None:
+            self._index.discard(item)
+
+    def remove(self,item):
+        set.remove(self,item)
+        self._changed()
+        if self._index is not None:
+            self._index.discard(item)
+
+    def pop(self):
+        item=set.pop(self)
+        self._changed()
+        if self._index is not None:
+            self._index.discard(item)
+        return item
+
+    clear=_dropsIndex(set.clear)
+    difference_update=_dropsIndex(set.difference_update)
+    intersection_update=_dropsIndex(set.intersection_update)
+    symmetric_difference_update=_dropsIndex(set.symmetric_difference_update)
+    __ior__=_dropsIndex(set.__ior__)
+    __iand__=_dropsIndex(set.__iand__)
+    __isub__=_dropsIndex(set.__isub__)
+    __ixor__=_dropsIndex(set.__ixor__)
+
+    def __cells(self):
+        return np.array([i.to_int() for i in self],dtype=np.uint64)
+
+    def compact(self):
+        #the fewest Grids covering the same ground: members inside another member are dropped and
+        #every complete set of 100 children is replaced by their parent, repeatedly
+        return mgrsSet(Grid.from_int(int(i)) for i in _compactCells(self.__cells()))
+
+    def uncompact(self,precision=5):
+        #every Grid of precision inside a member, the inverse of compact
+        return mgrsSet(Grid.from_int(int(i)) for i in _uncompactCells(self.__cells(),precision))
+
+    def covers(self,gridB):
+        #True if gridB is a member or inside one, without uncompacting self. The sorted compacted
+        #members are kept until self changes, so each test is a binary search
+        _instanceTypeCheck(gridB,Grid)
+        if self._compacted is None:
+            self._compacted=_compactCells(self.__cells())
+        return bool(_coveredCells(self._compacted,np.array([gridB.to_int()],dtype=np.uint64))[0])
+
+
+    ################
+    #              #
+    #   POLYGONS   #
+    #              #
+    ################
+
+def iterPolyfill(polygon,precision=5,intersects=False):
+    #generator version of polyfill, Grids are built as they are reached
+    for cells in _iterPolyfill(polygon,precision,intersects):
+        for cell in cells:
+            yield Grid.from_int(cell)
+
+def polyfill(polygon,precision=5,intersects=False):
+    #every Grid of precision whose center is inside polygon, or with intersects every Grid any part of
+    #which is, found by scanning coarse cells and only splitting the ones on the polygon's edges
+    return mgrsSet(iterPolyfill(polygon,precision,intersects))
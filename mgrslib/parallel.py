@@ -0,0 +1,211 @@
+#
+#  mgrslib.parallel
+#  Batch encoding, decoding, buffers, polyfill and set algebra spread over many cores
+#
+#  Work is cut into independent tasks and handed to a pool of processes or threads, and the
+#  results are put back together in task order. Arrays of points are cut into contiguous runs,
+#  buffers into blocks of rows of cells, polyfill into the 100km squares each zone and band of
+#  the polygon starts its scan from and set algebra into ranges of cells, placed by sampling
+#  runs of a and b that the workers have sorted. encode, decode and buffer return exactly what
+#  mgrslib.batch does and set algebra what numpy's union1d and its kin do; polyfill returns the
+#  same cells as mgrslib.polygon.polyfill, square by square. None of the results depend on the
+#  number of workers or the backend.
+#
+#  The process backend suits everything. The thread backend only pays where the numpy kernels
+#  release the GIL, which is the large array work of encode, decode and set algebra.
+#
+#  Copyright 2017-2021 (c) Peter E Lenz [pelenz@pelenz.com]
+#  MIT License, see mgrslib.py
+#
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from .batch import _checkPrecision, _bufferCenter, _bufferBlocks, _bufferRows, _iterBufferOtherFrames
+from .batch import encode as _encode, decode as _decode
+from .polygon import _seeds, _iterScan
+
+
+#fewest points or cells worth a task of their own
+_TASK_ROWS = 1 << 14
+
+#tasks per worker, so that uneven tasks even out
+_TASKS_PER_WORKER = 4
+
+_BACKENDS = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}
+
+def _workers(workers):
+    if workers is None:
+        return os.cpu_count() or 1
+    workers = int(workers)
+    if workers < 1:
+        raise ValueError('workers must be 1 or more. Input was ' + str(workers))
+    return workers
+
+def _map(function, tasks, workers, backend):
+    #function(*task) of every task, in task order. One worker or one task runs in this process
+    if backend not in _BACKENDS:
+        raise ValueError('backend must be one of ' + ', '.join(sorted(_BACKENDS)) + '. Input was ' + str(backend))
+    tasks = list(tasks)
+    workers = min(_workers(workers), len(tasks))
+    if workers <= 1:
+        return [function(*task) for task in tasks]
+    with _BACKENDS[backend](max_workers=workers) as pool:
+        return list(pool.map(function, *zip(*tasks)))
+
+def _concatenate(chunks):
+    chunks = [i for i in chunks if len(i)]
+    if not chunks:
+        return np.zeros(0, dtype=np.uint64)
+    return np.concatenate(chunks)
+
+def _runs(n, workers):
+    #(start, stop) of contiguous runs covering n rows, a few per worker when there is enough to
+    #go round
+    count = max(1, min(_workers(workers) * _TASKS_PER_WORKER, n // _TASK_ROWS))
+    bounds = np.linspace(0, n, count + 1).astype(np.int64)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+    ##########################
+    #                        #
+    #   ENCODE AND DECODE    #
+    #                        #
+    ##########################
+
+def encode(lats, lons, precision=5, workers=None, backend='process'):
+    #mgrslib.encode with the points split into runs
+    lats, lons = np.broadcast_arrays(np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+    precision = _checkPrecision(precision)
+    shape = lats.shape
+    lats = lats.ravel()
+    lons = lons.ravel()
+    chunks = _map(_encode, [(lats[i:j], lons[i:j], precision) for i, j in _runs(len(lats), workers)], workers, backend)
+    return np.concatenate(chunks).reshape(shape)
+
+def decode(ids, center=False, workers=None, backend='process'):
+    #mgrslib.decode with the ids split into runs
+    ids = np.asarray(ids)
+    shape = ids.shape
+    ids = ids.ravel()
+    chunks = _map(_decode, [(ids[i:j], center) for i, j in _runs(len(ids), workers)], workers, backend)
+    return np.concatenate([i[0] for i in chunks]).reshape(shape), np.concatenate([i[1] for i in chunks]).reshape(shape)
+
+
+    ##########################
+    #                        #
+    #   BUFFER AND POLYFILL  #
+    #                        #
+    ##########################
+
+def _otherFrames(center, radius, inner):
+    return _concatenate(list(_iterBufferOtherFrames(center, radius, inner)))
+
+def _buffer(center, radius, inner, rows):
+    if rows is None:
+        return _otherFrames(center, radius, inner)
+    return _bufferRows(center, rows, radius, inner)
+
+def buffer(gridId, radius, inner=0, workers=None, backend='process'):
+    #mgrslib.batch.buffer with the home frame split into blocks of rows, the cells of other
+    #frames are one more task
+    center = _bufferCenter(gridId)
+    blocks = _bufferBlocks(center, radius)
+    chunks = _map(_buffer, [(center, radius, inner, rows) for rows in blocks + [None]], workers, backend)
+    return _concatenate(chunks)
+
+def _scan(region, shape, bounds, easting, northing, precision, intersects):
+    return _concatenate(list(_iterScan(region, shape, bounds, easting, northing, 0, precision, intersects)))
+
+def polyfill(polygon, precision=5, intersects=False, workers=None, backend='process'):
+    #the cells of mgrslib.polygon.polyfill with one task per 100km square each zone and band of
+    #the polygon starts its scan from. The cells come square by square, so their order differs
+    #from polygon.polyfill's but does not depend on workers or backend
+    precision = _checkPrecision(precision)
+    tasks = [(region, shape, bounds, easting[i:i + 1], northing[i:i + 1], precision, intersects)
+             for region, shape, bounds, easting, northing in _seeds(polygon) for i in range(len(easting))]
+    return _concatenate(_map(_scan, tasks, workers, backend))
+
+
+    ##################
+    #                #
+    #   SET ALGEBRA  #
+    #                #
+    ##################
+
+_SET_OPERATIONS = {'union': np.union1d, 'intersection': np.intersect1d,
+                   'difference': np.setdiff1d, 'symmetric_difference': np.setxor1d}
+
+def _merged(parts):
+    #sorted distinct values of sorted parts. A stable sort of sorted runs is a merge, which takes
+    #about linear time
+    values = np.sort(_concatenate(parts), kind='stable')
+    return values[np.concatenate([[True], values[1:] != values[:-1]])] if len(values) else values
+
+def _mergedSetOperation(name, a, b):
+    #a set operation of two sorted distinct arrays
+    if name == 'difference':
+        if not len(b):
+            return a
+        return a[b[np.minimum(np.searchsorted(b, a), len(b) - 1)] != a]
+    both = np.sort(np.concatenate([a, b]), kind='stable')
+    if not len(both):
+        return both
+    repeated = np.concatenate([both[1:] == both[:-1], [False]])
+    if name == 'intersection':
+        return both[repeated]
+    if name == 'union':
+        return both[~np.concatenate([[False], repeated[:-1]])]
+    return both[~(repeated | np.concatenate([[False], repeated[:-1]]))]
+
+#values read from each sorted run to place the cut points
+_SAMPLES_PER_TASK = 8
+
+def _cuts(runs, count):
+    #up to count - 1 cut points spread evenly over the values of sorted runs, placed from a few
+    #samples of each run rather than from all of their values
+    samples = [run[np.linspace(0, len(run) - 1, min(len(run), count * _SAMPLES_PER_TASK)).astype(np.int64)] for run in runs if len(run)]
+    if count < 2 or not samples:
+        return np.zeros(0, dtype=np.uint64)
+    samples = np.sort(np.concatenate(samples))
+    return np.unique(samples[np.linspace(0, len(samples) - 1, count + 1).astype(np.int64)[1:-1]])
+
+def _slices(runs, cuts):
+    #the parts of every sorted run between consecutive cuts, one list of parts per range
+    bounds = [np.concatenate([[0], np.searchsorted(run, cuts), [len(run)]]) for run in runs]
+    return [[run[ends[i]:ends[i + 1]] for run, ends in zip(runs, bounds)] for i in range(len(cuts) + 1)]
+
+def _setOperation(name, a, b):
+    return _mergedSetOperation(name, _merged(a), _merged(b))
+
+def _algebra(name, a, b, workers, backend):
+    #sorted distinct packed cells of a set operation. Workers first sort and dedupe contiguous runs
+    #of a and b, then each works on one range of cells of every run, so this process only samples
+    #the runs for cut points and binary searches them, never touching every cell
+    a = np.asarray(a, dtype=np.uint64).ravel()
+    b = np.asarray(b, dtype=np.uint64).ravel()
+    if _workers(workers) == 1:
+        return _SET_OPERATIONS[name](a, b)
+    aSpans = [(a[i:j],) for i, j in _runs(len(a), workers)]
+    runs = _map(np.unique, aSpans + [(b[i:j],) for i, j in _runs(len(b), workers)], workers, backend)
+    aRuns = runs[:len(aSpans)]
+    bRuns = runs[len(aSpans):]
+
+    cuts = _cuts(runs, len(_runs(len(a) + len(b), workers)))
+    tasks = [(name, aParts, bParts) for aParts, bParts in zip(_slices(aRuns, cuts), _slices(bRuns, cuts))]
+    return _concatenate(_map(_setOperation, tasks, workers, backend))
+
+def union(a, b, workers=None, backend='process'):
+    #sorted distinct packed cells in a or b
+    return _algebra('union', a, b, workers, backend)
+
+def intersection(a, b, workers=None, backend='process'):
+    return _algebra('intersection', a, b, workers, backend)
+
+def difference(a, b, workers=None, backend='process'):
+    return _algebra('difference', a, b, workers, backend)
+
+def symmetric_difference(a, b, workers=None, backend='process'):
+    return _algebra('symmetric_difference', a, b, workers, backend)
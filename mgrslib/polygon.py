@@ -0,0 +1,394 @@
+#
+#  mgrslib.polygon
+#  Covering WGS84 polygons with MGRS cells
+#
+#  Polygon edges are straight lines in latitude/longitude degrees, as in GeoJSON. The polygon is
+#  clipped to each UTM zone and latitude band (and each UPS cap) it reaches, and each clipped
+#  piece is projected into its zone's frame, where the cells form a square lattice aligned with
+#  the 100km grid squares. The lattice is scanned coarse to fine: at each precision the cells the
+#  polygon's edges pass through are found by walking the edges row by row, the remaining cells
+#  are wholly inside or outside and are told apart by counting edge crossings along their row,
+#  cells wholly inside are expanded to their descendants in one go and only the cells on the
+#  edges are split into their 100 children and scanned again.
+#
+#  Cells cut by a zone or band seam belong to each zone and band they reach into, under a
+#  different grid id in each, as elsewhere in mgrslib.
+#
+#  Copyright 2017-2021 (c) Peter E Lenz [pelenz@pelenz.com]
+#  MIT License, see mgrslib.py
+#
+
+import numpy as np
+
+from .batch import _toFrame, _fromFrame, _utmLetters, _upsLetters, _pack, _descendantCells, _checkPrecision
+from .batch import _BANDS, _V, _X, _CELL_POINTS, _INSET, _CHUNK, _DEG_TO_RAD, _RAD_TO_DEG
+
+
+    ##############
+    #            #
+    #   RINGS    #
+    #            #
+    ##############
+
+#longest piece, in degrees, a polygon edge is cut into before it is projected. Projected edges
+#are curves, the pieces keep them within a few centimeters of the curve
+_DENSIFY_STEP = 0.01
+
+def _rings(polygon):
+    #(lat, lon) degree arrays of the rings of a polygon given as (lat, lon) pairs of one ring, a
+    #list of such rings, or anything with a GeoJSON Polygon or MultiPolygon __geo_interface__
+    geometry = getattr(polygon, '__geo_interface__', polygon)
+    if isinstance(geometry, dict):
+        if geometry.get('type') == 'Feature':
+            geometry = geometry['geometry']
+        if geometry.get('type') == 'Polygon':
+            rings = geometry['coordinates']
+        elif geometry.get('type') == 'MultiPolygon':
+            rings = [ring for part in geometry['coordinates'] for ring in part]
+        else:
+            raise TypeError('polyfill needs a Polygon or MultiPolygon, got a ' + str(geometry.get('type')))
+        #GeoJSON positions are longitude, latitude and maybe an altitude
+        rings = [np.asarray(ring, dtype=np.float64)[:, 1::-1] for ring in rings]
+    else:
+        rings = list(polygon)
+        if rings and np.ndim(rings[0]) == 1:
+            rings = [rings]
+        rings = [np.asarray(ring, dtype=np.float64).reshape(-1, 2) for ring in rings]
+
+    out = []
+    for ring in rings:
+        if len(ring) > 1 and (ring[0] == ring[-1]).all():
+            ring = ring[:-1]
+        if len(ring) < 3:
+            raise ValueError('a polygon ring needs at least 3 points, got ' + str(len(ring)))
+        if (np.fabs(ring[:, 0]) > 90).any() or (np.fabs(ring[:, 1]) > 180).any() or not np.isfinite(ring).all():
+            raise ValueError('polygon latitudes must be between -90 and 90 and longitudes between -180 and 180')
+        out.append(ring)
+    return out
+
+def _clipRing(points, south, west, north, east):
+    #Sutherland-Hodgman clip of an (n, 2) lat/lon ring to a box. A concave ring may come back as
+    #one ring joined by edges running both ways along the box, which cancel when counting crossings
+    for axis, limit, sign in ((1, west, 1), (1, east, -1), (0, south, 1), (0, north, -1)):
+        if not len(points):
+            break
+        following = np.roll(points, -1, axis=0)
+        inside = sign * (points[:, axis] - limit) >= 0
+        nextInside = sign * (following[:, axis] - limit) >= 0
+
+        span = np.where(inside != nextInside, following[:, axis] - points[:, axis], 1.0)
+        cross = points + ((limit - points[:, axis]) / span)[:, None] * (following - points)
+        cross[:, axis] = limit
+
+        #each edge keeps its end if that is inside, preceded by the crossing if it crosses the line
+        candidates = np.stack([np.where((inside & nextInside)[:, None], following, cross), following], axis=1)
+        points = candidates[np.stack([inside | nextInside, ~inside & nextInside], axis=1)]
+    return points
+
+def _densify(points):
+    #the ring with every edge cut into pieces no longer than _DENSIFY_STEP degrees
+    following = np.roll(points, -1, axis=0)
+    steps = np.maximum(np.ceil(np.fabs(following - points).max(axis=1) / _DENSIFY_STEP), 1).astype(np.int64)
+    along = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(steps, steps).astype(np.float64)
+    return np.repeat(points, steps, axis=0) + along[:, None] * np.repeat(following - points, steps, axis=0)
+
+
+    ###############
+    #             #
+    #   REGIONS   #
+    #             #
+    ###############
+
+def _zoneStrips(band):
+    #(zone, west, east) of the UTM zones in a latitude band, with the Norway and Svalbard exceptions
+    strips = dict((zone, (-180.0 + 6 * (zone - 1), -180.0 + 6 * zone)) for zone in range(1, 61))
+    if band == _V:
+        strips[31] = (0.0, 3.0)
+        strips[32] = (3.0, 12.0)
+    elif band == _X:
+        strips.update({31: (0.0, 9.0), 33: (9.0, 21.0), 35: (21.0, 33.0), 37: (33.0, 42.0)})
+        for zone in (32, 34, 36):
+            del strips[zone]
+    return [(zone, west, east) for zone, (west, east) in sorted(strips.items())]
+
+def _regions(south, west, north, east):
+    #(frame, south, west, north, east) of every UPS cap and UTM zone and band meeting a box
+    regions = []
+    if north > 84:
+        regions.append(((0, False), 84.0, -180.0, 90.0, 180.0))
+    for row, band in enumerate(_BANDS):
+        bandSouth = -80.0 + 8 * row
+        bandNorth = 84.0 if band == _X else bandSouth + 8
+        if bandNorth <= south or bandSouth >= north:
+            continue
+        for zone, zoneWest, zoneEast in _zoneStrips(band):
+            if zoneWest < east and zoneEast > west:
+                regions.append(((zone, bandSouth < 0), bandSouth, zoneWest, bandNorth, zoneEast))
+    if south < -80:
+        regions.append(((0, True), -90.0, -180.0, -80.0, 180.0))
+    return regions
+
+def _inRegion(region, easting, northing):
+    #True for the points of the region's frame inside the region
+    frame, south, west, north, east = region
+    lat, lon = _fromFrame(easting, northing, *frame)
+    lat = lat * _RAD_TO_DEG
+    lon = lon * _RAD_TO_DEG
+    if frame[0] == 0:
+        return lat < north if frame[1] else lat > south
+    return (lat >= south) & (lat < north) & (lon >= west) & (lon < east)
+
+def _packRegionCells(region, easting, northing, precision):
+    #packs the cells of a region with these southwest corners, letters follow from the frame
+    frame, south, _west, north, _east = region
+    easting = easting.astype(np.float64)
+    northing = northing.astype(np.float64)
+    n = len(easting)
+    if frame[0] == 0:
+        zone = np.zeros(n, dtype=np.int64)
+        letter1, letter2, letter3 = _upsLetters(np.full(n, -1.0 if frame[1] else 1.0), easting, northing)
+    else:
+        middle = np.full(n, (south + north) / 2.0 * _DEG_TO_RAD)
+        zone, letter1, letter2, letter3, _e, _n = _utmLetters(middle, np.zeros(n), np.full(n, frame[0], dtype=np.int64), easting, northing)
+
+    size = 10 ** (5 - precision)
+    return _pack(zone, letter1, letter2, letter3, easting.astype(np.int64) % 100000 // size, northing.astype(np.int64) % 100000 // size, precision)
+
+
+    #################
+    #               #
+    #   SCANLINES   #
+    #               #
+    #################
+
+class _Scanlines(object):
+    #the projected edges of a clipped polygon, with the cells each precision's rows of cells pass
+    #through and where the edges cross the middle of each row, worked out on first use
+
+    def __init__(self, x1, y1, x2, y2):
+        self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
+        self.west = min(x1.min(), x2.min())
+        self.east = max(x1.max(), x2.max())
+        self.south = min(y1.min(), y2.min())
+        self.north = max(y1.max(), y2.max())
+        self.__touched = {}
+        self.__crossings = {}
+
+    def __lattice(self, size):
+        #first row and column, and number of columns, of the cells the edges span
+        column = int(self.west // size)
+        return int(self.south // size), column, int(self.east // size) - column + 1
+
+    def touched(self, precision, easting, northing):
+        #True for the cells, given by southwest corner, an edge passes through or touches
+        size = 10 ** (5 - precision)
+        row, column, columns = self.__lattice(size)
+        if precision not in self.__touched:
+            self.__touched[precision] = self.__walk(size, row, column, columns)
+        keys = self.__touched[precision]
+
+        cellRow = northing // size - row
+        cellColumn = easting // size - column
+        key = cellRow * columns + cellColumn
+        at = np.minimum(np.searchsorted(keys, key), len(keys) - 1)
+        return (cellColumn >= 0) & (cellColumn < columns) & (keys[at] == key)
+
+    def __walk(self, size, row, column, columns):
+        #sorted keys (row * columns + column, from the lattice origin) of the cells the edges touch
+        keys = []
+        for start in range(0, len(self.x1), _CHUNK):
+            x1, y1, x2, y2 = [i[start:start + _CHUNK] for i in (self.x1, self.y1, self.x2, self.y2)]
+            low = np.minimum(y1, y2)
+            high = np.maximum(y1, y2)
+            first = (low // size).astype(np.int64)
+            count = (high // size).astype(np.int64) - first + 1
+
+            #each edge cut to each row it spans
+            edge = np.repeat(np.arange(len(x1)), count)
+            rows = first[edge] + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+            bottom = np.maximum(low[edge], rows * size)
+            top = np.minimum(high[edge], (rows + 1) * size)
+            rise = y2[edge] - y1[edge]
+            flat = rise == 0
+            slope = (x2[edge] - x1[edge]) / np.where(flat, 1.0, rise)
+            xBottom = np.where(flat, x1[edge], x1[edge] + (bottom - y1[edge]) * slope)
+            xTop = np.where(flat, x2[edge], x1[edge] + (top - y1[edge]) * slope)
+
+            left = (np.minimum(xBottom, xTop) // size).astype(np.int64)
+            width = (np.maximum(xBottom, xTop) // size).astype(np.int64) - left + 1
+            piece = np.repeat(np.arange(len(rows)), width)
+            cells = left[piece] + np.arange(width.sum()) - np.repeat(np.cumsum(width) - width, width)
+            keys.append(np.unique((rows[piece] - row) * columns + cells - column))
+        return np.unique(np.concatenate(keys))
+
+    def inside(self, precision, easting, northing):
+        #True for the points in the middle of a row of cells of precision that have an odd number
+        #of edge crossings to their west
+        size = 10 ** (5 - precision)
+        row = self.__lattice(size)[0]
+        stride = self.east - self.west + 4.0 * size
+        if precision not in self.__crossings:
+            self.__crossings[precision] = self.__cross(size, row, stride)
+        keys = self.__crossings[precision]
+
+        pointRow = (northing // size - row).astype(np.float64)
+        position = np.clip(easting - self.west, -size, self.east - self.west + size)
+        count = np.searchsorted(keys, pointRow * stride + position) - np.searchsorted(keys, pointRow * stride - 2.0 * size)
+        return count % 2 == 1
+
+    def __cross(self, size, row, stride):
+        #sorted crossings of the middle lines of the rows, as row * stride + distance east of west
+        keys = []
+        for start in range(0, len(self.x1), _CHUNK):
+            x1, y1, x2, y2 = [i[start:start + _CHUNK] for i in (self.x1, self.y1, self.x2, self.y2)]
+            low = np.minimum(y1, y2)
+            high = np.maximum(y1, y2)
+
+            #rows whose middle line is at or above the lower end and below the upper end
+            first = np.ceil(low / size - 0.5).astype(np.int64)
+            count = np.maximum(np.ceil(high / size - 0.5).astype(np.int64) - first, 0)
+
+            edge = np.repeat(np.arange(len(x1)), count)
+            rows = first[edge] + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+            middle = (rows + 0.5) * size
+            x = x1[edge] + (middle - y1[edge]) * (x2[edge] - x1[edge]) / (y2[edge] - y1[edge])
+            keys.append((rows - row) * stride + (x - self.west))
+        return np.sort(np.concatenate(keys))
+
+
+    ################
+    #              #
+    #   POLYFILL   #
+    #              #
+    ################
+
+#offsets of the 100 children of a cell, in its frame and in units of the child's size
+_CHILD_EAST, _CHILD_NORTH = [i.ravel() for i in np.divmod(np.arange(100), 10)]
+
+def _iterDescendants(cells, depth):
+    #generator of uint64 arrays of every descendant depth levels down of packed cells
+    if not len(cells):
+        return
+    if depth == 0:
+        yield cells
+        return
+    if 100 ** depth <= _CHUNK:
+        step = _CHUNK // 100 ** depth
+        for start in range(0, len(cells), step):
+            yield _descendantCells(cells[start:start + step], depth).ravel()
+        return
+    for cell in cells:
+        for children in _iterDescendants(_descendantCells(cell[None], 1).ravel(), depth - 1):
+            yield children
+
+def _classify(scan, precision, easting, northing):
+    #(on an edge, wholly inside) for cells of precision given by southwest corner
+    size = 10 ** (5 - precision)
+    edge = scan.touched(precision, easting, northing)
+    inside = ~edge
+    inside[inside] = scan.inside(precision, easting[inside] + size / 2.0, northing[inside] + size / 2.0)
+    return edge, inside
+
+def _iterScan(region, shape, bounds, easting, northing, precision, final, intersects):
+    #generator of uint64 arrays of the covering cells among cells of precision (by southwest
+    #corner) of a region, refining the cells on the edges of the polygon's shape or of the
+    #region's bounds down to the final precision
+    size = 10 ** (5 - precision)
+    shapeEdge, shapeInside = _classify(shape, precision, easting, northing)
+    boundsEdge, boundsInside = _classify(bounds, precision, easting, northing)
+
+    inside = shapeInside & boundsInside
+    if inside.any():
+        for cells in _iterDescendants(_packRegionCells(region, easting[inside], northing[inside], precision), final - precision):
+            yield cells
+
+    edge = (shapeEdge | shapeInside) & (boundsEdge | boundsInside) & ~inside
+    easting = easting[edge]
+    northing = northing[edge]
+    shapeEdge = shapeEdge[edge]
+    boundsEdge = boundsEdge[edge]
+    if precision == final:
+        #cells on the polygon's edges count if their center is inside it, or with intersects at all
+        keep = np.ones(len(easting), dtype=bool)
+        if not intersects:
+            keep[shapeEdge] = shape.inside(precision, easting[shapeEdge] + size / 2.0, northing[shapeEdge] + size / 2.0)
+
+        #and cells on the edges of the region if part of them is in its zone and band
+        along = np.linspace(_INSET, size - _INSET, _CELL_POINTS[precision])
+        unsure = keep & boundsEdge
+        keep[unsure] = False
+        for x in along:
+            for y in along:
+                unsure[keep] = False
+                keep[unsure] = _inRegion(region, easting[unsure] + x, northing[unsure] + y)
+        if keep.any():
+            yield _packRegionCells(region, easting[keep], northing[keep], precision)
+        return
+
+    #split the remaining cells into their children, a chunk of children at a time
+    child = size // 10
+    step = max(1, _CHUNK // 100)
+    for start in range(0, len(easting), step):
+        childEasting = (easting[start:start + step, None] + _CHILD_EAST * child).ravel()
+        childNorthing = (northing[start:start + step, None] + _CHILD_NORTH * child).ravel()
+        for cells in _iterScan(region, shape, bounds, childEasting, childNorthing, precision + 1, final, intersects):
+            yield cells
+
+#degrees a polygon is clipped beyond the region it is projected for, enough for the center of a
+#100km cell cut by the region's edge. Longitude margins widen toward the poles
+_MARGIN = 0.6
+
+def _scanlines(rings, frame):
+    #_Scanlines of (n, 2) lat/lon rings projected into a frame, None if there are no rings
+    pieces = []
+    for ring in rings:
+        ring = _densify(ring)
+        x, y = _toFrame(ring[:, 0] * _DEG_TO_RAD, ring[:, 1] * _DEG_TO_RAD, *frame)
+        pieces.append((x, y, np.roll(x, -1), np.roll(y, -1)))
+    if not pieces:
+        return None
+    return _Scanlines(*[np.concatenate(i) for i in zip(*pieces)])
+
+def _seeds(polygon):
+    #(region, shape, bounds, eastings, northings) of every region the polygon reaches, with the
+    #southwest corners of the 100km squares its scan starts from
+    rings = _rings(polygon)
+    points = np.concatenate(rings)
+    south, west = points.min(axis=0)
+    north, east = points.max(axis=0)
+
+    for region in _regions(south, west, north, east):
+        frame, regionSouth, regionWest, regionNorth, regionEast = region
+        latMargin = _MARGIN
+        lonMargin = min(_MARGIN / np.cos(max(abs(regionSouth), abs(regionNorth)) * _DEG_TO_RAD), 10.0) if frame[0] else 0.0
+
+        #the polygon clipped a little beyond the region, so that cells cut by the region's edges
+        #see the polygon around their centers
+        box = (regionSouth - latMargin, regionWest - lonMargin, regionNorth + latMargin, regionEast + lonMargin)
+        shape = _scanlines([i for i in (_clipRing(ring, *box) for ring in rings) if len(i) >= 3], frame)
+        if shape is None:
+            continue
+
+        #the region, cut down to the polygon's box
+        box = (max(regionSouth, south - latMargin), max(regionWest, west - lonMargin), min(regionNorth, north + latMargin), min(regionEast, east + lonMargin))
+        bounds = _scanlines([np.array([box[:2], (box[2], box[1]), box[2:], (box[0], box[3])])], frame)
+
+        columns = np.arange(shape.west // 100000, shape.east // 100000 + 1, dtype=np.int64) * 100000
+        rows = np.arange(shape.south // 100000, shape.north // 100000 + 1, dtype=np.int64) * 100000
+        yield region, shape, bounds, np.tile(columns, len(rows)), np.repeat(rows, len(columns))
+
+def iterPolyfill(polygon, precision=5, intersects=False):
+    #generator of uint64 arrays of packed cells that together make up polyfill(polygon, precision, intersects)
+    precision = _checkPrecision(precision)
+    for region, shape, bounds, easting, northing in _seeds(polygon):
+        for cells in _iterScan(region, shape, bounds, easting, northing, 0, precision, intersects):
+            yield cells
+
+def polyfill(polygon, precision=5, intersects=False):
+    #uint64 array of the packed cells of precision whose centers are inside a polygon, or with
+    #intersects of those with any part inside it. polygon is (lat, lon) pairs of one ring, a list
+    #of rings (the first the outside, the rest holes), or a GeoJSON-like Polygon or MultiPolygon
+    chunks = list(iterPolyfill(polygon, precision, intersects))
+    if not chunks:
+        return np.zeros(0, dtype=np.uint64)
+    return np.concatenate(chunks)
@@ -0,0 +1,259 @@
+#
+#  mgrslib.rtree
+#  Sort-Tile-Recursive packed R-tree over the bounding boxes of MGRS cells
+#
+#  The tree holds packed cells (see Grid.to_int) and plain numpy arrays only, so it can be saved
+#  to a single file and memory-mapped back without building a Python object per cell. Box queries
+#  are vectorized and walk the tree one level at a time; point queries encode each point and look
+#  the result up in the sorted cells, which is exact and much cheaper than a box walk per point.
+#
+#  Copyright 2017-2021 (c) Peter E Lenz [pelenz@pelenz.com]
+#  MIT License, see mgrslib.py
+#
+
+import math
+
+import numpy as np
+
+from .batch import _unpack, _utmFromGrid, _upsFromGrid, _fromTransverseMercator, _fromPolarStereographic
+from .batch import _centralMeridian, _encodeCells, to_int, contains
+from .batch import _PI, _TWO_PI, _PI_OVER_2, _RAD_TO_DEG
+
+
+    ####################
+    #                  #
+    #   CELL BOUNDS    #
+    #                  #
+    ####################
+
+#bounding boxes are grown by this share of their size, plus _BOUND_PAD degrees, to stay clear of
+#rounding and of the 1e-10 radian longitude offset geotrans encodes with
+_BOUND_GROWTH = 0.001
+_BOUND_PAD = 1e-8
+
+def _asCells(cells):
+    #packed cells from Grids, MGRS grid ids or packed cells
+    if isinstance(cells, np.ndarray) and cells.dtype.kind in 'ui':
+        return cells.astype(np.uint64, copy=False).ravel()
+    cells = list(cells)
+    if not cells:
+        return np.zeros(0, dtype=np.uint64)
+    if hasattr(cells[0], 'to_int'):
+        return np.array([i.to_int() for i in cells], dtype=np.uint64)
+    if isinstance(cells[0], (str, bytes)):
+        return to_int(cells).ravel()
+    return np.asarray(cells, dtype=np.uint64).ravel()
+
+def _cellCorners(cells):
+    #radian latitudes and longitudes of the southwest, southeast, northwest and northeast corners of
+    #every packed cell, as (n, 4) arrays, with the frame eastings and northings they were projected
+    #from and which cells are southern and which UTM
+    zone, letter1, letter2, letter3, east, north, precision = _unpack(cells)
+    size = np.power(10.0, 5 - precision)
+    easting = np.zeros(len(zone))
+    northing = np.zeros(len(zone))
+    southern = np.zeros(len(zone), dtype=bool)
+
+    utm = zone != 0
+    if utm.any():
+        easting[utm], northing[utm], southern[utm] = _utmFromGrid(zone[utm], letter1[utm], letter2[utm], letter3[utm], east[utm] * size[utm], north[utm] * size[utm])
+    ups = ~utm
+    if ups.any():
+        easting[ups], northing[ups], southern[ups] = _upsFromGrid(letter1[ups], letter2[ups], letter3[ups], east[ups] * size[ups], north[ups] * size[ups])
+
+    x = easting[:, None] + np.array([0.0, 1.0, 0.0, 1.0]) * size[:, None]
+    y = northing[:, None] + np.array([0.0, 0.0, 1.0, 1.0]) * size[:, None]
+    lat = np.zeros(x.shape)
+    lon = np.zeros(x.shape)
+
+    if utm.any():
+        #longitudes are unwrapped around the central meridian so cells on the antimeridian do not
+        #span the globe, the part past it belongs to the next zone anyway
+        cm = _centralMeridian(zone[utm])[:, None]
+        lat[utm], lon[utm] = _fromTransverseMercator(x[utm], y[utm], cm, np.where(southern[utm], 10000000.0, 0.0)[:, None])
+        lon[utm] = cm + (lon[utm] - cm + _PI) % _TWO_PI - _PI
+    if ups.any():
+        lat[ups], lon[ups] = _fromPolarStereographic(x[ups], y[ups], southern[ups][:, None])
+
+    return lat, lon, x, y, southern, utm
+
+def _cellBounds(cells):
+    #west, south, east, north (degrees) around every packed cell, as an (n, 4) array
+    #a cell's lat/lon extremes are at its corners: its sides never cross the central meridian of a
+    #UTM zone, nor the grid lines through a pole, which is where a side's latitude or longitude turns
+    lat, lon, x, y, southern, utm = _cellCorners(cells)
+    ups = ~utm
+    bounds = np.stack([lon.min(axis=1), lat.min(axis=1), lon.max(axis=1), lat.max(axis=1)], axis=1)
+
+    if ups.any():
+        #a polar cell touching the pole reaches it on every meridian, one across the antimeridian
+        #is given every longitude
+        polar = np.flatnonzero(ups)
+        pole = (x[polar, 0] <= 2000000.0) & (x[polar, 1] >= 2000000.0) & (y[polar, 0] <= 2000000.0) & (y[polar, 2] >= 2000000.0)
+        wide = pole | (bounds[polar, 2] - bounds[polar, 0] > _PI)
+        bounds[polar[wide], 0] = -_PI
+        bounds[polar[wide], 2] = _PI
+        bounds[polar[pole], 1] = np.where(southern[polar[pole]], -_PI_OVER_2, bounds[polar[pole], 1])
+        bounds[polar[pole], 3] = np.where(southern[polar[pole]], bounds[polar[pole], 3], _PI_OVER_2)
+
+    bounds *= _RAD_TO_DEG
+
+    grow = np.concatenate([bounds[:, 2:] - bounds[:, :2]] * 2, axis=1) * _BOUND_GROWTH + _BOUND_PAD
+    bounds[:, :2] -= grow[:, :2]
+    bounds[:, 2:] += grow[:, 2:]
+    bounds[:, [0, 2]] = np.clip(bounds[:, [0, 2]], -180.0, 180.0)
+    bounds[:, [1, 3]] = np.clip(bounds[:, [1, 3]], -90.0, 90.0)
+    return bounds
+
+
+    #############
+    #           #
+    #   RTREE   #
+    #           #
+    #############
+
+#entries per node
+_NODE_SIZE = 16
+
+#first bytes of a saved tree
+_MAGIC = b'MGRSRT01'
+
+def _strOrder(boxes):
+    #Sort-Tile-Recursive order: boxes sorted by x into vertical slices of about sqrt(nodes)
+    #nodes each, every slice sorted by y, so each run of _NODE_SIZE makes a compact node
+    nodes = -(-len(boxes) // _NODE_SIZE)
+    perSlice = max(int(math.ceil(math.sqrt(nodes))), 1) * _NODE_SIZE
+    order = np.argsort(boxes[:, 0] + boxes[:, 2], kind='stable')
+    slices = np.arange(len(boxes)) // perSlice
+    return order[np.lexsort(((boxes[:, 1] + boxes[:, 3])[order], slices))]
+
+def _overlaps(boxes, west, south, east, north):
+    return (boxes[:, 0] <= east) & (boxes[:, 2] >= west) & (boxes[:, 1] <= north) & (boxes[:, 3] >= south)
+
+class RTree(object):
+    #packed R-tree of MGRS cell bounding boxes. levels[0] holds the cells, every level above
+    #holds the box of each node and the range of its entries in the level below. keys holds the
+    #same cells in numeric order for point lookups
+
+    def __init__(self, cells=()):
+        cells = np.unique(_asCells(cells))
+        boxes = _cellBounds(cells)
+        self.keys = cells
+        self.precisions = np.unique(cells & np.uint64(7)).astype(np.int64).tolist()
+
+        order = _strOrder(boxes)
+        self.cells = cells[order]
+        self.levels = [(boxes[order], None, None)]
+
+        while len(boxes) > _NODE_SIZE:
+            starts = np.arange(0, len(boxes), _NODE_SIZE)
+            counts = np.diff(np.append(starts, len(boxes)))
+            boxes = np.stack([np.minimum.reduceat(self.levels[-1][0][:, 0], starts), np.minimum.reduceat(self.levels[-1][0][:, 1], starts),
+                np.maximum.reduceat(self.levels[-1][0][:, 2], starts), np.maximum.reduceat(self.levels[-1][0][:, 3], starts)], axis=1)
+            order = _strOrder(boxes)
+            boxes = boxes[order]
+            self.levels.append((boxes, starts[order], counts[order]))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def save(self, path):
+        #writes the tree to one file that load memory-maps
+        mask = sum(1 << i for i in self.precisions)
+        header = np.array([_NODE_SIZE, len(self.levels), mask] + [len(i[0]) for i in self.levels], dtype=np.uint64)
+        with open(path, 'wb') as f:
+            f.write(_MAGIC)
+            header.tofile(f)
+            np.ascontiguousarray(self.keys, dtype=np.uint64).tofile(f)
+            np.ascontiguousarray(self.cells, dtype=np.uint64).tofile(f)
+            for boxes, starts, counts in self.levels:
+                np.ascontiguousarray(boxes, dtype=np.float64).tofile(f)
+                if starts is not None:
+                    np.ascontiguousarray(starts, dtype=np.int64).tofile(f)
+                    np.ascontiguousarray(counts, dtype=np.int64).tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        #opens a saved tree read only, its arrays are paged in from the file as queries need them
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(str(path) + ' is not a saved mgrslib RTree')
+            nodeSize, depth, mask = np.fromfile(f, dtype=np.uint64, count=3).tolist()
+            sizes = np.fromfile(f, dtype=np.uint64, count=depth).tolist()
+        if nodeSize != _NODE_SIZE:
+            raise ValueError(str(path) + ' was saved with ' + str(nodeSize) + ' entries per node, expected ' + str(_NODE_SIZE))
+
+        offset = len(_MAGIC) + 8 * (3 + depth)
+        def take(dtype, shape):
+            nonlocal offset
+            count = int(np.prod(shape))
+            out = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape) if count else np.zeros(shape, dtype=dtype)
+            offset += 8 * count
+            return out
+
+        tree = cls.__new__(cls)
+        tree.precisions = [i for i in range(6) if mask >> i & 1]
+        tree.keys = take(np.uint64, (sizes[0],))
+        tree.cells = take(np.uint64, (sizes[0],))
+        tree.levels = []
+        for i, size in enumerate(sizes):
+            boxes = take(np.float64, (size, 4))
+            if i == 0:
+                tree.levels.append((boxes, None, None))
+            else:
+                tree.levels.append((boxes, take(np.int64, (size,)), take(np.int64, (size,))))
+        return tree
+
+    def __search(self, west, south, east, north):
+        #(query, leaf) pairs where query box i overlaps the box of leaf j, walking down the tree
+        #one level at a time for all queries at once
+        queries = np.repeat(np.arange(len(west)), len(self.levels[-1][0]))
+        nodes = np.tile(np.arange(len(self.levels[-1][0])), len(west))
+
+        for level in range(len(self.levels) - 1, -1, -1):
+            boxes, starts, counts = self.levels[level]
+            keep = _overlaps(boxes[nodes], west[queries], south[queries], east[queries], north[queries])
+            queries, nodes = queries[keep], nodes[keep]
+            if level:
+                counts = counts[nodes]
+                first = np.repeat(starts[nodes] - np.cumsum(counts) + counts, counts)
+                queries, nodes = np.repeat(queries, counts), first + np.arange(len(first))
+
+        return queries, nodes
+
+    def bbox(self, south, west, north, east):
+        #cells whose bounding boxes overlap the box, a quick superset of the cells inside it
+        _q, leaves = self.__search(*[np.array([i], dtype=np.float64) for i in (west, south, east, north)])
+        return np.sort(self.cells[leaves])
+
+    def points(self, lats, lons):
+        #point in cell join, returns (point index, cell) for every cell containing each point,
+        #coarsest cell first. a point is encoded once per precision held in the tree and looked up
+        #in the sorted cells, so the answer is exactly the cells Grid(lat, lon) would resolve to
+        lats, lons = [np.asarray(i, dtype=np.float64).ravel() for i in np.broadcast_arrays(lats, lons)]
+        queries = []
+        cells = []
+        for p in self.precisions:
+            codes = _encodeCells(lats, lons, p)
+            at = np.minimum(np.searchsorted(self.keys, codes), len(self.keys) - 1)
+            found = np.flatnonzero(self.keys[at] == codes)
+            queries.append(found)
+            cells.append(codes[found])
+
+        if not queries:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+        queries, cells = np.concatenate(queries), np.concatenate(cells)
+        order = np.argsort(queries, kind='stable')
+        return queries[order], cells[order]
+
+    def point(self, lat, lon):
+        #cells containing one point, coarsest first
+        return self.points([lat], [lon])[1]
+
+    def intersects(self, cell):
+        #cells that overlap a cell (Grid, grid id or packed cell): the cell itself, the cells
+        #containing it and the cells inside it. MGRS cells of different zones never overlap
+        cell = _asCells([cell])
+        _q, leaves = self.__search(*_cellBounds(cell).T)
+        found = np.sort(self.cells[leaves])
+        return found[(found == cell[0]) | contains(cell[0], found) | contains(found, cell[0])]
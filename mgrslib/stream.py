@@ -0,0 +1,194 @@
+#
+#  mgrslib.stream
+#  Gridifying point files of any size in bounded memory
+#
+#  Points are read a batch at a time, each batch is projected once and given the MGRS grid ids
+#  of every requested precision, and is written out before the next one is read, so memory
+#  holds one batch whatever the size of the file. A batch is a dictionary of equal length
+#  columns: numpy arrays for CSV files and pyarrow arrays, which keep their types and nulls,
+#  for Parquet files. Parquet needs pyarrow, which is only imported when a Parquet file is used.
+#
+#  Copyright 2017-2021 (c) Peter E Lenz [pelenz@pelenz.com]
+#  MIT License, see mgrslib.py
+#
+
+import csv
+from itertools import islice
+
+import numpy as np
+
+from .batch import _locate, _digits, _mgrsStrings, _pack, _checkPrecision
+
+
+#rows read and written at a time
+_BATCH_ROWS = 65536
+
+#column names of each precision, after the Grid properties of the same names
+_PRECISION_COLUMNS = ['mgrs100k', 'mgrs10k', 'mgrs1k', 'mgrs100', 'mgrs10', 'mgrs1']
+_PRECISION_NAMES = {'mgrs100000': 0, 'mgrs10000': 1, 'mgrs1000': 2}
+_PRECISION_NAMES.update((name, precision) for precision, name in enumerate(_PRECISION_COLUMNS))
+
+def _precision(level):
+    #precision of an Int or of a name such as 'mgrs1k'
+    if isinstance(level, str):
+        if level not in _PRECISION_NAMES:
+            raise ValueError('Unknown MGRS level: ' + level + '. Expected one of ' + ', '.join(sorted(_PRECISION_NAMES)))
+        return _PRECISION_NAMES[level]
+    return _checkPrecision(level)
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Reading and writing Parquet files needs pyarrow: pip install pyarrow')
+    return pyarrow
+
+def _isArrow(values):
+    return type(values).__module__.split('.')[0] == 'pyarrow'
+
+def _floats(values):
+    #float64 array of a column, with NaN where a value is missing or not a number
+    if hasattr(values, 'to_numpy'):
+        values = values.to_numpy(zero_copy_only=False)
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                out[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+    ###############
+    #             #
+    #   READING   #
+    #             #
+    ###############
+
+def readCSV(path, batchRows=_BATCH_ROWS, **fmtparams):
+    #batches of a CSV file with a header row, every column a numpy array of strings. fmtparams are
+    #passed on to csv.reader. A file with a header and no rows is one empty batch, so its columns
+    #still reach the output
+    with open(path, newline='') as f:
+        rows = csv.reader(f, **fmtparams)
+        header = next(rows, None)
+        if header is None:
+            return
+        empty = True
+        while True:
+            chunk = list(islice(rows, batchRows))
+            if not chunk:
+                if empty:
+                    yield dict((name, np.zeros(0, dtype='U1')) for name in header)
+                return
+            empty = False
+            #short rows are padded and long rows cut to the header
+            chunk = [row if len(row) == len(header) else (row + [''] * len(header))[:len(header)] for row in chunk]
+            yield dict(zip(header, [np.array(column) for column in zip(*chunk)]))
+
+def readParquet(path, batchRows=_BATCH_ROWS, columns=None):
+    #batches of a Parquet file, every column a pyarrow array
+    #a file with no rows is one empty batch, as in readCSV
+    pa = _pyarrow()
+    f = pa.parquet.ParquetFile(path)
+    empty = True
+    for batch in f.iter_batches(batch_size=batchRows, columns=columns):
+        empty = False
+        yield dict(zip(batch.schema.names, batch.columns))
+    if empty:
+        table = f.schema_arrow.empty_table()
+        if columns is not None:
+            table = table.select(columns)
+        yield dict(zip(table.column_names, [i.combine_chunks() for i in table.columns]))
+
+
+    ################
+    #              #
+    #   GRIDIFY    #
+    #              #
+    ################
+
+def gridify(batches, precisions=(5, 4, 3, 2, 1, 0), lat='lat', lon='lon', packed=False, nulls=None):
+    #adds a column of grid ids (or with packed, of packed cells) per precision to every batch.
+    #precisions are Ints or names such as 'mgrs1k', and each column is named after its level.
+    #Every point is projected once for all precisions. Rows whose lat/lon is missing or out of
+    #range get '' (or 0 when packed) in numpy columns. With nulls the columns are pyarrow arrays
+    #that are null on those rows instead, which is the default for batches of pyarrow arrays such
+    #as readParquet's. writeCSV writes nulls as ''
+    levels = [_precision(i) for i in precisions]
+    for batch in batches:
+        arrow = _isArrow(batch[lat]) if nulls is None else nulls
+        lats = _floats(batch[lat])
+        lons = _floats(batch[lon])
+        valid = np.isfinite(lats) & np.isfinite(lons) & (np.abs(lats) <= 90) & (lons >= -180) & (lons <= 360)
+        rows = np.flatnonzero(valid)
+        located = _locate(lats[rows], lons[rows])
+
+        out = dict(batch)
+        for precision in levels:
+            east = _digits(located[4], precision)
+            north = _digits(located[5], precision)
+            if packed:
+                column = np.zeros(len(lats), dtype=np.uint64)
+                column[rows] = _pack(*located[:4], east, north, precision)
+            else:
+                column = np.full(len(lats), '', dtype='U' + str(5 + 2 * precision))
+                column[rows] = _mgrsStrings(*located[:4], east, north, precision)
+            out[_PRECISION_COLUMNS[precision]] = _pyarrow().array(column, mask=~valid) if arrow else column
+        yield out
+
+
+    ###############
+    #             #
+    #   WRITING   #
+    #             #
+    ###############
+
+def writeCSV(batches, path, **fmtparams):
+    #writes batches to a CSV file with a header row as they arrive, returns the number of rows
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, **fmtparams)
+        header = None
+        for batch in batches:
+            if header is None:
+                header = list(batch)
+                writer.writerow(header)
+            columns = [batch[name].to_pylist() if hasattr(batch[name], 'to_pylist') else batch[name] for name in header]
+            writer.writerows(zip(*columns))
+            count += len(columns[0]) if columns else 0
+    return count
+
+def writeParquet(batches, path, compression='snappy'):
+    #writes batches to a Parquet file, one row group per batch, returns the number of rows
+    pa = _pyarrow()
+    count = 0
+    writer = None
+    try:
+        for batch in batches:
+            table = pa.table(batch)
+            if writer is None:
+                writer = pa.parquet.ParquetWriter(path, table.schema, compression=compression)
+            writer.write_table(table)
+            count += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+def _isParquet(path):
+    return str(path).lower().endswith(('.parquet', '.pq'))
+
+def gridifyFile(source, destination, precisions=(5, 4, 3, 2, 1, 0), lat='lat', lon='lon', packed=False, batchRows=_BATCH_ROWS):
+    #reads source, gridifies it and writes destination a batch at a time, returns the number of rows.
+    #Files ending in .parquet or .pq are Parquet, anything else CSV. Rows without a cell are null in
+    #Parquet files and empty in CSV files
+    batches = readParquet(source, batchRows) if _isParquet(source) else readCSV(source, batchRows)
+    batches = gridify(batches, precisions, lat, lon, packed, _isParquet(destination))
+    if _isParquet(destination):
+        return writeParquet(batches, destination)
+    return writeCSV(batches, destination)
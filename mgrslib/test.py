@@ -1,4 +1,5 @@
-from mgrslib import Heading,Grid
+from mgrslib import Grid
+from compassheadinglib.common import Heading
 from pprint import pprint
 import math
 
@@ -27,9 +28,27 @@ assert g.northing == 3312
 assert g.lat == 20.17289585706837
 assert g.lon == -156.1783234582578
 
+#lat/lon of a Grid built from a grid id are only projected when first read, and are read only
+from mgrs import MGRS
+lazy = Grid('32VKM7697958157')
+assert lazy._Grid__lat is None and lazy._Grid__lon is None
+assert (lazy.latitude, lazy.longitude) == MGRS().toLatLon('32VKM7697958157')
+assert lazy._Grid__lat is not None
+try:
+    lazy.lat = 0
+    assert False
+except AttributeError:
+    pass
+
 assert g.size == 10
 assert g.precision == 4
 
+assert g.zone == 4
+assert g.band == 'Q'
+assert Grid('4QGH').precision == 0
+assert Grid('4QGH0101').easting == 1
+assert Grid('4QGH0101').mgrs10k == Grid('4QGH00')
+
 assert g.mgrs1 == Grid('4QGH9493033120')
 assert g.mgrs10 == Grid('4QGH94933312')
 assert g.mgrs100 == Grid('4QGH949331')
@@ -38,17 +57,52 @@ assert g.mgrs10k == Grid('4QGH93')
 assert g.mgrs100k == Grid('4QGH')
 assert g.mgrs100k != Grid('4QGK')
 
+assert g.increase() == g.mgrs1
+assert g.decrease(2) == g.mgrs1k
+assert g.parent() == g.mgrs100
+assert g.parent(0) == g.mgrs100k
+assert g.ancestors() == [g.mgrs100,g.mgrs1k,g.mgrs10k,g.mgrs100k]
+assert len(list(g.mgrs100.children())) == 100
+assert g in g.mgrs1k.children(2)
+
 assert g.north == Grid('4QGH94933313')
-assert g.east == Grid('4QGH 9492 3312')
+assert g.east == Grid('4QGH 9494 3312')
 assert g.south == Grid('4QGH94933311')
-assert g.west == Grid('4QGH 9494 3312')
+assert g.west == Grid('4QGH 9492 3312')
+assert g.northeast == Grid('4QGH94943313')
+assert g.southwest == Grid('4QGH94923311')
+assert Grid('4QGH9999').north == Grid('4QGJ9900')
+assert Grid('4QGH0000').southwest == Grid('4QFG9999')
+assert len(g.adjacent(diagonal=True)) == 8
+
+assert len(g.rectBuffer(50)) == 25
+assert len(g.rectBuffer(50,30)) == 15
+assert g in g.rectBuffer(50)
+assert g.north.east in g.rectBuffer(20)
+assert g.north.north.north not in g.rectBuffer(50)
+assert set(g.iterRectBuffer(50)) == set(g.rectBuffer(50))
+
+assert len(g.buffer(50)) == 81
+assert max(g.distance(i) for i in g.buffer(50)) <= 50
+assert g not in g.buffer(50,30)
+assert min(g.distance(i) for i in g.buffer(50,30)) >= 30
+assert set(g.iterBuffer(50)) == set(g.buffer(50))
 
 assert g == Grid(20.17289585706837,-156.1783234582578).mgrs10
+assert hash(g) == hash(Grid(20.17289585706837,-156.1783234582578).mgrs10)
+assert g.key == '4QGH94933312'
+assert Grid('04qgh 9493 3312') in set([g])
+assert g != '4QGH94933312'
 
 assert g.contains(g.mgrs1)
 assert g.mgrs10k.contains(g)
 assert g.mgrs1.isContainedBy(g)
 assert g.isContainedBy(g.mgrs10k)
+assert not g.contains(g)
+assert not g.mgrs1.contains(g)
+
+assert Grid.from_int(g.to_int()) == g
+assert g.to_int() >> 24 == g.mgrs100.to_int() >> 24
 
 def direction_test(a,b):
     out={}
@@ -165,14 +219,334 @@ assert approxEqual(Grid(10,10).distance(Grid(-70,-71),km=True),haversine(10,10,-
 
 
 l=[Grid(20,20),Grid('4QGH94933312'),Grid(-70,-70).mgrs10k]
-print l
-print sorted(l)
+print(l)
+print(sorted(l))
 
 
 assert Grid(20,20)<Grid(-70,-70)
 #asser
 
-print "Grid passed"
+print("Grid passed")
+
+#batch encoding
+
+from mgrslib import encode
+
+lats=[20.17289585706837,20,-70,85,-85,60,0]
+lons=[-156.1783234582578,20,-70,10,10,5,0]
+
+for p in range(6):
+    assert list(encode(lats,lons,p))==[Grid(la,lo,precision=p).grid_id for la,lo in zip(lats,lons)]
+
+assert Grid(str(encode(20.17289585706837,-156.1783234582578,4)))==g
+
+from mgrslib import decode
+
+ids=['4QGH94933312','4QGH9493033120','4QGH','ZAB9645452981','BAT9645447018','32VKM7697958157']
+la,lo=decode(ids)
+for i,a,b in zip(ids,la,lo):
+    assert abs(a-Grid(i).lat)<1e-9
+    assert abs(b-Grid(i).lon)<1e-9
+
+la,lo=decode(ids,center=True)
+assert Grid(la[0],lo[0],precision=4)==g
+
+from mgrslib import to_int, from_int
+from mgrslib.batch import contains
+
+ints=to_int(ids)
+assert [int(i) for i in ints]==[Grid(i).to_int() for i in ids]
+assert [Grid(str(i)) for i in from_int(ints)]==[Grid(i) for i in ids]
+assert contains(Grid('4QGH').to_int(),ints).tolist()==[True,True,False,False,False,False]
+
+from mgrslib.batch import resize, increase, decrease, children
+
+assert [Grid(str(i)) for i in resize(ids,2)]==[Grid(i).resize(2) for i in ids]
+assert [Grid(str(i)) for i in increase(['4QGH','4QGH9493'])]==[Grid('4QGH00'),Grid('4QGH940930')]
+assert [Grid(str(i)) for i in decrease(ids,0)]==[Grid(i) for i in ids]
+assert [Grid(str(i)) for i in children('4QGH9493')]==list(Grid('4QGH9493').children())
+
+from mgrslib.batch import neighbors
+
+assert [[Grid(str(i)) for i in row] for row in neighbors(ids,diagonal=True)]==[list(Grid(i).adjacent(True)) for i in ids]
+
+#squares are checked for seams a few at a time
+from mgrslib import batch
+passSize,batch._SQUARES_PER_PASS=batch._SQUARES_PER_PASS,2
+batch._cleanSquares.clear()
+assert [[Grid(str(i)) for i in row] for row in neighbors(ids,diagonal=True)]==[list(Grid(i).adjacent(True)) for i in ids]
+assert len(batch._cleanSquares)>2
+batch._SQUARES_PER_PASS=passSize
+
+from mgrslib.batch import rectBuffer
+
+cells=rectBuffer('4QGH94933312',50)
+assert len(cells)==25
+assert sorted((Grid.from_int(i) for i in cells),key=Grid.to_int)==sorted(Grid('4QGH94933312').rectBuffer(50),key=Grid.to_int)
+
+from mgrslib.batch import buffer
+
+assert sorted((Grid.from_int(i) for i in buffer('4QGH94933312',50,30)),key=Grid.to_int)==sorted(Grid('4QGH94933312').buffer(50,30),key=Grid.to_int)
+
+#near the poles the UPS scale runs from 0.994, every cell must still be within the radius
+from mgrslib.batch import _inverse, _DEG_TO_RAD
+
+for center,radius,inner in [('ZAG7821',50000,0),('ZAG0088',20000,5000),('BAM5490',30000,0),('32VKM7697',40000,0)]:
+    la,lo=decode([center])
+    cla,clo=decode(from_int(buffer(center,radius,inner)))
+    d=_inverse(la[0]*_DEG_TO_RAD,lo[0]*_DEG_TO_RAD,cla*_DEG_TO_RAD,clo*_DEG_TO_RAD)[0]
+    assert (d<=radius).all() and (d>=inner).all()
+
+from mgrslib import distance_matrix, bearing_matrix
+
+pts=[Grid(i) for i in ids]
+dm=distance_matrix(pts)
+assert dm.shape==(6,6)
+assert all(abs(dm[i][j]-pts[i].distance(pts[j]))<0.01 for i in range(6) for j in range(6))
+assert abs(bearing_matrix(pts[:1],pts[1:2])[0][0]-pts[0].bearing(pts[1]))<1e-6
+assert approxEqual(distance_matrix([[10,10]],[[-71,-71]],method='haversine')[0][0],haversine(10,10,-71,-71),0.001)
+near=[g,g.north.north.east]
+assert approxEqual(distance_matrix(near,method='equirectangular')[0][1],distance_matrix(near,method='haversine')[0][1],0.001)
 
 #MgrsList & MgrsSet classes
 
+from mgrslib import GridIndex, mgrsSet, mgrsList
+
+cells=mgrsSet(g.rectBuffer(100))
+index=GridIndex(cells)
+assert len(index)==121 and g in index
+assert index.nearest(g)==g
+assert index.k_nearest(g,5)[1:]==sorted(index.k_nearest(g,5)[1:],key=g.distance)
+assert index.k_nearest(g.north,3)[0]==g.north
+assert set(index.within_radius(g,20))==set(i for i in cells if g.distance(i)<=20)
+index.remove(g)
+assert g not in index and index.nearest(g)!=g
+index.add(g)
+assert index.nearest(g)==g
+assert cells.nearestTo(g)==g
+cells.discard(g)
+assert cells.nearestTo(g) in g.adjacent(True)
+
+assert cells.northernmost()==cells.extremes()['northernmost']
+assert all(i.lat==max(j.lat for j in cells) for i in cells.northernmost())
+assert all(i.lon==min(j.lon for j in cells) for i in cells.westernmost())
+assert cells.centeroid()==Grid(max(i.lat for i in cells),max(i.lon for i in cells))
+assert mgrsSet(g.rectBuffer(100)).centeroid(geodesic=True).distance(g)<10
+dateline=mgrsList([Grid(10,179.9),Grid(10,-179.9)])
+assert abs(abs(dateline.centeroid(geodesic=True).lon)-180)<1e-6
+square=mgrsList(g.rectBuffer(30))
+assert square.isContiguous(g) and not square.isContiguous(g.north)
+square.append(g.north.north)
+assert square.isContiguous(g.north)
+square._gridStruct__insert(g.north.north.north)
+assert square[-1]==g.north.north.north
+
+from mgrslib import RTree, from_int
+
+tree=cells.rTree()
+assert len(tree)==120
+assert len(tree.point(g.lat,g.lon))==0
+assert [Grid(str(i)) for i in from_int(tree.point(g.north.lat,g.north.lon))]==[g.north]
+tree=RTree(list(cells)+[g.mgrs1k,g.mgrs1])
+q,found=tree.points([g.lat,g.north.lat],[g.lon,g.north.lon])
+assert q.tolist()==[0,0,1,1] and [Grid.from_int(int(i)) for i in found]==[g.mgrs1k,g.mgrs1,g.mgrs1k,g.north]
+assert sorted((Grid.from_int(int(i)) for i in tree.intersects(g)),key=Grid.to_int)==sorted([g.mgrs1k,g.mgrs1],key=Grid.to_int)
+assert set(Grid.from_int(int(i)) for i in tree.bbox(g.lat,g.lon,g.lat,g.lon))>=set([g.mgrs1k,g.mgrs1])
+
+from mgrslib import GridArray
+
+cells=mgrsList(g.rectBuffer(100))
+arr=GridArray(cells)
+assert len(arr)==121 and g in arr and arr[0]==cells[0]
+assert set(arr.northernmost())==set(i for i in cells if i.lat==max(j.lat for j in cells))
+assert set(arr.exterior())==set(cells.exterior()) and set(arr.interior(True))==set(cells.interior(True))
+assert arr.centeroid()==cells.centeroid()
+assert arr[arr.cells!=g.to_int()].nearestTo(g) in g.adjacent(True)
+assert len(arr[10:20])==10 and arr[10:20][0]==cells[10]
+assert GridArray.from_latlon([20.17289585706837],[-156.1783234582578],4)[0]==g
+assert arr.centeroid(geodesic=True)==cells.centeroid(geodesic=True)
+
+from mgrslib.boundary import exterior, components, holes
+
+ring=mgrsSet(g.rectBuffer(100)).difference(g.rectBuffer(60))
+assert set(Grid.from_int(int(i)) for i in holes(list(ring))[0])==set(g.rectBuffer(60))
+assert mgrsSet(ring).holes()==[mgrsSet(g.rectBuffer(60))]
+assert len(mgrsSet(ring).components())==1 and len(mgrsSet(ring).interior())==4
+assert len(mgrsSet(g.rectBuffer(20)+[g.mgrs1k]).components())==2
+assert set(Grid.from_int(int(i)) for i in exterior(cells))==set(cells.exterior())
+assert components(cells).tolist()==[0]*len(cells)
+
+from mgrslib import BitmapRegion
+
+region=BitmapRegion(g.rectBuffer(60))
+assert len(region)==len(g.rectBuffer(60)) and g in region and g.mgrs1k not in region
+assert region.dilate(2,True)==BitmapRegion(g.rectBuffer(100)) and region.dilate(2,True).erode(2,True)==region
+assert set(region.erode())==set(mgrsSet(g.rectBuffer(60)).interior())
+assert set(BitmapRegion(g.rectBuffer(100))-region)==set(ring)
+assert BitmapRegion.frombytes(region.tobytes())==region and BitmapRegion.frombytes(region.tobytes(False))==region
+for empty in (region-region,BitmapRegion([],precision=3),BitmapRegion([g]).erode()):
+    assert len(empty)==0 and BitmapRegion.frombytes(empty.tobytes())==empty and BitmapRegion.frombytes(empty.tobytes(False))==empty
+
+from mgrslib import polyfill
+
+fence=polyfill([(20.0,-156.5),(20.5,-156.5),(20.5,-156.0)],2)
+assert Grid(20.4,-156.4,precision=2) in fence and Grid(20.1,-156.1,precision=2) not in fence
+assert all(i.precision==2 for i in fence) and fence<=polyfill([(20.0,-156.5),(20.5,-156.5),(20.5,-156.0)],2,intersects=True)
+square={'type':'Polygon','coordinates':[[[11.5,-0.4],[12.5,-0.4],[12.5,0.4],[11.5,0.4],[11.5,-0.4]],[[11.9,-0.1],[12.1,-0.1],[12.1,0.1],[11.9,0.1],[11.9,-0.1]]]}
+assert Grid(0.3,11.99,precision=1) in polyfill(square,1) and Grid(0.3,12.01,precision=1) in polyfill(square,1)
+assert Grid(0.0,12.0,precision=1) not in polyfill(square,1)
+
+from mgrslib.batch import compact, uncompact, covered
+
+kids=list(g.mgrs10k.children())
+fence=mgrsSet(kids[:-1]+list(kids[-1].children())+[g.mgrs1k])
+assert fence.compact()==mgrsSet([g.mgrs10k]) and fence.compact().uncompact(3)==mgrsSet(g.mgrs10k.children(2))
+assert fence.compact().covers(g) and not fence.compact().covers(g.mgrs100k)
+covering=mgrsSet([g.mgrs1k])
+assert covering.covers(g) and not covering.covers(g.mgrs10k)
+covering.discard(g.mgrs1k)
+assert not covering.covers(g)
+covering|=mgrsSet([g.mgrs10k])
+assert covering.covers(g) and covering.covers(g.mgrs1k)
+assert list(compact(['4QGH9141','4QGH94','4QGH95']))==list(compact(['4QGH94','4QGH95']))
+assert covered(['4QGH9141','4QGH9151','4QGH96'],['4QGH94','4QGH95']).tolist()==[True,True,False]
+assert len(uncompact(['4QGH94','4QGH9141'],2))==100
+
+from mgrslib import geometry
+
+bb=g.boundingBox
+assert bb.southwest==g.point and len(bb.points)==5 and bb.points[0]==bb.points[-1]
+assert g.bounds['northeast']=={'latitude':bb.northeast.latitude,'longitude':bb.northeast.longitude}
+assert geometry.polygons([g]).tolist()[0]==[list(i) for i in bb.__geo_interface__['coordinates'][0]]
+assert geometry.wkb([g,g.mgrs1k])[0].tobytes()==bb.wkb and len(geometry.wkb([g,g.mgrs1k]).tobytes())==186
+assert Grid(geometry.geojson([g])['features'][0]['id'])==g
+box=mgrsSet(g.mgrs1k.children()).boundingBox()
+assert box.southwest.latitude<=g.lat<=box.northeast.latitude and box.southwest.longitude<=g.lon<=box.northeast.longitude
+for empty in (mgrsList([]),mgrsSet(),GridArray([])):
+    for method in ('boundingBox','northernmost','extremes','centerEasting','centerNorthing','centeroid'):
+        if hasattr(empty,method):
+            try:
+                getattr(empty,method)()
+                assert False
+            except ValueError as e:
+                assert 'empty collection' in str(e)
+
+from mgrslib import gridCache, cacheInfo, setCacheSize
+
+with gridCache(2):
+    assert Grid(g.grid_id).lat==g.lat and Grid(g.grid_id).lat==g.lat
+    assert [i.grid_id for i in g.adjacent(True)]==[i.grid_id for i in g.adjacent(True)]
+    assert cacheInfo()['latlon'].hits==1 and cacheInfo()['neighbor'].evictions>=6 and cacheInfo()['neighbor'].size==2
+with gridCache(0):
+    assert g.north.south==g and cacheInfo()['neighbor']==(0,0,0,0,0)
+assert cacheInfo()['neighbor'].maxsize>0
+
+#blocks are scoped to their thread and restore the caches around them even when nested
+import threading
+with gridCache(0):
+    seen=[]
+    worker=threading.Thread(target=lambda: seen.append(cacheInfo()['latlon'].maxsize))
+    worker.start()
+    worker.join()
+    assert seen[0]>0 and cacheInfo()['latlon'].maxsize==0
+    with gridCache(5):
+        setCacheSize(3)
+        assert cacheInfo()['latlon'].maxsize==3
+    assert cacheInfo()['latlon'].maxsize==0
+assert cacheInfo()['latlon'].maxsize>3
+
+from mgrslib import interning, internedCount
+
+with interning():
+    a=Grid('4qgh9493 3312')
+    assert a is Grid('04QGH94933312') and a==g and internedCount()>=1
+    b=Grid('4QGH94933312',source='translation')
+    assert b is not a and b.source=='translation' and a.source=='grid_id' and b==a
+    assert Grid(g.lat+1e-7,g.lon) is not a and a.lat==Grid(g.grid_id).lat
+assert Grid(g.grid_id) is not Grid(g.grid_id)
+
+import csv, os, tempfile
+from mgrslib.stream import gridifyFile, readCSV
+
+folder=tempfile.mkdtemp()
+with open(os.path.join(folder,'points.csv'),'w',newline='') as f:
+    csv.writer(f).writerows([['lat','lon'],[g.lat,g.lon],[20,20],['','']])
+assert gridifyFile(os.path.join(folder,'points.csv'),os.path.join(folder,'cells.csv'),[5,'mgrs1k'],batchRows=2)==3
+rows=[row for batch in readCSV(os.path.join(folder,'cells.csv')) for row in zip(*batch.values())]
+assert [Grid(i) for i in rows[0][2:]]==[Grid(g.lat,g.lon),g.mgrs1k] and list(rows[1][2:])==[Grid(20,20).grid_id,Grid(20,20,precision=2).grid_id]
+assert list(rows[2])==['','','','']
+
+#a header with no rows still gives a header, with the new columns, in the output
+with open(os.path.join(folder,'empty.csv'),'w',newline='') as f:
+    f.write('lat,lon\n')
+assert gridifyFile(os.path.join(folder,'empty.csv'),os.path.join(folder,'empty-cells.csv'),[5,'mgrs1k'])==0
+assert open(os.path.join(folder,'empty-cells.csv')).read().split()==['lat,lon,mgrs1,mgrs1k']
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow=None
+if pyarrow is not None:
+    from mgrslib.stream import readParquet
+    assert gridifyFile(os.path.join(folder,'points.csv'),os.path.join(folder,'cells.parquet'),['mgrs1k'],packed=True)==3
+    batch=next(readParquet(os.path.join(folder,'cells.parquet')))
+    assert batch['mgrs1k'].to_pylist()==[g.mgrs1k.to_int(),Grid(20,20,precision=2).to_int(),None]
+    assert gridifyFile(os.path.join(folder,'empty.csv'),os.path.join(folder,'empty.parquet'),[5])==0
+    assert [list(i) for i in readParquet(os.path.join(folder,'empty.parquet'))]==[['lat','lon','mgrs1']]
+
+from mgrslib import parallel
+from mgrslib.batch import buffer, to_int
+
+#threads, a process pool would rerun this script in its workers where processes are spawned
+lats=[20.17289585706837,20,-70,85,-85,60,0]*5000
+lons=[-156.1783234582578,20,-70,10,10,5,0]*5000
+assert (parallel.encode(lats,lons,4,workers=2,backend='thread')==encode(lats,lons,4)).all()
+assert (parallel.decode(encode(lats,lons,4),workers=2,backend='thread')[1]==decode(encode(lats,lons,4))[1]).all()
+assert (parallel.buffer(g.mgrs1k.grid_id,20000,workers=2,backend='thread')==buffer(g.mgrs1k.grid_id,20000)).all()
+assert set(parallel.polyfill(square,1,workers=2,backend='thread'))==set(i.to_int() for i in polyfill(square,1))
+a=to_int(encode(lats[:7],lons[:7],0))
+assert parallel.union(a,a[:2]).tolist()==sorted(set(a.tolist())) and len(parallel.difference(a,a[:2],workers=2,backend='thread'))==5
+
+#set algebra cuts the inputs from a few samples of each sorted run, then every range is worked on alone
+import numpy as np
+from mgrslib.parallel import _cuts, _slices
+
+runs=[np.arange(0,1000000,3,dtype=np.uint64),np.arange(1,1000000,7,dtype=np.uint64)]
+cuts=_cuts(runs,4)
+assert len(cuts)==3 and [sum(len(i) for i in parts) for parts in zip(*_slices(runs,cuts))]==[len(i) for i in runs]
+big=to_int(encode(lats,lons,5))
+for op,f in [('union',np.union1d),('intersection',np.intersect1d),('difference',np.setdiff1d),('symmetric_difference',np.setxor1d)]:
+    assert (getattr(parallel,op)(big[::2],big[:20000],workers=3,backend='thread')==f(big[::2],big[:20000])).all()
+
+from mgrslib.mgrsagg import Aggregator
+
+#a budget of a few bytes spills every batch to disk and merges results a few cells at a time
+values=[1.0,-2.0,float('nan'),4.0,8.0,3.0,0.0]*5000
+with Aggregator(0,sketch=True,memory=100) as agg, Aggregator(0,sketch=True) as other:
+    for i in range(0,len(lats),7000):
+        agg.add(lats[i:i+7000],lons[i:i+7000],values[i:i+7000])
+    other.addCells(encode(lats[:7],lons[:7],2),values[:7])
+    r=agg.results([0.5])
+    assert agg.spilled==5 and r['cells'].tolist()==sorted(set(a.tolist())) and r['count'].sum()==35000 and r['valued'].sum()==30000
+    row=r['cells'].tolist().index(Grid(20,20,precision=0).to_int())
+    assert r['sum'][row]==-10000 and r['mean'][row]==-2 and r['min'][row]==-2 and abs(r['q50'][row]+2)<0.02
+    agg.merge(other)
+    assert agg.results()['count'].sum()==35007
+    other.merge(other)
+    assert other.results()['count'].sum()==14
+    agg.save(os.path.join(folder,'agg.npz'))
+    assert (Aggregator.load(os.path.join(folder,'agg.npz')).results()['sum']==agg.results()['sum']).all()
+
+#saving and loading go a range of cells or a block of rows at a time and keep spilling to disk
+import mgrslib.mgrsagg
+rows,mgrslib.mgrsagg._LOAD_ROWS=mgrslib.mgrsagg._LOAD_ROWS,3
+with Aggregator(0,sketch=True,memory=100) as agg, Aggregator(2) as empty:
+    agg.add(lats,lons,values)
+    agg.save(os.path.join(folder,'spilled'))
+    loaded=Aggregator.load(os.path.join(folder,'spilled.npz'),memory=100)
+    r,l=agg.results([0.5]),loaded.results([0.5])
+    assert loaded.spilled>0 and all(np.array_equal(r[i],l[i],equal_nan=True) for i in ('cells','count','valued','sum','min')) and np.allclose(r['q50'],l['q50'],equal_nan=True)
+    loaded.close()
+    empty.save(os.path.join(folder,'empty.npz'))
+    assert len(Aggregator.load(os.path.join(folder,'empty.npz')).results()['cells'])==0
+mgrslib.mgrsagg._LOAD_ROWS=rows
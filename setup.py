@@ -20,12 +20,17 @@ REQUIRES_PYTHON = '>=3.6.0'
 
 # What packages are required for this module to be executed?
 REQUIRED = [
-    #compassheadinglib has no dependencies beyond the python standard lib
+    'mgrs', 'nvector', 'pyproj', 'compassheadinglib',
+    #the batch operations in mgrslib.batch
+    'numpy',
+    #cKDTree in GridIndex, sparse graphs in mgrslib.boundary
+    'scipy',
 ]
 
 # What packages are optional?
 EXTRAS = {
-    #None
+    #Parquet files in mgrslib.stream
+    'parquet': ['pyarrow'],
 }
 
 # The rest you shouldn't have to touch too much :)